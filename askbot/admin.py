@@ -233,6 +233,20 @@ class ReplyAddressAdmin(admin.ModelAdmin):
     )
 
 
+class QueuedEmailAdmin(admin.ModelAdmin):
+    date_hierarchy = 'created_at'
+    list_display = ('subject_line', 'status', 'attempts', 'created_at', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    ordering = ('-created_at',)
+    readonly_fields = ('last_error',)
+    actions = ['requeue']
+
+    @admin.action(description=_('Requeue selected messages'))
+    def requeue(self, request, queryset): # pylint: disable=unused-argument
+        for message in queryset:
+            message.requeue()
+
+
 class BadgeDataAdmin(admin.ModelAdmin):
     list_display = ('slug', 'awarded_count')
     ordering = ('-awarded_count',)
@@ -315,6 +329,7 @@ admin.site.register(models.Thread, ThreadAdmin)
 admin.site.register(models.question.ThreadToGroup, ThreadToGroupAdmin)
 admin.site.register(models.QuestionView, QuestionViewAdmin)
 admin.site.register(models.ReplyAddress, ReplyAddressAdmin)
+admin.site.register(models.QueuedEmail, QueuedEmailAdmin)
 admin.site.register(models.EmailFeedSetting, EmailFeedSettingAdmin)
 admin.site.register(models.user_profile.UserProfile, UserProfileAdmin)
 
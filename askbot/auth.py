@@ -8,9 +8,11 @@ Many of these functions are being replaced with assertions:
 User.assert_can...
 """
 from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.contrib.auth import logout as _logout
-from askbot.models import Repute
+from askbot.models import Post, Repute
 # from askbot.models import Answer
 from askbot import signals
 from askbot.conf import settings as askbot_settings
@@ -271,41 +273,52 @@ def onAnswerAcceptCanceled(answer, user, timestamp=None):
     reputation.save()
 
 
+def _update_post_counters(post, **values):
+    """Updates only the given vote counter columns of the post
+    with a single ``UPDATE`` using the F-expressions in ``values``,
+    so that concurrent votes are not lost and the rest of the
+    post row is not rewritten. Then reloads the new values
+    into the ``post`` instance."""
+    Post.objects.filter(pk=post.pk).update(**values)
+    post.refresh_from_db(fields=list(values))
+
+
 @transaction.atomic
 def onUpVoted(vote, post, _user, timestamp=None):
     if timestamp is None:
         timestamp = timezone.now()
     vote.save()
 
-    if post.post_type != 'comment':
-        post.vote_up_count = int(post.vote_up_count) + 1
-    post.points = int(post.points) + 1
-    post.save()
-
     if post.post_type == 'comment':
+        _update_post_counters(post, points=F('points') + 1)
         # reputation is not affected by the comment votes
         return
 
+    _update_post_counters(post,
+                          vote_up_count=F('vote_up_count') + 1,
+                          points=F('points') + 1)
+
     if not (post.wiki or post.is_anonymous):
         author = post.author
-        todays_rep_gain = Repute.objects.get_reputation_by_upvoted_today(author)
+        rep_gain = askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE
+        todays_rep_gain = Repute.objects.add_reputation_by_upvoted_today(author, rep_gain)
         if todays_rep_gain < askbot_settings.MAX_REP_GAIN_PER_USER_PER_DAY:
-            author.receive_reputation(
-                askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE,
-                post.language_code)
-            author.save()
+            author.receive_reputation(rep_gain, post.language_code)
 
             # TODO: this is suboptimal if post is already a question
             question = post.thread._question_post() #pylint: disable=protected-access
 
             reputation = Repute(
                 user=author,
-                positive=askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE,
+                positive=rep_gain,
                 question=question,
                 reputed_at=timestamp,
                 reputation_type=1,
                 reputation=author.reputation)
             reputation.save()
+        else:
+            # the daily limit is reached, the reputation was not received
+            Repute.objects.add_reputation_by_upvoted_today(author, -rep_gain)
 
 
 @transaction.atomic
@@ -314,29 +327,36 @@ def onUpVotedCanceled(vote, post, _user, timestamp=None):
         timestamp = timezone.now()
     vote.delete()
 
-    if post.post_type != 'comment':
-        post.vote_up_count = max(int(post.vote_up_count) - 1, 0)
-
-    post.points = int(post.points) - 1
-    post.save()
-
     if post.post_type == 'comment':
+        _update_post_counters(post, points=F('points') - 1)
         # comment votes do not affect reputation
         return
 
+    _update_post_counters(post,
+                          vote_up_count=Greatest(F('vote_up_count') - 1, 0),
+                          points=F('points') - 1)
+
     if not (post.wiki or post.is_anonymous):
         author = post.author
-        author.receive_reputation(
-            -askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE,
-            post.language_code)
-        author.save()
-
         # TODO: this is suboptimal if post is already a question
         question = post.thread._question_post() #pylint: disable=protected-access
 
+        # the upvote over the daily limit did not give the reputation,
+        # ``onUpVoted`` saves the reputation record with the vote timestamp
+        awarded = Repute.objects.filter(user=author,
+                                        question=question,
+                                        reputation_type=1,
+                                        reputed_at=vote.voted_at).exists()
+        if not awarded:
+            return
+
+        rep_gain = askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE
+        author.receive_reputation(-rep_gain, post.language_code)
+        Repute.objects.add_reputation_by_upvoted_today(author, -rep_gain)
+
         reputation = Repute(
             user=author,
-            negative=-askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE,
+            negative=-rep_gain,
             question=question,
             reputed_at=timestamp,
             reputation_type=-8,
@@ -350,16 +370,15 @@ def onDownVoted(vote, post, user, timestamp=None):
         timestamp = timezone.now()
     vote.save()
 
-    post.vote_down_count = int(post.vote_down_count) + 1
-    post.points = int(post.points) - 1
-    post.save()
+    _update_post_counters(post,
+                          vote_down_count=F('vote_down_count') + 1,
+                          points=F('points') - 1)
 
     if not (post.wiki or post.is_anonymous):
         author = post.author
         author.receive_reputation(
             askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE,
             post.language_code)
-        author.save()
 
         # TODO: this is suboptimal if post is already a question
         question = post.thread._question_post() #pylint: disable=protected-access
@@ -376,7 +395,6 @@ def onDownVoted(vote, post, user, timestamp=None):
         user.receive_reputation(
             askbot_settings.REP_LOSS_FOR_DOWNVOTING,
             post.language_code)
-        user.save()
 
         reputation = Repute(
             user=user,
@@ -394,16 +412,15 @@ def onDownVotedCanceled(vote, post, user, timestamp=None):
         timestamp = timezone.now()
     vote.delete()
 
-    post.vote_down_count = max(int(post.vote_down_count) - 1, 0)
-    post.points = post.points + 1
-    post.save()
+    _update_post_counters(post,
+                          vote_down_count=Greatest(F('vote_down_count') - 1, 0),
+                          points=F('points') + 1)
 
     if not (post.wiki or post.is_anonymous):
         author = post.author
         author.receive_reputation(
             -askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE,
             post.language_code)
-        author.save()
 
         # TODO: this is suboptimal if post is already a question
         question = post.thread._question_post() #pylint: disable=protected-access
@@ -420,7 +437,6 @@ def onDownVotedCanceled(vote, post, user, timestamp=None):
         user.receive_reputation(
             -askbot_settings.REP_LOSS_FOR_DOWNVOTING,
             post.language_code)
-        user.save()
 
         reputation = Repute(
             user=user,
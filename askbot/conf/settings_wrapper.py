@@ -19,9 +19,19 @@ for the most part, so actual values are reliably available only
 at run time
 
 askbot.deps.livesettings is a module developed for satchmo project
+
+Values are read from a snapshot - a dictionary of all settings
+per language, stored in the current thread. The snapshot is reloaded
+when the settings version stored in the cache changes, the version
+is checked once per request (and at least every
+``SETTINGS_SNAPSHOT_MAX_AGE`` seconds outside of requests).
 """
+import threading
+import time
+import uuid
 from django.conf import settings as django_settings
 from django.core.cache import cache
+from django.core.signals import request_started
 from django.core.files import uploadedfile
 from django.utils.encoding import force_str
 from django.utils.functional import lazy
@@ -34,9 +44,16 @@ from livesettings.values import SortedDotDict
 from livesettings.functions import config_register
 from livesettings.functions import config_get
 from livesettings import signals
+from askbot.utils.cache import LocalCacheFamily
 from askbot.utils.functions import format_setting_name
 
 
+SETTINGS_VERSION_CACHE_KEY = 'askbot-settings-version'
+SETTINGS_SNAPSHOT_MAX_AGE = 5 # seconds
+
+settings_cache = LocalCacheFamily('settings')
+
+
 def assert_setting_info_correct(info):
     assert isinstance(info, tuple), 'must be tuple, %s found' % str(info)
     assert len(info) in (3, 4), 'setting tuple must have three or four elements'
@@ -74,7 +91,27 @@ class ConfigSettings(object):
         settings_key = 'ASKBOT_' + key
         if hasattr(django_settings, settings_key):
             return getattr(django_settings, settings_key)
-        return cls.__instance[key].value
+
+        if snapshot.loading:
+            # the setting is read while the snapshot is being loaded
+            return cls.__instance[key].value
+
+        values = snapshot.get_values(cls.load_values)
+        try:
+            return values[key]
+        except KeyError:
+            # setting is missing from the dictionary cached
+            # before the setting was registered
+            value = cls.__instance[key].value
+            values[key] = value
+            return value
+
+    @classmethod
+    def load_values(cls):
+        """returns dictionary of all settings
+        for the current language"""
+        cache_key = get_bulk_cache_key()
+        return settings_cache.get(cache_key) or cls.prime_cache(cache_key)
 
     def get_default(self, key):
         """return the defalut value for the setting"""
@@ -108,6 +145,8 @@ class ConfigSettings(object):
 
             setting.value = value
             setting.save()
+
+        bump_settings_version()
         # self.prime_cache()
 
     def register(self, value):
@@ -191,8 +230,7 @@ class ConfigSettings(object):
         return lazy(_func, str)()
 
     def as_dict(self):
-        cache_key = get_bulk_cache_key()
-        return cache.get(cache_key) or self.prime_cache(cache_key)
+        return dict(snapshot.get_values(self.load_values))
 
     @classmethod
     def precache_all_values(cls):
@@ -244,11 +282,69 @@ class ConfigSettings(object):
 
             out[key] = value
 
-        cache.set(cache_key, out)
+        settings_cache.set(cache_key, out)
 
         return out
 
 
+class SettingsSnapshot(threading.local):
+    """Per-thread copy of the settings dictionaries,
+    valid while the settings version in the cache is unchanged"""
+
+    def __init__(self):
+        super().__init__()
+        self.version = None
+        self.checked_at = None
+        self.values = dict()
+        self.loading = False
+
+    def expire(self, **kwargs): # pylint: disable=unused-argument
+        """makes the next read check the settings version"""
+        self.checked_at = None
+
+    def clear(self):
+        """drops the stored values"""
+        self.values = dict()
+        self.checked_at = None
+
+    def check_version(self):
+        """drops the values if settings were changed by any process"""
+        version = cache.get(SETTINGS_VERSION_CACHE_KEY)
+        if version is None:
+            cache.add(SETTINGS_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(SETTINGS_VERSION_CACHE_KEY)
+        if version != self.version:
+            self.values = dict()
+            self.version = version
+        self.checked_at = time.monotonic()
+
+    def get_values(self, load_values):
+        """returns settings dictionary for the current language,
+        ``load_values`` is called if it is not available"""
+        if self.checked_at is None \
+                or time.monotonic() - self.checked_at > SETTINGS_SNAPSHOT_MAX_AGE:
+            self.check_version()
+
+        lang = get_language()
+        if lang not in self.values:
+            self.loading = True
+            try:
+                self.values[lang] = load_values()
+            finally:
+                self.loading = False
+        return self.values[lang]
+
+
+snapshot = SettingsSnapshot()
+request_started.connect(snapshot.expire, dispatch_uid='expire_askbot_settings_snapshot')
+
+
+def bump_settings_version():
+    """makes all processes reload the settings"""
+    cache.set(SETTINGS_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+    snapshot.clear()
+
+
 def get_bulk_cache_key(lang=None):
     from askbot.utils.translation import get_language
     return 'askbot-settings-' + (lang or get_language())
@@ -256,10 +352,10 @@ def get_bulk_cache_key(lang=None):
 
 def update_cached_value(key, value, language_code=None):
     cache_key = get_bulk_cache_key(language_code or get_language())
-    settings_dict = cache.get(cache_key)
+    settings_dict = settings_cache.get(cache_key)
     if settings_dict:
         settings_dict[key] = value
-        cache.set(cache_key, settings_dict)
+        settings_cache.set(cache_key, settings_dict)
 
 
 def cached_value_update_handler(setting=None, new_value=None,
@@ -271,6 +367,7 @@ def cached_value_update_handler(setting=None, new_value=None,
             update_cached_value(key, new_value, lang)
     else:
         update_cached_value(key, new_value, language_code)
+    bump_settings_version()
 
 signals.configuration_value_changed.connect(
     cached_value_update_handler,
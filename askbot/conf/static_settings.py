@@ -29,8 +29,13 @@ class AskbotStaticSettings(AppConf):
 
     AUTO_INIT_BADGES = True
 
+    ANALYTICS_CACHE_TIMEOUT = 5 * 60 # seconds, 0 - do not cache the analytics pages data
     ANALYTICS_EMAIL_DOMAIN_ORGANIZATIONS_ENABLED = False
+    ANALYTICS_EVENT_BUFFER_SECONDS = 10 # max delay of the buffered events
+    ANALYTICS_EVENT_BUFFER_SIZE = 0 # events saved with one query, 0 - save each event at once
+    ANALYTICS_EVENT_RETENTION_DAYS = 0 # days the raw events are kept, 0 - keep forever
     ANALYTICS_SESSION_TIMEOUT_MINUTES = 30
+    ANALYTICS_SESSION_TOUCH_SECONDS = 60 # min interval between the updates of a session
     # a list of dictionaries, each dictionary has keys: name, slug, description, group_ids
     # these segments will be ordered the same way they are defined in the list
     ANALYTICS_NAMED_SEGMENTS = []
@@ -39,6 +44,10 @@ class AskbotStaticSettings(AppConf):
     # this segment will be ordered after all named segments
     ANALYTICS_DEFAULT_SEGMENT = {}
 
+    # extra (family name, key regex) pairs for the cache instrumentation,
+    # see askbot.utils.cache_stats
+    CACHE_KEY_FAMILIES = ()
+    CACHE_STATS_FLUSH_INTERVAL = 10 # seconds
     CAS_USER_FILTER = None
     CAS_USER_FILTER_DENIED_MSG = None
     CAS_GET_USERNAME = None # python path to function
@@ -48,9 +57,23 @@ class AskbotStaticSettings(AppConf):
                                    # the latter is path to func with
                                    # variables (request, user)
     DEBUG_INCOMING_EMAIL = False
+    # if True - outgoing email is queued in the database
+    # and delivered by the drain_email_outbox management command
+    EMAIL_OUTBOX_ENABLED = False
+    EMAIL_OUTBOX_BATCH_SIZE = 50 # messages per SMTP connection
+    EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+    EMAIL_OUTBOX_MAX_RETRY_DELAY_SECONDS = 6 * 60 * 60
+    EMAIL_OUTBOX_MESSAGES_PER_SECOND = 5 # 0 - no rate limit
+    EMAIL_OUTBOX_RETRY_DELAY_SECONDS = 60 # doubles with each failed attempt
     EXTRA_SKINS_DIR = None #None or path to directory with skins
+    FEED_CACHE_TIMEOUT = 10 * 60 # seconds, 0 - do not cache the rss feeds
     IP_MODERATION_ENABLED = False
     LANGUAGE_MODE = 'single-lang' # 'single-lang', 'url-lang' or 'user-lang'
+    # in-process cache in front of the django cache, per key family:
+    # {'profiles': 5, 'global-group': 60, 'settings': 30, 'avatars': 10}
+    # values are the timeouts of the in-process entries in seconds
+    LOCAL_CACHE_FAMILIES = {}
+    LOCAL_CACHE_MAX_ENTRIES = 1000 # per key family
     MAIN_PAGE_BASE_URL = pgettext('urls', 'questions') + '/'
     MAX_UPLOAD_FILE_SIZE = 1024 * 1024 #result in bytes
     NEW_ANSWER_FORM = None # path to custom form class
@@ -58,6 +81,11 @@ class AskbotStaticSettings(AppConf):
             'plain-text': 'askbot.utils.markup.plain_text_input_converter',
             'markdown': 'askbot.utils.markup.markdown_input_converter',
         }
+    # thresholds of askbot.middleware.profiling.ProfilingMiddleware
+    PROFILING_MAX_DUPLICATE_QUERIES = 10 # repetitions of the same query
+    PROFILING_MAX_QUERIES = 100
+    PROFILING_SAMPLE_RATE = 1.0 # fraction of the profiled requests
+    PROFILING_SLOW_REQUEST_MS = 1000
 
     # only report on updates after this date, useful when
     # enabling delayed email alerts on a site with a lot of content
@@ -66,13 +94,21 @@ class AskbotStaticSettings(AppConf):
         timezone.datetime.fromtimestamp(0, tz=timezone.get_default_timezone())
         if getattr(settings, 'USE_TZ', False)
         else timezone.datetime.fromtimestamp(0))
+    QUESTION_VIEW_HISTORY_SIZE = 100 # recent question views remembered per visitor
     QUESTION_PAGE_BASE_URL = pgettext('urls', 'question') + '/'
     SERVICE_URL_PREFIX = 's/' # prefix for non-UI urls
     SELF_TEST = True # if true - run startup self-test
+    SITEMAP_SHARD_SIZE = 10000 # question ids per sitemap file, at most 50000
+    SPAM_CHECK_MODE = 'sync' # 'sync' or 'async' - check new questions and answer edits after publishing
     SPAM_CHECKER_FUNCTION = 'askbot.spam_checker.akismet_spam_checker.is_spam'
     SPAM_CHECKER_API_KEY = None
     SPAM_CHECKER_API_URL = None
+    SPAM_CHECKER_POOL_SIZE = 10 # pooled connections to the spam checker API
+    SPAM_CHECKER_SLOW_MS = 500 # spam checks logged as slow
     SPAM_CHECKER_TIMEOUT_SECONDS = 1
+    SPAM_CLASSIFIER_MODEL_FILE = None # path to the naive Bayes spam checker model
+    SPAM_CLASSIFIER_THRESHOLD = 0.5 # spam probability above which the post is spam
+    SPAM_VERDICT_CACHE_TIMEOUT = 60 * 60 # seconds, 0 - do not cache the verdicts
     TRANSLATE_URL = True # set true to localize urls
     USER_CAN_MANAGE_ADMIN_TAGS_FUNCTION = default_user_can_manage_admin_tags
     USER_DATA_EXPORT_DIR = const.DEFAULT_USER_DATA_EXPORT_DIR
@@ -619,6 +619,9 @@ BADGE_CSS_CLASSES = {
 BADGE_DISPLAY_SYMBOL = '&#9679;'
 
 MIN_REPUTATION = 1
+# lifetime of the cached per-day counter of reputation gained
+# from the upvotes, a bit longer than a day
+UPVOTED_TODAY_CACHE_TIMEOUT = 60*60*25
 
 SEARCH_ORDER_BY = (('-added_at', _('date descendant')),
                    ('added_at', _('date ascendant')),
@@ -14,18 +14,23 @@
 #encoding:utf-8
 from django.contrib.syndication.views import Feed
 
+import hashlib
 import itertools
+from collections import defaultdict
 import askbot.utils.timezone
 
 from django.conf import settings as django_settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.urls import reverse
-from django.http import Http404
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
 from django.utils.translation import gettext as _
 
 from askbot.utils.translation import get_language
 from askbot.conf import settings as askbot_settings
-from askbot.models import Post
+from askbot.models import Post, Thread
+from askbot.utils import cache as cache_utils
 from askbot.utils.html import site_url
 
 def get_content_filter():
@@ -33,7 +38,62 @@ def get_content_filter():
         return {'approved': True}
     return {}
 
-class RssIndividualQuestionFeed(Feed):
+def get_feed_query(request):
+    """returns the search query with collapsed whitespace
+    and the sorted list of tags from the request"""
+    query = ' '.join(request.GET.get('q', '').split())
+    tags = sorted(set(request.GET.getlist('tags')))
+    return query, tags
+
+
+class CachedFeedMixin(object):
+    """Caches the rendered feed for ``ASKBOT_FEED_CACHE_TIMEOUT`` seconds
+    or until the cache namespace of the feed content is invalidated,
+    see ``askbot.utils.cache.invalidate_namespace``.
+    The responses have ``ETag`` and ``Last-Modified`` headers,
+    conditional requests are answered with "304 Not Modified".
+    """
+
+    def get_cache_namespace(self, request, *args, **kwargs):
+        """returns cache namespace of the feed content"""
+        raise NotImplementedError
+
+    def get_cache_key(self, request, *args, **kwargs):
+        """returns cache key of the feed, unique for the
+        normalized parameters of the request and the language"""
+        raise NotImplementedError
+
+    def render_feed(self, request, *args, **kwargs):
+        """returns tuple (content, content type, etag, last modified timestamp)"""
+        response = super().__call__(request, *args, **kwargs)
+        etag = quote_etag(hashlib.md5(response.content).hexdigest())
+        last_modified = parse_http_date_safe(response.get('Last-Modified', ''))
+        return response.content, response['Content-Type'], etag, last_modified
+
+    def __call__(self, request, *args, **kwargs):
+        if not askbot_settings.RSS_ENABLED:
+            raise Http404
+
+        timeout = django_settings.ASKBOT_FEED_CACHE_TIMEOUT
+        if timeout:
+            namespace = self.get_cache_namespace(request, *args, **kwargs)
+            key = self.get_cache_key(request, *args, **kwargs)
+            feed = cache_utils.get_or_set(key, lambda: self.render_feed(request, *args, **kwargs),
+                                          timeout=timeout, namespace=namespace)
+        else:
+            feed = self.render_feed(request, *args, **kwargs)
+
+        content, content_type, etag, last_modified = feed
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class RssIndividualQuestionFeed(CachedFeedMixin, Feed):
     """rss feed class for particular questions
     """
 
@@ -51,7 +111,7 @@ class RssIndividualQuestionFeed(Feed):
             raise Http404
         # hack to get the request object into the Feed class
         self.request = request
-        question = Post.objects.get_questions().get(id__exact = pk)
+        question = Post.objects.get_questions().select_related('thread').get(id__exact = pk)
         if askbot_settings.CONTENT_MODERATION_MODE == 'premoderation':
             if question.approved == False:
                 raise Http404
@@ -70,29 +130,54 @@ class RssIndividualQuestionFeed(Feed):
         """
         return askbot.utils.timezone.make_aware(item.added_at)
 
+    def item_updateddate(self, item):
+        """get date of the last edit of the item
+        """
+        return askbot.utils.timezone.make_aware(item.last_edited_at or item.added_at)
+
+    def get_cache_namespace(self, request, pk=None):
+        questions = Post.objects.get_questions().filter(id=pk)
+        thread_id = questions.values_list('thread_id', flat=True).first()
+        if thread_id is None:
+            raise Http404
+        return Thread(id=thread_id).get_cache_namespace()
+
+    def get_cache_key(self, request, pk=None):
+        return 'rss-question-feed:%s:%s' % (pk, get_language())
+
     def items(self, item):
         """get content items for the feed
         ordered as: question, question comments,
         then for each answer - the answer itself, then
-        answer comments
+        answer comments.
+        All answers and comments are loaded with one query
         """
-        chain_elements = list()
-        chain_elements.append([item])
-        base_filter = get_content_filter()
-        comment_filter = base_filter.copy()
-        comment_filter['parent'] = item
-        chain_elements.append(Post.objects.get_comments().filter(**comment_filter))
-
-        answer_filter = base_filter.copy()
-        answer_filter['thread'] = item.thread
-        answer_filter['deleted'] = False
-        answers = Post.objects.get_answers().filter(**answer_filter)
-
+        posts = Post.objects.filter(thread=item.thread, post_type__in=('answer', 'comment'),
+                                    **get_content_filter())
+        # only the posts of the global group, like ``Post.objects.get_answers()``
+        posts = list(posts.get_for_user(None).select_related('author'))
+
+        item.thread._question_cache = item
+        parents = {item.id: item}
+        answers = list()
+        comments = defaultdict(list)
+        for post in posts:
+            post.thread = item.thread
+            if post.post_type == 'answer':
+                if not post.deleted:
+                    answers.append(post)
+                    parents[post.id] = post
+            else:
+                comments[post.parent_id].append(post)
+
+        for parent in parents.values():
+            for comment in comments[parent.id]:
+                comment.parent = parent
+
+        chain_elements = [[item], comments[item.id]]
         for answer in answers:
             chain_elements.append([answer,])
-            comment_filter = base_filter.copy()
-            comment_filter['parent'] = answer
-            chain_elements.append(Post.objects.get_comments().filter(**comment_filter))
+            chain_elements.append(comments[answer.id])
 
         return itertools.chain(*chain_elements)
 
@@ -113,7 +198,7 @@ class RssIndividualQuestionFeed(Feed):
         return item.text
 
 
-class RssLastestQuestionsFeed(Feed):
+class RssLastestQuestionsFeed(CachedFeedMixin, Feed):
     """rss feed class for the latest questions
     """
 
@@ -149,6 +234,11 @@ class RssLastestQuestionsFeed(Feed):
         """
         return askbot.utils.timezone.make_aware(item.added_at)
 
+    def item_updateddate(self, item):
+        """get date of the latest activity in the question
+        """
+        return askbot.utils.timezone.make_aware(item.thread.last_activity_at)
+
     def item_guid(self, item):
         """returns url without the slug
         because the slug can change
@@ -163,12 +253,17 @@ class RssLastestQuestionsFeed(Feed):
         """
         return item.text
 
+    def get_cache_namespace(self, request):
+        return cache_utils.QUESTIONS_SURROGATE_TAG
+
+    def get_cache_key(self, request):
+        query, tags = get_feed_query(request)
+        params = '\n'.join([get_language(), query] + tags)
+        return 'rss-questions-feed:' + hashlib.md5(params.encode('utf-8')).hexdigest()
+
     def items(self, item):
         """get questions for the feed
         """
-        if not askbot_settings.RSS_ENABLED:
-            raise Http404
-
         #initial filtering
         filters = get_content_filter()
         filters['deleted'] = False
@@ -177,8 +272,7 @@ class RssLastestQuestionsFeed(Feed):
         qs = Post.objects.get_questions().filter(**filters)
 
         # get search string and tags from GET
-        query = self.request.GET.get("q", None)
-        tags = self.request.GET.getlist("tags")
+        query, tags = get_feed_query(self.request)
 
         if query:
             # if there's a search string, use the
@@ -191,6 +285,7 @@ class RssLastestQuestionsFeed(Feed):
             for tag in tags:
                 qs = qs.filter(thread__tags__name=tag)
 
+        qs = qs.select_related('thread', 'author')
         return qs.order_by('-thread__last_activity_at')[:30]
 
     # hack to get the request object into the Feed class
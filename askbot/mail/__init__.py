@@ -44,16 +44,9 @@ def extract_first_email_address(text):
         return match.group(0)
     return None
 
-def _send_mail(subject_line, body_text, sender_email, recipient_list, # pylint: disable=too-many-arguments
-               headers=None, attachments=None):
-    """base send_mail function, which will attach email in html format
-    if html email is enabled"""
-    html_enabled = askbot_settings.HTML_EMAIL_ENABLED
-    if html_enabled:
-        message_class = mail.EmailMultiAlternatives
-    else:
-        message_class = mail.EmailMessage
-
+def _get_email_list(recipient_list):
+    """returns list of email addresses from the list
+    of users and/or email addresses"""
     from askbot.models import User # pylint: disable=import-outside-toplevel
     from askbot.models.user import InvitedModerator # pylint: disable=import-outside-toplevel
     email_list = []
@@ -62,6 +55,17 @@ def _send_mail(subject_line, body_text, sender_email, recipient_list, # pylint:
             email_list.append(recipient.email)
         else:
             email_list.append(recipient)
+    return email_list
+
+def build_message(subject_line, body_text, sender_email, email_list, # pylint: disable=too-many-arguments
+                  headers=None, attachments=None, html_enabled=False,
+                  connection=None):
+    """returns email message object, with the html alternative
+    attached if ``html_enabled`` is True"""
+    if html_enabled:
+        message_class = mail.EmailMultiAlternatives
+    else:
+        message_class = mail.EmailMessage
 
     msg = message_class(
                 subject_line,
@@ -69,11 +73,44 @@ def _send_mail(subject_line, body_text, sender_email, recipient_list, # pylint:
                 sender_email,
                 email_list,
                 headers=headers,
-                attachments=attachments
+                attachments=attachments,
+                connection=connection
             )
     if html_enabled:
         msg.attach_alternative(body_text, "text/html")
+    return msg
+
+def _send_mail(subject_line, body_text, sender_email, recipient_list, # pylint: disable=too-many-arguments
+               headers=None, attachments=None):
+    """base send_mail function, which will attach email in html format
+    if html email is enabled.
+    If the email outbox is enabled, the message is queued for the
+    delivery by the ``drain_email_outbox`` command instead"""
+    html_enabled = askbot_settings.HTML_EMAIL_ENABLED
+    email_list = _get_email_list(recipient_list)
 
+    if django_settings.ASKBOT_EMAIL_OUTBOX_ENABLED:
+        from askbot.models import QueuedEmail # pylint: disable=import-outside-toplevel
+        QueuedEmail.objects.enqueue(
+                subject_line,
+                body_text,
+                sender_email,
+                email_list,
+                headers=headers,
+                attachments=attachments,
+                html_enabled=html_enabled
+            )
+        return
+
+    msg = build_message(
+                subject_line,
+                body_text,
+                sender_email,
+                email_list,
+                headers=headers,
+                attachments=attachments,
+                html_enabled=html_enabled
+            )
     msg.send()
 
 def send_mail( # pylint: disable=too-many-arguments
@@ -1,38 +1,208 @@
-"""WARNING:
-This command is incomplete, current awards only
-Civic Duty badge
+"""Awards the enabled badges retroactively to the whole user base.
+
+Eligible users are selected with the set-based queries returned by
+``Badge.get_eligible_awards``, badges which do not provide such query
+are skipped. New awards are inserted with ``bulk_create``, together
+with their activity records, the same as the ``Award`` signal
+receivers create, and the messages about the new badges,
+when the badges are public. After that the award counts
+of the badges and the badge counts of the users are recalculated.
 """
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from askbot import const
+from askbot.conf import settings as askbot_settings
+from askbot.models import (Activity, ActivityAuditStatus, Award, BadgeData, Message,
+                           User, badges, get_award_message)
+from askbot.models.user_profile import UserProfile, get_profile_cache_key, profile_cache
+from askbot.utils.lists import batch_size as get_batches
 
 
-from askbot.models import badges
-from askbot.models import User
-from askbot.models import Vote
-from askbot.utils.console import ProgressBar
-from django.core.management import BaseCommand
-from django.utils import timezone
+class Command(BaseCommand): # pylint: disable=missing-class-docstring
+    help = 'Awards enabled badges to all eligible users'
+
+    def add_arguments(self, parser): # pylint: disable=missing-function-docstring
+        parser.add_argument('--badge', action='append', dest='badge_keys',
+                            help='Key of the badge to award, may be repeated, '
+                                 'by default all enabled badges are awarded')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the numbers of the new awards')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of threads selecting the eligible users')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of awards inserted per query')
+
+    def handle(self, *args, **options): # pylint: disable=missing-function-docstring
+        badge_list = self.get_badges(options['badge_keys'])
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                results = list(executor.map(self.get_new_awards_in_thread, badge_list))
+        else:
+            results = [self.get_new_awards(badge) for badge in badge_list]
+
+        total = 0
+        for badge, new_awards in results:
+            self.stdout.write('%s: %d new awards' % (badge.key, len(new_awards)))
+            total += len(new_awards)
+
+        if options['dry_run']:
+            self.stdout.write('Would award %d badges' % total)
+            return
 
-class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
         now = timezone.now()
-        awarded_count = 0
-
-        users = User.objects.all()
-        count = users.count()
-        message = 'Awarding badges for each user'
-        for user in ProgressBar(users.iterator(), count, message):
-            try:
-                #get last vote
-                vote = Vote.objects.filter(user=user).order_by('-id')[0]
-            except IndexError:
-                #user did not vote
+        user_ids = set()
+        with transaction.atomic():
+            for badge, new_awards in results:
+                badge_data = badge.get_stored_data()
+                awards = [Award(user_id=user_id, badge=badge_data,
+                                content_type_id=content_type_id,
+                                object_id=object_id, awarded_at=now)
+                          for user_id, content_type_id, object_id in new_awards]
+                Award.objects.bulk_create(awards, batch_size=options['batch_size'])
+                user_ids.update(award.user_id for award in awards)
+                # not all databases return the ids of the inserted rows
+                award_rows = Award.objects.filter(badge=badge_data, awarded_at=now
+                                                  ).values_list('id', 'user_id')
+                self.record_activities(list(award_rows), now, options['batch_size'])
+                if askbot_settings.BADGES_MODE == 'public':
+                    self.queue_messages(badge.key, [award.user_id for award in awards],
+                                        options['batch_size'])
+
+            self.recount_badge_data()
+            self.recount_user_badges(user_ids, options['batch_size'])
+
+        self.stdout.write('Awarded %d badges' % total)
+
+    @classmethod
+    def get_badges(cls, badge_keys):
+        """returns list of the enabled badge instances"""
+        keys = badge_keys or sorted(badges.BADGES.keys())
+        unknown_keys = [key for key in keys if key not in badges.BADGES]
+        if unknown_keys:
+            raise CommandError('Unknown badges: %s, valid badges are: %s' % (
+                                    ', '.join(unknown_keys),
+                                    ', '.join(sorted(badges.BADGES.keys()))))
+        badge_list = list()
+        for key in keys:
+            badge_class = badges.BADGES[key]
+            if badge_class.is_enabled():
+                badge_list.append(badge_class())
+        return badge_list
+
+    @classmethod
+    def get_new_awards_in_thread(cls, badge):
+        """runs ``get_new_awards`` and closes the db connection of the thread"""
+        try:
+            return cls.get_new_awards(badge)
+        finally:
+            connection.close()
+
+    @classmethod
+    def get_new_awards(cls, badge):
+        """returns pair (badge, list of new awards), where the awards
+        are tuples (user_id, content_type_id, object_id)"""
+        eligible = badge.get_eligible_awards()
+        if eligible is None:
+            return badge, list()
+
+        model, rows = eligible
+        content_type_id = ContentType.objects.get_for_model(model).pk
+        existing = Award.objects.filter(badge__slug=badge.key)
+        if badge.multiple:
+            seen = set(existing.values_list('user_id', 'content_type_id', 'object_id'))
+        else:
+            seen = set(existing.values_list('user_id', flat=True))
+
+        new_awards = list()
+        for user_id, object_id in rows:
+            if user_id is None:
                 continue
-            else:
-                cd = badges.CivicDuty()
-                awarded = cd.consider_award(
-                            actor=user,
-                            context_object=vote.voted_post,
-                            timestamp=now
-                        )
-                awarded_count += int(awarded)
-
-        print('Awarded %d badges' % awarded_count)
+            award = (user_id, content_type_id, object_id)
+            key = award if badge.multiple else user_id
+            if key not in seen:
+                seen.add(key)
+                new_awards.append(award)
+        return badge, new_awards
+
+    @classmethod
+    def record_activities(cls, award_rows, timestamp, batch_size):
+        """creates the award activities and their recipients,
+        same as the ``record_award_event`` signal receiver;
+        ``award_rows`` are pairs (award id, user id)"""
+        content_type = ContentType.objects.get_for_model(Award)
+        for batch in get_batches(award_rows, batch_size):
+            Activity.objects.bulk_create([
+                Activity(user_id=user_id, active_at=timestamp,
+                         content_type=content_type, object_id=award_id,
+                         activity_type=const.TYPE_ACTIVITY_PRIZE)
+                for award_id, user_id in batch
+            ])
+            activities = Activity.objects.filter(
+                                    activity_type=const.TYPE_ACTIVITY_PRIZE,
+                                    content_type=content_type,
+                                    object_id__in=[award_id for award_id, _ in batch]
+                                ).values_list('id', 'user_id')
+            ActivityAuditStatus.objects.bulk_create([
+                ActivityAuditStatus(user_id=user_id, activity_id=activity_id)
+                for activity_id, user_id in activities
+            ], ignore_conflicts=True)
+
+    @classmethod
+    def queue_messages(cls, badge_key, user_ids, batch_size):
+        """creates the messages about the awarded badge,
+        same as the ``notify_award_message`` signal receiver"""
+        for id_batch in get_batches(user_ids, batch_size):
+            users = User.objects.filter(id__in=id_batch).values_list(
+                                    'id', 'username', 'askbot_profile__primary_language')
+            Message.objects.bulk_create([
+                Message(user_id=user_id,
+                        message=get_award_message(User(id=user_id, username=username),
+                                                  badge_key, language_code))
+                for user_id, username, language_code in users
+            ])
+
+    @classmethod
+    def recount_badge_data(cls):
+        """sets ``awarded_count`` of all badges with one aggregate query"""
+        counts = dict(Award.objects.values_list('badge_id').annotate(num=Count('id')))
+        badge_data = list(BadgeData.objects.all())
+        for item in badge_data:
+            item.awarded_count = counts.get(item.id, 0)
+        BadgeData.objects.bulk_update(badge_data, ['awarded_count'])
+
+    @classmethod
+    def recount_user_badges(cls, user_ids, batch_size):
+        """recalculates the gold, silver and bronze badge counts
+        of the users, same as ``User.recount_badges``"""
+        levels = dict()
+        for key, badge_class in badges.BADGES.items():
+            if badge_class.is_enabled():
+                levels[key] = badges.get_badge(key).level
+
+        level_fields = {
+            const.GOLD_BADGE: 'gold',
+            const.SILVER_BADGE: 'silver',
+            const.BRONZE_BADGE: 'bronze'
+        }
+        for id_batch in get_batches(list(user_ids), batch_size):
+            counts = defaultdict(lambda: defaultdict(int))
+            rows = Award.objects.filter(
+                                user_id__in=id_batch
+                            ).values_list(
+                                'user_id', 'badge__slug'
+                            ).annotate(num=Count('id'))
+            for user_id, slug, num in rows:
+                if slug in levels:
+                    counts[user_id][level_fields[levels[slug]]] += num
+
+            profiles = list(UserProfile.objects.filter(pk__in=id_batch)) # pylint: disable=no-member
+            for profile in profiles:
+                for field in level_fields.values():
+                    setattr(profile, field, counts[profile.pk][field])
+            UserProfile.objects.bulk_update(profiles, list(level_fields.values())) # pylint: disable=no-member
+            profile_cache.delete_many([get_profile_cache_key(profile) for profile in profiles])
@@ -0,0 +1,42 @@
+"""Prints the cache hits, misses, sizes and latencies by key family.
+
+The numbers are collected by the
+``askbot.utils.cache_stats.InstrumentedCache`` cache backend.
+"""
+import json
+from django.core.management.base import BaseCommand, CommandError
+from askbot.utils.cache_stats import get_stats_storage, stats
+
+COLUMNS = ('hits', 'misses', 'hit_rate', 'sets', 'avg_set_bytes',
+           'deletes', 'avg_get_ms', 'set_ms')
+
+
+class Command(BaseCommand): # pylint: disable=missing-class-docstring
+    help = 'Prints the cache usage statistics by key family'
+
+    def add_arguments(self, parser): # pylint: disable=missing-function-docstring
+        parser.add_argument('--json', action='store_true',
+                            help='Print the statistics as JSON')
+        parser.add_argument('--reset', action='store_true',
+                            help='Delete the collected statistics')
+
+    def handle(self, *args, **options): # pylint: disable=missing-function-docstring
+        storage = get_stats_storage()
+        if storage is None:
+            raise CommandError('Cache instrumentation is not enabled, set BACKEND '
+                               'of the cache to askbot.utils.cache_stats.InstrumentedCache')
+
+        if options['reset']:
+            stats.reset(storage)
+            self.stdout.write('Cache statistics deleted')
+            return
+
+        totals = stats.get_totals(storage)
+        if options['json']:
+            self.stdout.write(json.dumps(totals, indent=2, sort_keys=True))
+            return
+
+        self.stdout.write(' '.join(['%-24s' % 'family'] + ['%13s' % col for col in COLUMNS]))
+        for family, values in totals.items():
+            cells = ['-' if values[col] is None else str(values[col]) for col in COLUMNS]
+            self.stdout.write(' '.join(['%-24s' % family] + ['%13s' % cell for cell in cells]))
@@ -0,0 +1,102 @@
+"""Management command deleting the analytics events older than
+``ASKBOT_ANALYTICS_EVENT_RETENTION_DAYS``, the summaries are kept.
+
+Only the events already compiled by ``askbot_compile_analytics``
+are deleted. The events are deleted in batches of ids, one short
+transaction per batch, so the table is not locked for long.
+On a partitioned events table (see ``askbot_partition_analytics_events``)
+the expired months are dropped as whole partitions first.
+
+Then the expired sessions which have no events left and whose time
+on site is already summarized are deleted the same way.
+"""
+import datetime
+import time
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from askbot.utils import analytics_partitions
+from askbot.models.analytics import Event, Session, SummaryWatermark
+
+# watermarks of the compilation steps reading the events
+EVENT_WATERMARKS = ('events', 'question-views', 'activity-rollups')
+
+
+def get_last_compiled_event_id():
+    """returns the id of the last event compiled by all the steps
+    of ``askbot_compile_analytics``"""
+    watermarks = SummaryWatermark.objects.filter(name__in=EVENT_WATERMARKS) # pylint: disable=no-member
+    last_ids = list(watermarks.values_list('last_id', flat=True))
+    if len(last_ids) < len(EVENT_WATERMARKS):
+        return 0
+    return min(last_ids)
+
+
+def delete_in_batches(queryset, batch_size, pause=0):
+    """deletes the items of the query set, ``batch_size`` ids
+    at a time, in the order of the ids; returns the number of
+    the deleted items"""
+    count = 0
+    while True:
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return count
+        count += queryset.model.objects.filter(id__in=ids).delete()[0]
+        if pause:
+            time.sleep(pause)
+
+
+class Command(BaseCommand): # pylint: disable=missing-class-docstring
+    help = 'Deletes the expired analytics events and sessions'
+
+    def add_arguments(self, parser): # pylint: disable=missing-function-docstring
+        parser.add_argument('--days', type=int,
+                            default=django_settings.ASKBOT_ANALYTICS_EVENT_RETENTION_DAYS,
+                            help='Number of days the events are kept')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of the rows deleted with one query')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Number of seconds to wait after each batch')
+        parser.add_argument('--silent', action='store_true', help='Do not print the results')
+
+    def handle(self, *args, **options): # pylint: disable=missing-function-docstring
+        days = options['days']
+        if days <= 0:
+            raise CommandError('Set ASKBOT_ANALYTICS_EVENT_RETENTION_DAYS or use --days')
+
+        cutoff = timezone.now() - datetime.timedelta(days=days)
+        last_id = get_last_compiled_event_id()
+
+        dropped = self.drop_expired_partitions(cutoff, last_id)
+
+        events = Event.objects.filter(timestamp__lt=cutoff, id__lte=last_id) # pylint: disable=no-member
+        deleted = delete_in_batches(events, options['batch_size'], options['pause'])
+
+        sessions = Session.objects.filter(updated_at__lt=cutoff) # pylint: disable=no-member
+        sessions = sessions.filter(Q(user__isnull=True) |
+                                   Q(last_summarized_at__gte=F('updated_at')))
+        sessions = sessions.filter(~Exists(Event.objects.filter(session_id=OuterRef('id')))) # pylint: disable=no-member
+        deleted_sessions = delete_in_batches(sessions, options['batch_size'], options['pause'])
+
+        if not options['silent']:
+            print(f'Dropped partitions: {", ".join(dropped) or "none"}')
+            print(f'Deleted events: {deleted}, deleted sessions: {deleted_sessions}')
+
+    @classmethod
+    def drop_expired_partitions(cls, cutoff, last_id):
+        """drops the monthly partitions of the events ended
+        before the cutoff and compiled entirely,
+        returns names of the dropped partitions"""
+        if not analytics_partitions.is_partitioned():
+            return []
+
+        dropped = list()
+        for month_start, name in analytics_partitions.get_partitions():
+            if analytics_partitions.get_next_month_start(month_start) > cutoff:
+                break
+            if analytics_partitions.get_max_event_id(name) > last_id:
+                break
+            analytics_partitions.drop_partition(name)
+            dropped.append(name)
+        return dropped
@@ -1,190 +1,399 @@
 """Management commands for Askbot Analytics Events.
 Compiles summaries of Askbot Analytics Events in the
 per-user and per-group Summary tables.
+
+The events are counted with ``GROUP BY`` queries over ranges of
+event ids and the summaries are written with bulk inserts and
+updates. The progress is kept in the ``SummaryWatermark`` rows:
+the id of the last summarized event and the ends of the last
+compiled hour and day. Rows marked ``summarized`` by the earlier
+versions of the command are skipped.
 """
+import bisect
 import datetime
+from collections import defaultdict
+from django.conf import settings as django_settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 from django.db import models, transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncDate, TruncHour
 from django.core.management.base import BaseCommand
+from django.utils import timezone
+from askbot.utils.cache import invalidate_namespace
 from askbot.utils.console import ProgressBar
+from askbot.utils.analytics_utils import (ANALYTICS_CACHE_NAMESPACE,
+                                          get_all_named_segment_group_ids,
+                                          get_analytics_default_segment_config)
+from askbot.models import Post
+from askbot.models.user import Group
 from askbot.models.analytics import (
-    Event, DailyGroupSummary, HourlyGroupSummary,
-    DailyUserSummary, HourlyUserSummary, Session
+    Event, DailyActivityRollup, DailyGroupSummary, HourlyGroupSummary, DailyUserSummary,
+    HourlyUserSummary, QuestionViewCount, Session, SummaryWatermark
 )
 
+UTC = datetime.timezone.utc
+ONE_HOUR = datetime.timedelta(hours=1)
+ONE_DAY = datetime.timedelta(days=1)
+
+SUMMARY_FIELDS = ('num_questions', 'num_answers', 'num_upvotes',
+                  'num_downvotes', 'question_views', 'time_on_site')
+# fields storing the latest value rather than a sum
+REPLACED_FIELDS = ('num_users',)
+EVENT_TYPE_FIELDS = {
+    Event.EVENT_TYPE_ASKED: 'num_questions',
+    Event.EVENT_TYPE_ANSWERED: 'num_answers',
+    Event.EVENT_TYPE_UPVOTED: 'num_upvotes',
+    Event.EVENT_TYPE_DOWNVOTED: 'num_downvotes',
+    Event.EVENT_TYPE_QUESTION_VIEWED: 'question_views',
+}
+
+
+def get_watermark(name):
+    """returns the ``SummaryWatermark`` by name, creates it if necessary"""
+    return SummaryWatermark.objects.get_or_create(name=name)[0] # pylint: disable=no-member
+
+
+def get_summary_sums():
+    """returns the ``Sum`` aggregates of the summary fields"""
+    return {field: Sum(field) for field in SUMMARY_FIELDS}
+
+
+def get_member_join_dates(group_ids):
+    """returns dictionary of the sorted join dates of the group members by group id"""
+    memberships = User.groups.through.objects.filter(group_id__in=group_ids)
+    join_dates = defaultdict(list)
+    for group_id, date_joined in memberships.values_list('group_id', 'user__date_joined'):
+        join_dates[group_id].append(date_joined)
+    for dates in join_dates.values():
+        dates.sort()
+    return join_dates
+
+
+def count_members(join_dates, start, end):
+    """returns the number of the members joined before the ``end``
+    and the number of those joined since the ``start``"""
+    num_users = bisect.bisect_left(join_dates, end)
+    return num_users, num_users - bisect.bisect_left(join_dates, start)
+
+
+def upsert_summaries(model, key_fields, rows, batch_size):
+    """Adds the values to the summaries, creating the missing ones.
+    ``rows`` maps the tuples of the ``key_fields`` values to the
+    dictionaries of the field values. The values of the
+    ``REPLACED_FIELDS`` replace the stored ones, the others are added.
+    """
+    if not rows:
+        return
+
+    filters = Q()
+    for index, field in enumerate(key_fields):
+        values = {key[index] for key in rows}
+        field_filter = Q(**{f'{field}__in': values - {None}})
+        if None in values: # not matched by __in
+            field_filter |= Q(**{f'{field}__isnull': True})
+        filters &= field_filter
+    existing = dict()
+    for summary in model.objects.filter(filters):
+        existing[tuple(getattr(summary, field) for field in key_fields)] = summary
+
+    created, updated, updated_fields = list(), list(), set()
+    for key, values in rows.items():
+        summary = existing.get(key)
+        if summary is None:
+            summary = model(**dict(zip(key_fields, key)))
+            created.append(summary)
+        elif values:
+            updated.append(summary)
+        for field, value in values.items():
+            if field not in REPLACED_FIELDS:
+                value += getattr(summary, field)
+            setattr(summary, field, value)
+            updated_fields.add(field)
+
+    model.objects.bulk_create(created, batch_size=batch_size)
+    if updated:
+        model.objects.bulk_update(updated, sorted(updated_fields), batch_size=batch_size)
+
+
+def get_views_by_segment(views):
+    """yields (segment slug, query set) of the views by the users
+    of each named segment and of the default segment"""
+    for segment in django_settings.ASKBOT_ANALYTICS_NAMED_SEGMENTS:
+        yield segment['slug'], views.filter(session__user__groups__in=segment['group_ids'])
+    yield (get_analytics_default_segment_config()['slug'],
+           views.exclude(session__user__groups__in=get_all_named_segment_group_ids()))
+
+
+def chunks(iterable, size):
+    """yields lists of up to ``size`` items of the iterable"""
+    chunk = list()
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = list()
+    if chunk:
+        yield chunk
+
+
 class Command(BaseCommand): # pylint: disable=missing-class-docstring, too-few-public-methods
 
     def add_arguments(self, parser): # pylint: disable=missing-function-docstring
         parser.add_argument('--silent', action='store_true', help='Print progress on the console')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Number of the event ids summarized in one transaction')
 
     def handle(self, *args, **options): # pylint: disable=missing-function-docstring
         """
-        Filters unsummarized analytics events.
-        Iterates over the events, and calculates per user summaries
-        per date.
+        Counts the new events by hour, user and event type
+        into the hourly per-user summaries, the question views
+        by analytics segment and the events by day, group and thread
+        into the activity rollups.
 
-        THen iterates over the per-user summaries and combines them
-        into the per-group summaries.
+        Then combines the per-user summaries of the finished hours
+        into the daily per-user and the per-group summaries.
         """
-        now = datetime.datetime.now()
+        now = timezone.now()
+        if django_settings.ASKBOT_ANALYTICS_EVENT_BUFFER_SIZE > 1:
+            # buffered events are saved late, their hour must not be compiled yet
+            now -= datetime.timedelta(seconds=django_settings.ASKBOT_ANALYTICS_EVENT_BUFFER_SECONDS)
         self.summarize_events(options) # to hourly user summaries
+        self.count_question_views(options) # to per-segment question view counts
+        self.compile_activity_rollups(options) # to daily event counts by group and thread
         self.extract_time_on_site_from_sessions(options)
         self.compile_hourly_user_summaries(options, now) # to daily user and hourly group summaries
         self.compile_hourly_group_summaries(options, now)
         self.compile_daily_group_summaries(options, now)
+        invalidate_namespace(ANALYTICS_CACHE_NAMESPACE)
 
 
     def summarize_events(self, options):
-        """Compiles events into hourly per-user summaries"""
-        events = Event.objects.filter(summarized=False).order_by('timestamp') # pylint: disable=no-member
-        events_count = events.count()
-        message = 'Compiling Events:'
-        silent = options['silent']
-        for event in ProgressBar(events.iterator(), events_count, message=message, silent=silent):
-            self.summarize_event(event)
+        """Compiles events into hourly per-user summaries,
+        one range of event ids per transaction"""
+        watermark = get_watermark('events')
+        max_id = Event.objects.aggregate(max_id=Max('id'))['max_id'] or 0 # pylint: disable=no-member
+        batch_size = options['batch_size']
+        starts = range(watermark.last_id, max_id, batch_size)
+        for start in ProgressBar(iter(starts), len(starts), message='Compiling Events:',
+                                 silent=options['silent']):
+            self.summarize_event_range(watermark, start, min(start + batch_size, max_id),
+                                       batch_size)
+
+
+    @transaction.atomic
+    def summarize_event_range(self, watermark, start, end, batch_size):
+        """Adds up the events with ids in the (start, end] range
+        into the hourly user summaries"""
+        events = Event.objects.filter(id__gt=start, id__lte=end, summarized=False, # pylint: disable=no-member
+                                      session__user__isnull=False)
+        counts = events.annotate(hour=TruncHour('timestamp', tzinfo=UTC))
+        counts = counts.values('hour', 'session__user_id', 'event_type')
+        counts = counts.annotate(count=Count('id')).order_by()
+
+        rows = defaultdict(dict)
+        for item in counts:
+            values = rows[(item['hour'], item['session__user_id'])]
+            field = EVENT_TYPE_FIELDS.get(item['event_type'])
+            if field:
+                values[field] = values.get(field, 0) + item['count']
+
+        upsert_summaries(HourlyUserSummary, ('hour', 'user_id'), rows, batch_size)
+        SummaryWatermark.objects.filter(id=watermark.id).update(last_id=end) # pylint: disable=no-member
+
+
+    def count_question_views(self, options):
+        """Adds the question views to the per-segment view counts
+        of the questions, one range of event ids per transaction"""
+        watermark = get_watermark('question-views')
+        max_id = Event.objects.aggregate(max_id=Max('id'))['max_id'] or 0 # pylint: disable=no-member
+        batch_size = options['batch_size']
+        starts = range(watermark.last_id, max_id, batch_size)
+        for start in ProgressBar(iter(starts), len(starts), message='Counting Question Views:',
+                                 silent=options['silent']):
+            self.count_question_views_in_range(watermark, start, min(start + batch_size, max_id),
+                                               batch_size)
+
+
+    @transaction.atomic
+    def count_question_views_in_range(self, watermark, start, end, batch_size):
+        """Counts the question views with ids in the (start, end] range by segment"""
+        views = Event.objects.filter(id__gt=start, id__lte=end, # pylint: disable=no-member
+                                     event_type=Event.EVENT_TYPE_QUESTION_VIEWED,
+                                     content_type=ContentType.objects.get_for_model(Post))
+        rows = dict()
+        for segment, segment_views in get_views_by_segment(views):
+            counts = segment_views.values('object_id').annotate(count=Count('id', distinct=True))
+            for item in counts.order_by():
+                rows[(item['object_id'], segment)] = {'views_count': item['count']}
+
+        question_ids = Post.objects.get_questions().filter(id__in={key[0] for key in rows})
+        question_ids = set(question_ids.values_list('id', flat=True))
+        rows = {key: values for key, values in rows.items() if key[0] in question_ids}
+        upsert_summaries(QuestionViewCount, ('question_id', 'segment'), rows, batch_size)
+        SummaryWatermark.objects.filter(id=watermark.id).update(last_id=end) # pylint: disable=no-member
+
+
+    def compile_activity_rollups(self, options):
+        """Adds the events to the daily activity rollups,
+        one range of event ids per transaction"""
+        watermark = get_watermark('activity-rollups')
+        max_id = Event.objects.aggregate(max_id=Max('id'))['max_id'] or 0 # pylint: disable=no-member
+        batch_size = options['batch_size']
+        starts = range(watermark.last_id, max_id, batch_size)
+        for start in ProgressBar(iter(starts), len(starts), message='Compiling Activity Rollups:',
+                                 silent=options['silent']):
+            self.compile_activity_rollups_in_range(watermark, start, min(start + batch_size, max_id),
+                                                   batch_size)
 
 
     @transaction.atomic
-    def summarize_event(self, event):
-        """Adds up event stats into the hourly user summary"""
-        hour = event.timestamp.replace(minute=0, second=0, microsecond=0)
-        user = event.session.user
-        user_summary, _ = HourlyUserSummary.objects.get_or_create(hour=hour, # pylint: disable=no-member
-                                                                  user=user)
-        user_summary.add_event(event)
-        user_summary.save()
-        Event.objects.filter(id=event.id).update(summarized=True) # pylint: disable=no-member
+    def compile_activity_rollups_in_range(self, watermark, start, end, batch_size):
+        """Counts the events with ids in the (start, end] range
+        by day, event type, analytics group and thread"""
+        posts = Post.objects.filter(id=OuterRef('object_id')).values('thread_id')
+        post_content_type = ContentType.objects.get_for_model(Post)
+        events = Event.objects.filter(id__gt=start, id__lte=end) # pylint: disable=no-member
+        # dates in the current time zone, like the date filters of the activity page
+        events = events.annotate(date=TruncDate('timestamp'),
+                                 thread=models.Case(
+                                     models.When(content_type=post_content_type,
+                                                 then=Subquery(posts[:1])),
+                                     default=None,
+                                     output_field=IntegerField()
+                                 ))
+
+        rows = dict()
+        totals = events.values('date', 'event_type', 'thread').annotate(count=Count('id'))
+        for item in totals.order_by():
+            rows[(item['date'], item['event_type'], None, item['thread'])] = {'count': item['count']}
+
+        group_ids = Group.objects.filter(used_for_analytics=True).values_list('id', flat=True)
+        by_group = events.values('date', 'event_type', 'thread', group=F('session__user__groups__id'))
+        by_group = by_group.filter(group__in=list(group_ids)).annotate(count=Count('id'))
+        for item in by_group.order_by():
+            key = (item['date'], item['event_type'], item['group'], item['thread'])
+            rows[key] = {'count': item['count']}
+
+        upsert_summaries(DailyActivityRollup, ('date', 'event_type', 'group_id', 'thread_id'),
+                         rows, batch_size)
+        SummaryWatermark.objects.filter(id=watermark.id).update(last_id=end) # pylint: disable=no-member
 
 
     def extract_time_on_site_from_sessions(self, options):
         """Updates the time on site in the per-user hourly summaries"""
         message = 'Updating the time on site:'
-        sessions = Session.objects.filter(last_summarized_at__lt=models.F('updated_at')) # pylint: disable=no-member
+        sessions = Session.objects.filter(last_summarized_at__lt=models.F('updated_at'), # pylint: disable=no-member
+                                          user__isnull=False)
         sessions = sessions.order_by('updated_at')
-        for session in ProgressBar(sessions.iterator(), sessions.count(),
-                                   message=message, silent=options['silent']):
-            self.extract_time_on_site_from_session(session)
+        batch_size = options['batch_size']
+        session_chunks = chunks(sessions.iterator(), batch_size)
+        count = -(-sessions.count() // batch_size)
+        for chunk in ProgressBar(session_chunks, count, message=message,
+                                 silent=options['silent']):
+            self.extract_time_on_site_from_session_chunk(chunk, batch_size)
 
 
     @transaction.atomic
-    def extract_time_on_site_from_session(self, session):
-        """Calculates the time on site for the session"""
-        if session.updated_at <= session.last_summarized_at:
-            return
-
-        sess_start = session.created_at
-        sess_end = session.updated_at
-        user_id = session.user_id
-        hour = sess_start.replace(minute=0, second=0, microsecond=0)
-        while hour <= sess_end:
-            window_start = max(sess_start, hour)
-            window_end = min(sess_end, hour + datetime.timedelta(hours=1))
-            window_duration = window_end - window_start
-            summary, _ = HourlyUserSummary.objects.get_or_create(hour=hour, user_id=user_id) # pylint: disable=no-member
-            # this should be correct as long as there are no overlapping sessions for the same user
-            summary.time_on_site += window_duration
-            summary.save()
-
-            hour += datetime.timedelta(hours=1)
-
-        session.last_summarized_at = sess_end
-        session.save()
-
+    def extract_time_on_site_from_session_chunk(self, sessions, batch_size):
+        """Adds the time spent in the sessions since they were
+        last summarized to the hourly user summaries"""
+        rows = defaultdict(lambda: {'time_on_site': datetime.timedelta(0)})
+        for session in sessions:
+            sess_start = session.last_summarized_at
+            sess_end = session.updated_at
+            hour = sess_start.astimezone(UTC).replace(minute=0, second=0, microsecond=0)
+            while hour < sess_end:
+                window_start = max(sess_start, hour)
+                window_end = min(sess_end, hour + ONE_HOUR)
+                # this should be correct as long as there are no overlapping sessions for the same user
+                rows[(hour, session.user_id)]['time_on_site'] += window_end - window_start
+                hour += ONE_HOUR
+            session.last_summarized_at = sess_end
 
-    def compile_hourly_user_summaries(self, options, cutoff_time):
-        """Compiles hourly per-user summaries into daily per-user summaries"""
-        hourly_summaries = HourlyUserSummary.objects.filter(summarized=False) # pylint: disable=no-member
-        cutoff_hour = cutoff_time.replace(minute=0, second=0, microsecond=0)
-        hourly_summaries = hourly_summaries.filter(hour__lt=cutoff_hour) # before current hour
-        hourly_summaries = hourly_summaries.order_by('hour')
-        count = hourly_summaries.count()
-        message = 'Compiling User Hourly Summaries:'
-        silent = options['silent']
-        for hourly_summary in ProgressBar(hourly_summaries.iterator(), count,
-                                          message=message, silent=silent):
-            self.compile_hourly_user_summary(hourly_summary)
+        upsert_summaries(HourlyUserSummary, ('hour', 'user_id'), rows, batch_size)
+        Session.objects.bulk_update(sessions, ['last_summarized_at'], batch_size=batch_size) # pylint: disable=no-member
 
 
     @transaction.atomic
-    def compile_hourly_user_summary(self, hourly_user_summary):
-        """Adds up user hourly summary to the user daily summary
-        and the group hourly summaries"""
-        groups = hourly_user_summary.user.get_groups(used_for_analytics=True)
-        hour = hourly_user_summary.hour
-        for group in groups:
-            group_summary, _ = HourlyGroupSummary.objects.get_or_create(hour=hour, # pylint: disable=no-member
-                                                                        group=group)
-            group_summary += hourly_user_summary
-            group_summary.save()
-
-        daily_user_summary, _ = DailyUserSummary.objects.get_or_create( # pylint: disable=no-member
-                                                date=hourly_user_summary.hour.date(),
-                                                user=hourly_user_summary.user)
-        daily_user_summary += hourly_user_summary
-        daily_user_summary.save()
-
-        # it is important that the hour of this summary has elapsed
-        HourlyUserSummary.objects.filter(id=hourly_user_summary.id).update(summarized=True) # pylint: disable=no-member
+    def compile_hourly_user_summaries(self, options, cutoff_time):
+        """Adds up the hourly per-user summaries of the finished hours
+        into the daily per-user summaries and the hourly per-group summaries"""
+        watermark = get_watermark('hourly-user-summaries')
+        cutoff_hour = cutoff_time.astimezone(UTC).replace(minute=0, second=0, microsecond=0)
+        summaries = HourlyUserSummary.objects.filter(hour__lt=cutoff_hour, summarized=False) # pylint: disable=no-member
+        if watermark.last_time:
+            summaries = summaries.filter(hour__gte=watermark.last_time)
 
+        daily = summaries.annotate(date=TruncDate('hour', tzinfo=UTC))
+        daily = daily.values('date', 'user_id').annotate(**get_summary_sums()).order_by()
+        rows = {(item.pop('date'), item.pop('user_id')): item for item in daily}
+        upsert_summaries(DailyUserSummary, ('date', 'user_id'), rows, options['batch_size'])
 
-    def compile_hourly_group_summaries(self, options, cutoff_time):
-        """Compiles hourly per-group summaries into daily per-group summaries"""
-        message = 'Compile hourly group summaries: '
-        hourly_group_summaries = HourlyGroupSummary.objects.filter(summarized=False) # pylint: disable=no-member
-        cutoff_hour = cutoff_time.replace(minute=0, second=0, microsecond=0)
-        # hour must be completed
-        hourly_group_summaries = hourly_group_summaries.filter(hour__lt=cutoff_hour)
-        hourly_group_summaries = hourly_group_summaries.order_by('hour')
-        count = hourly_group_summaries.count()
-        iterator = hourly_group_summaries.iterator() # pylint: disable=no-member
-        for group_summary in ProgressBar(iterator, count, message=message,
-                                         silent=options['silent']):
-            self.compile_hourly_group_summary(group_summary)
+        group_ids = Group.objects.filter(used_for_analytics=True).values_list('id', flat=True)
+        hourly = summaries.values('hour', group_id=F('user__group_membership__group_id'))
+        hourly = hourly.filter(group_id__in=list(group_ids))
+        hourly = hourly.annotate(**get_summary_sums()).order_by()
+        rows = {(item.pop('hour'), item.pop('group_id')): item for item in hourly}
+        upsert_summaries(HourlyGroupSummary, ('hour', 'group_id'), rows, options['batch_size'])
+
+        watermark.last_time = cutoff_hour
+        watermark.save()
 
 
     @transaction.atomic
-    def compile_hourly_group_summary(self, hourly_group_summary):
+    def compile_hourly_group_summaries(self, options, cutoff_time):
         """
-        1. Adds hourly per-group summary into daily per-group summary
-        2. Updates the total number of users in the group that joined before the end of the hour
-        3. Updates the number of users that joined the group during the hour
+        1. Updates the total number of users in the group that joined before the end of the hour
+        2. Updates the number of users that joined the group during the hour
+        3. Adds hourly per-group summaries into daily per-group summaries
         """
-        join_date_cutoff = hourly_group_summary.hour + datetime.timedelta(hours=1)
-        users = hourly_group_summary.group.user_set.filter(date_joined__lt=join_date_cutoff) # pylint: disable=no-member
-        hourly_group_summary.num_users = users.count()
-        users_joined = users.filter(date_joined__gte=hourly_group_summary.hour)
-        hourly_group_summary.num_users_added = users_joined.count()
+        watermark = get_watermark('hourly-group-summaries')
+        cutoff_hour = cutoff_time.astimezone(UTC).replace(minute=0, second=0, microsecond=0)
+        summaries = HourlyGroupSummary.objects.filter(hour__lt=cutoff_hour, summarized=False) # pylint: disable=no-member
+        if watermark.last_time:
+            summaries = summaries.filter(hour__gte=watermark.last_time)
+        summaries = list(summaries.order_by('hour'))
+
+        join_dates = get_member_join_dates({summary.group_id for summary in summaries})
+        rows = defaultdict(dict)
+        for summary in summaries:
+            summary.num_users, summary.num_users_added = count_members(
+                join_dates[summary.group_id], summary.hour, summary.hour + ONE_HOUR
+            )
+            values = rows[(summary.hour.astimezone(UTC).date(), summary.group_id)]
+            for field in SUMMARY_FIELDS + ('num_users_added',):
+                value = getattr(summary, field)
+                values[field] = values[field] + value if field in values else value
+            values['num_users'] = summary.num_users # the last hour is the correct one
 
-        daily_group_summary, _ = DailyGroupSummary.objects.get_or_create( # pylint: disable=no-member
-                                                date=hourly_group_summary.hour.date(),
-                                                group=hourly_group_summary.group)
-        daily_group_summary += hourly_group_summary
-        daily_group_summary.save()
+        HourlyGroupSummary.objects.bulk_update(summaries, ['num_users', 'num_users_added'], # pylint: disable=no-member
+                                               batch_size=options['batch_size'])
+        upsert_summaries(DailyGroupSummary, ('date', 'group_id'), rows, options['batch_size'])
 
-        hourly_group_summary.summarized = True
-        hourly_group_summary.save()
+        watermark.last_time = cutoff_hour
+        watermark.save()
 
 
+    @transaction.atomic
     def compile_daily_group_summaries(self, options, cutoff_time):
-        """Calculates num_users, num_users_added for the daily group summaries"""
-        summaries = DailyGroupSummary.objects.filter(summarized=False) # pylint: disable=no-member
-        cutoff_day = cutoff_time.date()
-        summaries = summaries.filter(date__lt=cutoff_day) # only summarize finished days
-        for summary in ProgressBar(summaries.iterator(), summaries.count(),
-                                   message='Compiling Daily Group Summaries:',
-                                   silent=options['silent']):
-            self.compaile_daily_group_summary(summary)
+        """Calculates num_users, num_users_added for the daily group summaries
+        of the finished days"""
+        watermark = get_watermark('daily-group-summaries')
+        cutoff_day = cutoff_time.astimezone(UTC).date()
+        summaries = DailyGroupSummary.objects.filter(date__lt=cutoff_day, summarized=False) # pylint: disable=no-member
+        if watermark.last_time:
+            summaries = summaries.filter(date__gte=watermark.last_time.astimezone(UTC).date())
+        summaries = list(summaries)
 
+        join_dates = get_member_join_dates({summary.group_id for summary in summaries})
+        for summary in summaries:
+            day_start = datetime.datetime.combine(summary.date, datetime.time.min, tzinfo=UTC)
+            summary.num_users, summary.num_users_added = count_members(
+                join_dates[summary.group_id], day_start, day_start + ONE_DAY
+            )
 
-    @transaction.atomic
-    def compaile_daily_group_summary(self, summary):
-        """Recalculates num_users, num_users_added for the daily group summary."""
-        day = summary.date
-        day_start_dt = datetime.datetime.combine(day, datetime.time.min)
-        day_end_dt = day_start_dt + datetime.timedelta(days=1)
-        users_in_group = summary.group.user_set.filter(date_joined__lt=day_end_dt)
-        users_joined = users_in_group.filter(date_joined__gte=day_start_dt)
-        DailyGroupSummary.objects.filter(id=summary.id).update( # pylint: disable=no-member
-            num_users=users_in_group.count(),
-            num_users_added=users_joined.count(),
-            summarized=True
-        )
+        DailyGroupSummary.objects.bulk_update(summaries, ['num_users', 'num_users_added'], # pylint: disable=no-member
+                                              batch_size=options['batch_size'])
+        watermark.last_time = datetime.datetime.combine(cutoff_day, datetime.time.min, tzinfo=UTC)
+        watermark.save()
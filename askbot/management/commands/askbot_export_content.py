@@ -0,0 +1,42 @@
+"""Exports the public threads, posts, revisions and tags
+as newline-delimited JSON, see ``askbot.utils.content_export``.
+
+The last line is the watermark, pass its ``updated_since``
+value with ``--updated-since`` to export only the changes.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from askbot.utils import content_export
+
+
+class Command(BaseCommand): # pylint: disable=missing-class-docstring
+    help = 'Exports the public content as newline-delimited JSON'
+
+    def add_arguments(self, parser): # pylint: disable=missing-function-docstring
+        parser.add_argument('--updated-since',
+                            help='ISO 8601 date and time or seconds since the epoch, '
+                                 'export only the content changed since then')
+        parser.add_argument('--types', default=','.join(content_export.EXPORT_TYPES),
+                            help='Comma-separated list of the exported types, '
+                                 'default: %(default)s')
+        parser.add_argument('--chunk-size', type=int, default=content_export.DEFAULT_CHUNK_SIZE,
+                            help='Number of rows fetched from the database at a time')
+        parser.add_argument('--output', help='Output file, default - the standard output')
+
+    def handle(self, *args, **options): # pylint: disable=missing-function-docstring
+        try:
+            updated_since = content_export.parse_updated_since(options['updated_since'])
+        except ValueError as error:
+            raise CommandError(str(error)) from error
+
+        types = options['types'].split(',')
+        unknown_types = set(types) - set(content_export.EXPORT_TYPES)
+        if unknown_types:
+            raise CommandError('Unknown types: ' + ', '.join(sorted(unknown_types)))
+
+        lines = content_export.iter_lines(updated_since, types, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
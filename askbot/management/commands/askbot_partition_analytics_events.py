@@ -0,0 +1,48 @@
+"""Management command partitioning the analytics events table
+by month on PostgreSQL, see ``askbot.utils.analytics_partitions``.
+
+The first run converts the table, copying all the events.
+The next runs create the partitions of the coming months,
+the command should be run periodically, e.g. monthly via cron.
+"""
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from askbot.utils import analytics_partitions
+from askbot.utils.console import get_yes_or_no
+
+CONVERSION_CONFIRMATION_MESSAGE = """The analytics events table will be replaced
+with a partitioned table. All the events will be copied, the table
+is locked until the copying is done. Continue?
+"""
+
+class Command(BaseCommand): # pylint: disable=missing-class-docstring
+    help = 'Partitions the analytics events table by month (PostgreSQL only)'
+
+    def add_arguments(self, parser): # pylint: disable=missing-function-docstring
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Number of the future months to create the partitions for')
+        parser.add_argument('--silent', action='store_true',
+                            help='Do not ask for confirmation and do not print progress')
+
+    def handle(self, *args, **options): # pylint: disable=missing-function-docstring
+        if not analytics_partitions.is_supported():
+            raise CommandError('Partitioning of the analytics events requires PostgreSQL')
+
+        months_ahead = options['months_ahead']
+        if not analytics_partitions.is_partitioned():
+            if not options['silent']:
+                answer = get_yes_or_no(CONVERSION_CONFIRMATION_MESSAGE, default='no')
+                if answer != 'yes':
+                    print('Aborting')
+                    sys.exit(1)
+            analytics_partitions.partition_events_table(months_ahead)
+            if not options['silent']:
+                print('The analytics events table is partitioned')
+            return
+
+        names = analytics_partitions.create_partitions(
+            timezone.now(), analytics_partitions.get_last_month_start(months_ahead)
+        )
+        if not options['silent']:
+            print('Partitions: ' + ', '.join(names))
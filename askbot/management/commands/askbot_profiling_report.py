@@ -0,0 +1,109 @@
+"""Summarizes the slow request log written by
+``askbot.middleware.profiling.ProfilingMiddleware``.
+
+Reads the log files (or the standard input), groups the
+logged requests by view and prints the worst views first.
+Lines not containing a JSON object are skipped, so the log
+may be written with any formatter prefixing the message.
+"""
+import json
+import sys
+from collections import Counter, defaultdict
+from django.core.management.base import BaseCommand
+
+SORT_KEYS = ('total_ms', 'max_ms', 'p95_ms', 'avg_queries', 'requests')
+
+
+def get_percentile(values, fraction):
+    """returns the value at the ``fraction`` of the sorted list"""
+    values = sorted(values)
+    index = min(int(len(values) * fraction), len(values) - 1)
+    return values[index]
+
+
+def read_entries(lines):
+    """yields the logged request summaries"""
+    for line in lines:
+        start = line.find('{')
+        if start == -1:
+            continue
+        try:
+            entry = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(entry, dict) and 'duration_ms' in entry:
+            yield entry
+
+
+def aggregate(entries):
+    """returns list of the per-view statistics"""
+    groups = defaultdict(list)
+    for entry in entries:
+        view = entry.get('view') or entry.get('path')
+        groups[view].append(entry)
+
+    result = list()
+    for view, items in groups.items():
+        durations = [item['duration_ms'] for item in items]
+        queries = [item['queries'] for item in items]
+        duplicates = Counter()
+        for item in items:
+            for duplicate in item.get('duplicate_queries', ()):
+                duplicates[duplicate['fingerprint']] += duplicate['count']
+        result.append({
+            'view': view,
+            'requests': len(items),
+            'total_ms': round(sum(durations), 1),
+            'max_ms': max(durations),
+            'p95_ms': get_percentile(durations, 0.95),
+            'avg_queries': round(float(sum(queries)) / len(items), 1),
+            'max_queries': max(queries),
+            'avg_sql_ms': round(sum(item['sql_ms'] for item in items) / len(items), 1),
+            'avg_template_ms': round(sum(item.get('template_ms', 0) for item in items) / len(items), 1),
+            'avg_cache_calls': round(float(sum(item.get('cache_calls', 0) for item in items)) / len(items), 1),
+            'top_duplicate_queries': [{'fingerprint': fingerprint, 'count': count}
+                                      for fingerprint, count in duplicates.most_common(3)],
+        })
+    return result
+
+
+class Command(BaseCommand): # pylint: disable=missing-class-docstring
+    help = 'Prints the worst endpoints found in the slow request log'
+
+    def add_arguments(self, parser): # pylint: disable=missing-function-docstring
+        parser.add_argument('log_files', nargs='*',
+                            help='Log files, the standard input is read by default')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='total_ms',
+                            help='Sort the views by this number')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Number of the printed views')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the report as JSON')
+
+    def handle(self, *args, **options): # pylint: disable=missing-function-docstring
+        entries = list()
+        if options['log_files']:
+            for path in options['log_files']:
+                with open(path, encoding='utf-8') as log_file:
+                    entries.extend(read_entries(log_file))
+        else:
+            entries.extend(read_entries(sys.stdin))
+
+        report = aggregate(entries)
+        report.sort(key=lambda item: item[options['sort']], reverse=True)
+        report = report[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for item in report:
+            self.stdout.write(
+                '%(view)s: %(requests)d requests, total %(total_ms)sms, '
+                'max %(max_ms)sms, p95 %(p95_ms)sms, %(avg_queries)s queries '
+                '(max %(max_queries)d, %(avg_sql_ms)sms), '
+                'template %(avg_template_ms)sms, '
+                '%(avg_cache_calls)s cache calls' % item
+            )
+            for duplicate in item['top_duplicate_queries']:
+                self.stdout.write('    %(count)dx %(fingerprint)s' % duplicate)
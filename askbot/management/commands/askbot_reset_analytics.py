@@ -6,13 +6,16 @@ from django.db import models
 from django.core.management.base import BaseCommand
 from askbot.utils.console import get_yes_or_no
 from askbot.models.analytics import (
-    Event, DailyGroupSummary, HourlyGroupSummary,
-    DailyUserSummary, HourlyUserSummary, Session
+    Event, DailyActivityRollup, DailyGroupSummary, HourlyGroupSummary,
+    DailyUserSummary, HourlyUserSummary, QuestionViewCount,
+    Session, SummaryWatermark
 )
 
 RESET_CONFIRMATION_MESSAGE = """Are you you want to reset all analytics data?
 This will mark all events and sessions as unsummarized
-and delete all the hourly and daily event summaries.
+and delete all the hourly and daily event summaries,
+the activity rollups, the question view counts and the summary watermarks.
+The events deleted by askbot_compact_analytics will be missing from the new summaries.
 """
 
 class Command(BaseCommand): # pylint: disable=missing-class-docstring, too-few-public-methods
@@ -44,4 +47,7 @@ class Command(BaseCommand): # pylint: disable=missing-class-docstring, too-few-p
         HourlyUserSummary.objects.all().delete()
         HourlyGroupSummary.objects.all().delete()
         DailyUserSummary.objects.all().delete()
-        DailyGroupSummary.objects.all().delete()
\ No newline at end of file
+        DailyGroupSummary.objects.all().delete()
+        DailyActivityRollup.objects.all().delete()
+        QuestionViewCount.objects.all().delete()
+        SummaryWatermark.objects.all().delete()
\ No newline at end of file
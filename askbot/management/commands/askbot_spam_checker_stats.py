@@ -0,0 +1,32 @@
+"""Prints the number of the spam checks, the verdict
+cache hits and the latency of the spam checker,
+counted by ``askbot.spam_checker.is_spam``.
+"""
+import json
+from django.core.management.base import BaseCommand
+from askbot import spam_checker
+
+
+class Command(BaseCommand): # pylint: disable=missing-class-docstring
+    help = 'Prints the spam checker usage and latency'
+
+    def add_arguments(self, parser): # pylint: disable=missing-function-docstring
+        parser.add_argument('--json', action='store_true',
+                            help='Print the statistics as JSON')
+        parser.add_argument('--reset', action='store_true',
+                            help='Delete the collected statistics')
+
+    def handle(self, *args, **options): # pylint: disable=missing-function-docstring
+        if options['reset']:
+            spam_checker.reset_stats()
+            self.stdout.write('Spam checker statistics deleted')
+            return
+
+        stats = spam_checker.get_stats()
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+            return
+
+        for name in spam_checker.STATS_METRICS + ('avg_ms',):
+            value = stats[name]
+            self.stdout.write('%-12s %s' % (name, '-' if value is None else value))
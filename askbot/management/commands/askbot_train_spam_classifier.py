@@ -0,0 +1,90 @@
+"""Trains the naive Bayes spam checker
+``askbot.spam_checker.naive_bayes_spam_checker`` from the
+JSON file {"spam": [...], "ham": [...]} written by the
+``askbot_get_spam_training_set`` command and writes the model file.
+"""
+import json
+import random
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand, CommandError
+from askbot.spam_checker.naive_bayes_spam_checker import CLASSES, NaiveBayesModel
+
+
+def split_texts(texts, test_fraction, rng):
+    """returns the shuffled texts split into
+    the training and the test lists"""
+    texts = list(texts)
+    rng.shuffle(texts)
+    test_size = int(len(texts) * test_fraction)
+    return texts[test_size:], texts[:test_size]
+
+
+class Command(BaseCommand): # pylint: disable=missing-class-docstring
+    help = 'Trains the naive Bayes spam checker and writes the model file'
+
+    def add_arguments(self, parser): # pylint: disable=missing-function-docstring
+        parser.add_argument('training_set', nargs='?', default='./spam-ham.json',
+                            help='Output of the askbot_get_spam_training_set command')
+        parser.add_argument('--output', dest='file_name', default=None,
+                            help='Path to the model file, '
+                                 'ASKBOT_SPAM_CLASSIFIER_MODEL_FILE by default')
+        parser.add_argument('--ngrams', type=int, default=2,
+                            help='Maximum number of words in the features')
+        parser.add_argument('--buckets', type=int, default=2 ** 20,
+                            help='Number of the hash buckets of the features')
+        parser.add_argument('--test-fraction', type=float, default=0.1,
+                            help='Fraction of the posts held out to report '
+                                 'the accuracy, 0 - skip the evaluation')
+        parser.add_argument('--threshold', type=float, default=None,
+                            help='Spam probability above which the held out posts '
+                                 'are counted as spam, '
+                                 'ASKBOT_SPAM_CLASSIFIER_THRESHOLD by default')
+
+    def handle(self, *args, **options): # pylint: disable=missing-function-docstring
+        file_name = options['file_name'] or django_settings.ASKBOT_SPAM_CLASSIFIER_MODEL_FILE
+        if not file_name:
+            raise CommandError('Use --output or set ASKBOT_SPAM_CLASSIFIER_MODEL_FILE')
+
+        try:
+            with open(options['training_set'], encoding='utf-8') as training_file:
+                data = json.load(training_file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Cannot read {options["training_set"]}: {error}')
+        if not all(data.get(label) for label in CLASSES):
+            raise CommandError('The training set needs both spam and ham posts')
+
+        def make_model():
+            return NaiveBayesModel(ngrams=options['ngrams'], buckets=options['buckets'])
+
+        if options['test_fraction'] > 0:
+            threshold = options['threshold']
+            if threshold is None:
+                threshold = django_settings.ASKBOT_SPAM_CLASSIFIER_THRESHOLD
+            self.evaluate(make_model(), data, options['test_fraction'], threshold)
+
+        model = make_model()
+        for label in CLASSES:
+            model.train(data[label], label)
+        model.save(file_name)
+        self.stdout.write(f'Trained on {len(data["spam"])} spam and '
+                          f'{len(data["ham"])} ham posts, saved to {file_name}')
+
+    def evaluate(self, model, data, test_fraction, threshold):
+        """trains the model on a part of the data
+        and prints the results on the held out posts,
+        classified with the spam probability ``threshold``"""
+        rng = random.Random(0)
+        test_sets = dict()
+        for label in CLASSES:
+            train, test_sets[label] = split_texts(data[label], test_fraction, rng)
+            model.train(train, label)
+
+        def count_spam(texts):
+            return sum(model.get_spam_probability(text) > threshold for text in texts)
+
+        detected = count_spam(test_sets['spam'])
+        false_alarms = count_spam(test_sets['ham'])
+        self.stdout.write(f'Held out posts at threshold {threshold}: '
+                          f'{detected} of {len(test_sets["spam"])} spam '
+                          f'detected, {false_alarms} of {len(test_sets["ham"])} ham '
+                          f'misclassified as spam')
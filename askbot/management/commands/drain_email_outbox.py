@@ -0,0 +1,129 @@
+"""Delivers email queued in the database outbox.
+
+Email is queued by ``askbot.mail.send_mail`` when
+``ASKBOT_EMAIL_OUTBOX_ENABLED`` is True. Run this command from cron,
+or with ``--loop`` as a long running worker process.
+"""
+import datetime
+import json
+import logging
+import time
+from django.conf import settings as django_settings
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from askbot.mail import build_message
+from askbot.models import QueuedEmail
+
+LOG = logging.getLogger(__name__)
+
+
+class Throttle: # pylint: disable=too-few-public-methods
+    """Spaces out calls to ``wait`` to at most
+    ``rate`` per second, 0 means no limit"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.last_call = None
+
+    def wait(self):
+        """Sleeps until the next call is allowed"""
+        if self.interval and self.last_call is not None:
+            delay = self.last_call + self.interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.last_call = time.monotonic()
+
+
+class Command(BaseCommand): # pylint: disable=missing-class-docstring
+    help = 'Delivers the queued outgoing email'
+
+    def add_arguments(self, parser): # pylint: disable=missing-function-docstring
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and poll the queue for new messages')
+        parser.add_argument('--poll-interval', type=float, default=5,
+                            help='Seconds to wait between polls of an empty queue in the --loop mode')
+        parser.add_argument('--batch-size', type=int,
+                            default=django_settings.ASKBOT_EMAIL_OUTBOX_BATCH_SIZE,
+                            help='Maximum number of messages sent per SMTP connection')
+        parser.add_argument('--rate', type=float,
+                            default=django_settings.ASKBOT_EMAIL_OUTBOX_MESSAGES_PER_SECOND,
+                            help='Maximum number of messages sent per second, 0 - no limit')
+        parser.add_argument('--stats', action='store_true',
+                            help='Print the queue depth as JSON and exit')
+        parser.add_argument('--purge-sent-days', type=int, default=None,
+                            help='Delete delivered messages older than this many days')
+
+    def handle(self, *args, **options): # pylint: disable=missing-function-docstring
+        if options['stats']:
+            self.stdout.write(json.dumps(QueuedEmail.objects.get_queue_depth()))
+            return
+
+        if options['purge_sent_days'] is not None:
+            cutoff = timezone.now() - datetime.timedelta(days=options['purge_sent_days'])
+            QueuedEmail.objects.purge_sent(cutoff)
+
+        throttle = Throttle(options['rate'])
+        while True:
+            count = self.drain(options['batch_size'], throttle)
+            if not options['loop']:
+                break
+            if count == 0:
+                time.sleep(options['poll_interval'])
+
+    def drain(self, batch_size, throttle):
+        """Sends batches until there are no due messages,
+        returns number of the processed messages"""
+        total = 0
+        while True:
+            count = self.send_batch(batch_size, throttle)
+            total += count
+            if count < batch_size:
+                return total
+
+    @classmethod
+    def send_batch(cls, batch_size, throttle):
+        """Sends a batch of due messages over a single connection,
+        returns number of the processed messages"""
+        messages = QueuedEmail.objects.claim_batch(batch_size)
+        if not messages:
+            return 0
+
+        connection = mail.get_connection()
+        try:
+            connection.open()
+        except Exception as error: # pylint: disable=broad-except
+            LOG.error('Could not connect to the email server: %s', error)
+            for message in messages:
+                message.mark_failed_attempt(error)
+            return len(messages)
+
+        try:
+            for message in messages:
+                throttle.wait()
+                cls.send_message(message, connection)
+        finally:
+            connection.close()
+
+        return len(messages)
+
+    @classmethod
+    def send_message(cls, message, connection):
+        """Sends one queued message and records the outcome"""
+        email = build_message(
+                    message.subject_line,
+                    message.body_text,
+                    message.from_email,
+                    message.recipient_list,
+                    headers=message.headers,
+                    attachments=message.attachments,
+                    html_enabled=message.html_enabled,
+                    connection=connection
+                )
+        try:
+            email.send()
+        except Exception as error: # pylint: disable=broad-except
+            LOG.warning('Failed to send queued email %d: %s', message.id, error)
+            message.mark_failed_attempt(error)
+        else:
+            message.mark_sent()
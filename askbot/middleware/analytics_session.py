@@ -1,10 +1,10 @@
 """Middleware for the analytics session.
 Maintains sessions only for the authenticated users.
 If necessary, creates a new session for the user,
-otherwise updates the existing session.
+otherwise updates the existing session, at most once per
+``ASKBOT_ANALYTICS_SESSION_TOUCH_SECONDS``.
 """
 
-from django.utils import timezone
 from askbot.models.analytics import Session
 
 class AnalyticsSessionMiddleware:
@@ -13,13 +13,9 @@ class AnalyticsSessionMiddleware:
         
     def __call__(self, request):
         if request.user.is_authenticated:
-            session = Session.objects.get_active_session(request.user)
-            if not session:
-                session = Session.objects.create_session(
-                    user=request.user,
-                    ip_address=request.META.get('REMOTE_ADDR'),
-                    user_agent=request.META.get('HTTP_USER_AGENT')
-                )
-            else:
-                session.touch()
+            Session.objects.touch_active_session(
+                request.user,
+                ip_address=request.META.get('REMOTE_ADDR'),
+                user_agent=request.META.get('HTTP_USER_AGENT')
+            )
         return self.get_response(request)
\ No newline at end of file
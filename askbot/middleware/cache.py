@@ -39,14 +39,52 @@ More details about how the caching works:
   the response's "Vary" header.
 
 * This middleware also sets ETag, Last-Modified, Expires and Cache-Control
-  headers on the response object.
+  headers on the response object. Conditional requests matching the
+  ETag or the Last-Modified time of the cached page are answered with
+  "304 Not Modified".
 
-"""
+* After the timeout the page is kept for CACHE_MIDDLEWARE_STALE_SECONDS
+  more seconds (60 by default). A stale page is served to all clients,
+  except one, which renders the page again.
+
+* Pages are dropped from the cache when any of their surrogate tags
+  is purged, see ``askbot.utils.cache.add_surrogate_tags``.
 
+"""
+import time
 from django.conf import settings
 from django.core.cache import caches, DEFAULT_CACHE_ALIAS
-from django.utils.cache import (get_cache_key, get_max_age, has_vary_header,
-    learn_cache_key, patch_response_headers)
+from django.utils.cache import (get_cache_key, get_conditional_response,
+    get_max_age, has_vary_header, learn_cache_key, patch_response_headers,
+    set_response_etag)
+from django.utils.http import http_date, parse_http_date_safe
+from askbot.utils import cache as cache_utils
+
+LOCK_TIMEOUT = 30
+
+
+def get_lock_key(cache_key):
+    """key of the lock held while the stale page is rendered"""
+    return cache_key + ':lock'
+
+
+def get_conditional_page(request, response):
+    """returns "304 Not Modified" response if the client has
+    the current version of the page, otherwise the ``response``"""
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+        response=response
+    )
+
+
+def is_purged(tag_versions):
+    """True if any surrogate tag of the page was purged
+    after the page was cached"""
+    if not tag_versions:
+        return False
+    return cache_utils.get_surrogate_tag_versions(list(tag_versions)) != tag_versions
 
 
 class UpdateCacheMiddleware(object):
@@ -66,6 +104,7 @@ class UpdateCacheMiddleware(object):
         self.key_prefix = settings.CACHE_MIDDLEWARE_KEY_PREFIX
         self.cache_anonymous_only = getattr(settings, 'CACHE_MIDDLEWARE_ANONYMOUS_ONLY', False)
         self.cache_alias = settings.CACHE_MIDDLEWARE_ALIAS
+        self.stale_timeout = getattr(settings, 'CACHE_MIDDLEWARE_STALE_SECONDS', 60)
         self.cache = caches[self.cache_alias]
 
     def __call__(self, request):
@@ -92,18 +131,39 @@ class UpdateCacheMiddleware(object):
                 return False
         return True
 
+    def _release_lock(self, request):
+        lock_key = getattr(request, '_cache_lock_key', None)
+        if lock_key:
+            self.cache.delete(lock_key)
+            request._cache_lock_key = None
+
+    def _store_response(self, cache_key, response, timeout):
+        """Stores the page together with the time until which it is
+        fresh and the current versions of its surrogate tags."""
+        if not response.has_header('ETag'):
+            set_response_etag(response)
+        if not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date()
+        tags = cache_utils.get_surrogate_tags(response)
+        tag_versions = cache_utils.get_surrogate_tag_versions(tags, create=True)
+        entry = (response, time.time() + timeout, tag_versions)
+        self.cache.set(cache_key, entry, timeout + self.stale_timeout)
+
     def process_response(self, request, response):
         """Sets the cache, if needed."""
         if not self._should_update_cache(request, response):
             # We don't need to update the cache, just return.
+            self._release_lock(request)
             return response
 
         if response.streaming or response.status_code != 200:
+            self._release_lock(request)
             return response
 
         # Don't cache responses that set a user-specific (and maybe security
         # sensitive) cookie in response to a cookie-less request.
         if not request.COOKIES and response.cookies and has_vary_header(response, 'Cookie'):
+            self._release_lock(request)
             return response
 
         # Try to get the timeout from the "max-age" section of the "Cache-
@@ -114,17 +174,22 @@ class UpdateCacheMiddleware(object):
             timeout = self.cache_timeout
         elif timeout == 0:
             # max-age was set to 0, don't bother caching.
+            self._release_lock(request)
             return response
         patch_response_headers(response, timeout)
         if timeout:
-            cache_key = learn_cache_key(request, response, timeout, self.key_prefix, cache=self.cache)
-            if hasattr(response, 'render') and callable(response.render):
-                response.add_post_render_callback(
-                    lambda r: self.cache.set(cache_key, r, timeout)
-                )
-            else:
-                self.cache.set(cache_key, response, timeout)
-        return response
+            cache_key = learn_cache_key(request, response, timeout + self.stale_timeout,
+                                        self.key_prefix, cache=self.cache)
+            if hasattr(response, 'render') and callable(response.render) \
+                    and not response.is_rendered:
+                def store_rendered(rendered):
+                    self._store_response(cache_key, rendered, timeout)
+                    self._release_lock(request)
+                response.add_post_render_callback(store_rendered)
+                return response
+            self._store_response(cache_key, response, timeout)
+        self._release_lock(request)
+        return get_conditional_page(request, response)
 
 
 class FetchFromCacheMiddleware(object):
@@ -163,19 +228,34 @@ class FetchFromCacheMiddleware(object):
         if cache_key is None:
             request._cache_update_cache = True
             return None  # No cache information available, need to rebuild.
-        response = self.cache.get(cache_key, None)
+        entry = self.cache.get(cache_key, None)
         # if it wasn't found and we are looking for a HEAD, try looking just for that
-        if response is None and request.method == 'HEAD':
+        if entry is None and request.method == 'HEAD':
             cache_key = get_cache_key(request, self.key_prefix, 'HEAD', cache=self.cache)
-            response = self.cache.get(cache_key, None)
+            entry = self.cache.get(cache_key, None)
 
-        if response is None:
+        if not isinstance(entry, tuple):
+            # missing or cached by the older version of the middleware
             request._cache_update_cache = True
             return None  # No cache information available, need to rebuild.
 
+        response, fresh_until, tag_versions = entry
+        if is_purged(tag_versions):
+            request._cache_update_cache = True
+            return None  # The page shows data that has changed.
+
+        if time.time() >= fresh_until:
+            lock_key = get_lock_key(cache_key)
+            if self.cache.add(lock_key, 1, LOCK_TIMEOUT):
+                # this request renders the page again,
+                # the others are served the stale page meanwhile
+                request._cache_update_cache = True
+                request._cache_lock_key = lock_key
+                return None
+
         # hit, return cached response
         request._cache_update_cache = False
-        return response
+        return get_conditional_page(request, response)
 
 
 class CacheMiddleware(UpdateCacheMiddleware, FetchFromCacheMiddleware):
@@ -217,6 +297,7 @@ class CacheMiddleware(UpdateCacheMiddleware, FetchFromCacheMiddleware):
         if cache_anonymous_only is None:
             cache_anonymous_only = getattr(settings, 'CACHE_MIDDLEWARE_ANONYMOUS_ONLY', False)
         self.cache_anonymous_only = cache_anonymous_only
+        self.stale_timeout = getattr(settings, 'CACHE_MIDDLEWARE_STALE_SECONDS', 60)
 
         self.cache = caches[self.cache_alias]
 
@@ -0,0 +1,34 @@
+"""Middleware logging a summary of the cache calls made by each request.
+
+Requires the ``askbot.utils.cache_stats.InstrumentedCache`` cache backend.
+The summary is logged by the ``askbot.cache_stats`` logger
+at the ``INFO`` level as a JSON object.
+"""
+import json
+import logging
+from askbot.utils.cache_stats import stats
+
+LOG = logging.getLogger('askbot.cache_stats')
+
+
+class CacheStatsMiddleware:
+    """Logs the per-request cache hits, misses, sizes and latencies
+    by key family"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            summary = stats.end_request()
+
+        if summary and LOG.isEnabledFor(logging.INFO):
+            LOG.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'cache': summary
+            }))
+        return response
@@ -14,6 +14,8 @@ import urllib.request, urllib.parse, urllib.error
 
 ALLOWED_VIEWS = (
     'askbot.views.meta.config_variable',
+    'askbot.views.meta.sitemap_index',
+    'askbot.views.meta.sitemap_questions',
 )
 
 
@@ -0,0 +1,68 @@
+"""Middleware logging the slow requests with their SQL queries,
+cache calls and template render time.
+
+To enable, add ``askbot.middleware.profiling.ProfilingMiddleware``
+near the top of ``MIDDLEWARE``. The requests exceeding any of the
+``ASKBOT_PROFILING_*`` thresholds are logged as JSON objects by the
+``askbot.profiling`` logger at the ``WARNING`` level. The cache calls
+are counted only with the ``askbot.utils.cache_stats.InstrumentedCache``
+cache backend. Use the ``askbot_profiling_report`` management command
+to find the worst endpoints in the log.
+"""
+import json
+import logging
+import random
+from django.conf import settings as django_settings
+from django.utils import timezone
+from askbot.utils.cache_stats import stats as cache_stats
+from askbot.utils.profiling import RequestProfile
+
+LOG = logging.getLogger('askbot.profiling')
+
+
+def is_over_thresholds(summary):
+    """True if the request should be logged"""
+    if summary['duration_ms'] >= django_settings.ASKBOT_PROFILING_SLOW_REQUEST_MS:
+        return True
+    if summary['queries'] >= django_settings.ASKBOT_PROFILING_MAX_QUERIES:
+        return True
+    max_duplicates = django_settings.ASKBOT_PROFILING_MAX_DUPLICATE_QUERIES
+    return any(item['count'] >= max_duplicates for item in summary['duplicate_queries'])
+
+
+class ProfilingMiddleware:
+    """Profiles a sample of the requests, see the module docstring"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= django_settings.ASKBOT_PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        # the cache stats middleware may be collecting the counters already
+        count_cache_calls = getattr(cache_stats.request, 'counters', None) is None
+        if count_cache_calls:
+            cache_stats.start_request()
+        try:
+            with RequestProfile() as profile:
+                response = self.get_response(request)
+            cache_summary = cache_stats.peek_request()
+        finally:
+            if count_cache_calls:
+                cache_stats.end_request()
+
+        summary = profile.get_summary()
+        summary['cache_calls'] = sum(values['hits'] + values['misses'] \
+                                     + values['sets'] + values['deletes']
+                                     for values in cache_summary.values())
+        if is_over_thresholds(summary):
+            resolver_match = getattr(request, 'resolver_match', None)
+            summary.update({
+                'timestamp': timezone.now().isoformat(),
+                'method': request.method,
+                'path': request.path,
+                'view': resolver_match.view_name if resolver_match else None,
+                'status': response.status_code,
+            })
+            LOG.warning(json.dumps(summary))
+        return response
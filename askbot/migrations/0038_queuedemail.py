@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:18
+
+import django.utils.timezone
+import picklefield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askbot', '0037_remove_group_messaging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_line', models.TextField()),
+                ('body_text', models.TextField()),
+                ('from_email', models.CharField(max_length=254)),
+                ('recipient_list', picklefield.fields.PickledObjectField(default=list, editable=False)),
+                ('headers', picklefield.fields.PickledObjectField(default=dict, editable=False)),
+                ('attachments', picklefield.fields.PickledObjectField(default=list, editable=False)),
+                ('html_enabled', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('sent', 'sent'), ('failed', 'failed')], default='pending', max_length=8)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'queued email',
+                'verbose_name_plural': 'queued emails',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='askbot_queu_status_2bb799_idx')],
+            },
+        ),
+    ]
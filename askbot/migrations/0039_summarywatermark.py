@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askbot', '0038_queuedemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('last_time', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
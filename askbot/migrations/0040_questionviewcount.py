@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askbot', '0039_summarywatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionViewCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(max_length=64)),
+                ('views_count', models.PositiveIntegerField(default=0)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='askbot.post')),
+            ],
+            options={
+                'unique_together': {('question', 'segment')},
+            },
+        ),
+    ]
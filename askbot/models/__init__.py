@@ -25,7 +25,7 @@ from django.utils.text import format_lazy
 from django.utils import timezone
 from django.apps import apps
 from django.db import models
-from django.db.models import Count, Q
+from django.db.models import Count, F, Q
 from django.conf import settings as django_settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
@@ -60,9 +60,12 @@ from askbot.models.user_profile import (
                                 add_profile_properties,
                                 UserProfile,
                                 LocalizedUserProfile,
-                                get_localized_profile_cache_key
+                                get_localized_profile_cache_key,
+                                add_reputation,
+                                add_localized_reputation
                             )
 from askbot.models.reply_by_email import ReplyAddress
+from askbot.models.email_outbox import QueuedEmail
 from askbot.models.badges import award_badges_signal, get_badge
 from askbot.models.repute import Award, Repute, Vote, BadgeData
 from askbot.models.widgets import AskWidget, QuestionWidget
@@ -77,6 +80,8 @@ from askbot.utils.slug import slugify, ascii_slugify
 from askbot.utils.celery_utils import defer_celery_task
 from askbot.utils.translation import get_language
 from askbot.utils.html import replace_links_with_text
+from askbot.utils import cache as cache_utils
+from askbot.utils.ratelimit import resolve_request_ip
 from askbot.utils import functions
 from askbot import mail
 from askbot import signals
@@ -2359,7 +2364,16 @@ def user_edit_question(
     if tags is None:
         tags = latest_revision.tagnames
 
-    #revision has title and tags as well
+    # Update the Question tag associations
+    if latest_revision.tagnames != tags:
+        question.thread.update_tags(
+            tagnames=tags, user=self, timestamp=timestamp
+        )
+
+    question.thread.title = title
+    question.thread.tagnames = tags
+
+    #revision has title and tags as well, they are set above
     revision = question.apply_edit(
         edited_at=timestamp,
         edited_by=self,
@@ -2374,14 +2388,6 @@ def user_edit_question(
         ip_addr=ip_addr
     )
 
-    # Update the Question tag associations
-    if latest_revision.tagnames != tags:
-        question.thread.update_tags(
-            tagnames=tags, user=self, timestamp=timestamp
-        )
-
-    question.thread.title = title
-    question.thread.tagnames = tags
     question.thread.set_last_activity_info(
         last_activity_at=timestamp,
         last_activity_by=self
@@ -3350,6 +3356,7 @@ def _process_vote(user, post, timestamp=None, cancel=False, vote_type=None):
                 )
         elif vote.is_opposite(vote_type):
             vote.vote = vote_type
+            vote.voted_at = timestamp
         else:
             return
 
@@ -3367,12 +3374,13 @@ def _process_vote(user, post, timestamp=None, cancel=False, vote_type=None):
 
     signals.voted.send(None, user=user, vote_type=vote_type, canceled=cancel, post=post, timestamp=timestamp)
 
-    post.thread.reset_cached_data()
-
     if post.post_type == 'question':
         #denormalize the question post score on the thread
         post.thread.points = post.points
-        post.thread.save()
+        Thread.objects.filter(pk=post.thread_id).update(points=post.points)
+
+    # votes do not change the activity of the thread
+    post.thread.reset_cached_data(lists=False)
 
     if cancel:
         return None
@@ -3583,25 +3591,14 @@ def user_update_response_counts(user):
 
 
 def user_receive_reputation(self, num_points, language_code=None):
+    """updates the total and the localized reputation
+    with the atomic increments, the user object does not need
+    to be saved afterwards"""
     language_code = language_code or get_language()
     old_points = self.reputation
-    new_points = old_points + num_points
-    self.reputation = max(const.MIN_REPUTATION, new_points)
-
+    add_reputation(self, num_points)
     #record localized user reputation - this starts with 0
-    try:
-        profile = LocalizedUserProfile.objects.get(
-                                            auth_user=self,
-                                            language_code=language_code
-                                        )
-    except LocalizedUserProfile.DoesNotExist:
-        profile = LocalizedUserProfile(
-                                    auth_user=self,
-                                    language_code=language_code
-                                )
-    profile.reputation = max(0, profile.reputation + num_points)
-    profile.save()
-
+    add_localized_reputation(self, language_code, num_points)
     signals.reputation_received.send(None, user=self, reputation_before=old_points)
 
 def user_update_wildcard_tag_selections(
@@ -4070,8 +4067,8 @@ def record_award_event(instance, created, **kwargs):
         activity.save()
         activity.add_recipients([instance.user])
 
-        instance.badge.awarded_count += 1
-        instance.badge.save()
+        BadgeData.objects.filter(pk=instance.badge_id).update(
+                                awarded_count=F('awarded_count') + 1)
 
         badge = get_badge(instance.badge.slug)
 
@@ -4091,18 +4088,21 @@ def notify_award_message(instance, created, **kwargs):
         return
     if created:
         user = instance.user
+        msg = get_award_message(user, instance.badge.slug, user.primary_language)
+        user.message_set.create(message=msg)
 
-        with override(user.primary_language):
-            badge = get_badge(instance.badge.slug)
 
-            msg = _("Congratulations, you have received a badge '%(badge_name)s'. "
-                    "Check out <a href=\"%(user_profile)s\">your profile</a>.") \
-                    % {
-                        'badge_name':badge.name,
-                        'user_profile':user.get_profile_url()
-                    }
+def get_award_message(user, badge_key, language_code):
+    """returns text of the message about the awarded badge"""
+    with override(language_code):
+        badge = get_badge(badge_key)
 
-            user.message_set.create(message=msg)
+        return _("Congratulations, you have received a badge '%(badge_name)s'. "
+                 "Check out <a href=\"%(user_profile)s\">your profile</a>.") \
+                 % {
+                     'badge_name':badge.name,
+                     'user_profile':user.get_profile_url()
+                 }
 
 def record_answer_accepted(instance, created, **kwargs):
     """
@@ -4156,36 +4156,44 @@ def record_user_visit(user, timestamp, **kwargs):
     profile.update_cache()
 
 
+def get_question_views_cache_key(request):
+    """cache key of the recent question views of the visitor:
+    the user, the session or the client ip address, resolved like
+    in the rate limits (``RATELIMIT_IP_META_KEY``), and the user agent.
+    The anonymous visitors without a session sharing the address
+    and the browser are counted as one visitor."""
+    if request.user.is_authenticated:
+        visitor = 'user-%d' % request.user.id
+    elif request.session.session_key:
+        visitor = 'session-' + request.session.session_key
+    else:
+        raw = resolve_request_ip(request) + '\n' + request.META.get('HTTP_USER_AGENT', '')
+        visitor = 'anon-' + hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return 'askbot-question-views-' + visitor
+
+
 def record_question_visit(request, question, timestamp, **kwargs):
     if functions.not_a_robot_request(request):
-        #todo: split this out into a subroutine
-        #todo: merge view counts per user and per session
-        #1) view count per session
-        if 'question_view_times' not in request.session:
-            request.session['question_view_times'] = {}
-
-        last_seen_raw = request.session['question_view_times'].get(question.id, None)
-
-        # Parse ISO string back to datetime (session stores strings for JSON serialization)
-        last_seen = None
-        if last_seen_raw:
-            if isinstance(last_seen_raw, str):
-                last_seen = datetime.datetime.fromisoformat(last_seen_raw)
-            else:
-                last_seen = last_seen_raw
-            if timezone.is_naive(last_seen) \
-                and getattr(django_settings, 'USE_TZ', False):
-                last_seen = timezone.make_aware(last_seen, datetime.timezone.utc)
+        #1) view count per visitor, the times of the recent views
+        #are kept in the cache, so that reads do not save the session
+        backend = cache_utils.get_backend()
+        key = get_question_views_cache_key(request)
+        view_times = backend.get(key) or list() # [(question id, unix time), ...]
+        last_seen = dict(view_times).get(question.id)
 
         update_view_count = False
         if question.thread.last_activity_by_id != request.user.id:
             if last_seen:
-                if last_seen < question.thread.last_activity_at:
+                if last_seen < question.thread.last_activity_at.timestamp():
                     update_view_count = True
             else:
                 update_view_count = True
 
-        request.session['question_view_times'][question.id] = timestamp.isoformat()
+        view_times = [item for item in view_times if item[0] != question.id]
+        view_times.append((question.id, timestamp.timestamp()))
+        max_size = django_settings.ASKBOT_QUESTION_VIEW_HISTORY_SIZE
+        backend.set(key, view_times[-max_size:], django_settings.SESSION_COOKIE_AGE)
+
         #2) run the slower jobs in a celery task
         from askbot import tasks
         defer_celery_task(
@@ -4580,6 +4588,11 @@ def record_spam_rejection(sender, spam=None, text=None, user=None, ip_addr='unkn
         activity.save()
 
 
+def purge_tag_pages(sender, instance, **kwargs):
+    """drops the cached pages showing the tag"""
+    cache_utils.purge_surrogate_tags([cache_utils.get_tag_surrogate_tag(instance.name)])
+
+
 def update_last_seen(sender, user=None, **kwargs):
     """Updates the user.askbot_profile.last_seen field
     to the current time."""
@@ -4672,6 +4685,17 @@ django_signals.m2m_changed.connect(
     dispatch_uid='record_group_membership_change_on_group_change'
 )
 
+django_signals.post_save.connect(
+    purge_tag_pages,
+    sender=Tag,
+    dispatch_uid='purge_tag_pages_on_tag_save'
+)
+django_signals.post_delete.connect(
+    purge_tag_pages,
+    sender=Tag,
+    dispatch_uid='purge_tag_pages_on_tag_delete'
+)
+
 django_signals.post_delete.connect(
     record_cancel_vote,
     sender=Vote,
@@ -4841,6 +4865,7 @@ __all__ = [
         'UserProfile',
 
         'ReplyAddress',
+        'QueuedEmail',
 
         'ImportRun',
         'ImportedObjectInfo',
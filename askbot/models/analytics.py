@@ -1,6 +1,10 @@
 """Models for the Analytics feature"""
+import atexit
 import datetime
-from django.db import models
+import logging
+import threading
+from django.core.cache import cache
+from django.db import connection, models, transaction, DatabaseError
 from django.db.models import Value
 from django.db.models.functions import Substr, StrIndex
 from django.contrib.auth.models import User
@@ -15,6 +19,8 @@ from askbot.models.repute import Vote
 from askbot.utils.analytics_utils import get_all_named_segment_group_ids
 from askbot import signals
 
+LOG = logging.getLogger(__name__)
+
 #for convenience, here are the activity types from used in the Activity object
 #TYPE_ACTIVITY_ASK_QUESTION = 1
 #TYPE_ACTIVITY_ANSWER = 2
@@ -73,16 +79,48 @@ def get_unique_user_email_domains():
 
 
 class SessionManager(models.Manager):
-    """Manager for the Session model"""
+    """Manager for the Session model.
+
+    The id and the last update time of the active session
+    of each user are cached, so that the events are recorded and
+    the sessions are kept alive without reading the session table.
+    """
+    @classmethod
+    def get_cache_key(cls, user_id):
+        """returns cache key of the active session of the user"""
+        return f'askbot-analytics-session:{user_id}'
+
+    @classmethod
+    def cache_session(cls, session):
+        """caches id and the last update time of the session"""
+        timeout = django_settings.ASKBOT_ANALYTICS_SESSION_TIMEOUT_MINUTES * 60
+        cache.set(cls.get_cache_key(session.user_id),
+                  (session.id, session.updated_at), timeout)
+
+    @classmethod
+    def get_cached_session_id(cls, user, max_age):
+        """returns id of the cached session updated
+        less than ``max_age`` ago or None"""
+        cached = cache.get(cls.get_cache_key(user.id))
+        if not cached:
+            return None
+        session_id, updated_at = cached
+        now = timezone.now()
+        if now - max_age <= updated_at <= now:
+            return session_id
+        return None
+
     def create_session(self, user, ip_address, user_agent):
         """Creates a new session"""
         now = timezone.now()
-        return self.create(user=user,
-                           ip_address=ip_address,
-                           user_agent=user_agent,
-                           created_at=now,
-                           updated_at=now,
-                           last_summarized_at=now)
+        session = self.create(user=user,
+                              ip_address=ip_address,
+                              user_agent=user_agent,
+                              created_at=now,
+                              updated_at=now,
+                              last_summarized_at=now)
+        self.cache_session(session)
+        return session
 
     def get_active_session(self, user):
         """Filters out the session that has not expired and returns the first one,
@@ -93,6 +131,38 @@ class SessionManager(models.Manager):
         sessions = self.filter(user=user, updated_at__gte=timezone.now() - timeout)
         return sessions.first()
 
+    def get_active_session_id(self, user):
+        """Returns id of the active session of the user or None,
+        reads the session table only if the id is not cached"""
+        timeout_minutes = django_settings.ASKBOT_ANALYTICS_SESSION_TIMEOUT_MINUTES
+        session_id = self.get_cached_session_id(user, datetime.timedelta(minutes=timeout_minutes))
+        if session_id:
+            return session_id
+
+        session = self.get_active_session(user)
+        if session is None:
+            return None
+        self.cache_session(session)
+        return session.id
+
+    def touch_active_session(self, user, ip_address, user_agent):
+        """Updates the active session of the user or creates a new one,
+        returns the session id. A session is updated at most once per
+        ``ASKBOT_ANALYTICS_SESSION_TOUCH_SECONDS``"""
+        touch_interval = datetime.timedelta(
+            seconds=django_settings.ASKBOT_ANALYTICS_SESSION_TOUCH_SECONDS
+        )
+        session_id = self.get_cached_session_id(user, touch_interval)
+        if session_id:
+            return session_id
+
+        session = self.get_active_session(user)
+        if session:
+            session.touch()
+        else:
+            session = self.create_session(user, ip_address, user_agent)
+        return session.id
+
 class Session(models.Model):
     """Analytics session"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -113,7 +183,8 @@ class Session(models.Model):
     def touch(self):
         """Updates the updated_at field"""
         self.updated_at = timezone.now()
-        self.save()
+        self.save(update_fields=['updated_at'])
+        Session.objects.cache_session(self)
 
 
 class EventManager(models.Manager):
@@ -189,6 +260,164 @@ class Event(models.Model):
         return f"Event: {self.get_event_type_display()} {timestamp}" # pylint: disable=no-member
 
 
+class EventBuffer:
+    """Events waiting to be saved with one ``bulk_create``.
+
+    With ``ASKBOT_ANALYTICS_EVENT_BUFFER_SIZE`` greater than one the
+    events are collected in the process memory and saved when the
+    buffer is full, ``ASKBOT_ANALYTICS_EVENT_BUFFER_SECONDS`` after
+    the first buffered event and at the process exit.
+
+    The buffer filled inside a transaction is saved after the commit,
+    so that the transaction of the caller is not affected by the
+    events of the other users. The events are inserted in a savepoint,
+    when the batch fails they are saved one by one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = list()
+        self.timer = None
+
+    def add(self, event):
+        """saves the event or adds it to the buffer"""
+        size = django_settings.ASKBOT_ANALYTICS_EVENT_BUFFER_SIZE
+        if size <= 1:
+            event.save()
+            return
+
+        with self.lock:
+            self.events.append(event)
+            is_full = len(self.events) >= size
+            if not is_full and self.timer is None:
+                delay = django_settings.ASKBOT_ANALYTICS_EVENT_BUFFER_SECONDS
+                self.timer = threading.Timer(delay, self.flush_on_timer)
+                self.timer.daemon = True
+                self.timer.start()
+
+        if is_full:
+            if connection.in_atomic_block:
+                transaction.on_commit(self.flush)
+            else:
+                self.flush()
+
+    def flush(self):
+        """saves the buffered events, returns their number"""
+        with self.lock:
+            events, self.events = self.events, list()
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+
+        if not events:
+            return 0
+        try:
+            with transaction.atomic():
+                Event.objects.bulk_create(events) # pylint: disable=no-member
+        except DatabaseError:
+            return self.save_one_by_one(events)
+        return len(events)
+
+    @classmethod
+    def save_one_by_one(cls, events):
+        """saves the events of the failed batch separately,
+        returns the number of the saved events"""
+        saved = 0
+        for event in events:
+            event.pk = None
+            try:
+                with transaction.atomic():
+                    event.save()
+            except DatabaseError:
+                LOG.exception('Could not save analytics event of type %s', event.event_type)
+            else:
+                saved += 1
+        return saved
+
+    def flush_on_timer(self):
+        """flushes the buffer in the timer thread"""
+        try:
+            self.flush()
+        finally:
+            connection.close() # the connection of the timer thread
+
+
+event_buffer = EventBuffer() # pylint: disable=invalid-name
+atexit.register(event_buffer.flush)
+
+
+class SummaryWatermark(models.Model):
+    """Position up to which the rows of a source table are summarized,
+    the id of the last summarized event or the end of the last
+    summarized hour or day. Replaces the per-row ``summarized`` flags."""
+    name = models.CharField(max_length=64, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    last_time = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"SummaryWatermark: {self.name} {self.last_id} {self.last_time}"
+
+
+class QuestionViewCountManager(models.Manager):
+    """Manager for the QuestionViewCount model"""
+    def get_counts_by_segment(self, question_post):
+        """Returns dictionary of the view counts of the question by segment slug"""
+        return dict(self.filter(question=question_post).values_list('segment', 'views_count'))
+
+
+class QuestionViewCount(models.Model):
+    """Number of the views of a question by the users of an analytics
+    segment, counted by the ``askbot_compile_analytics`` command"""
+    question = models.ForeignKey('askbot.Post', on_delete=models.CASCADE, related_name='+')
+    segment = models.CharField(max_length=64) # segment slug
+    views_count = models.PositiveIntegerField(default=0)
+
+    objects = QuestionViewCountManager()
+
+    class Meta: # pylint: disable=too-few-public-methods, missing-class-docstring
+        unique_together = ('question', 'segment')
+
+    def __str__(self):
+        return f"QuestionViewCount: {self.question_id} {self.segment} {self.views_count}" # pylint: disable=no-member
+
+
+class DailyActivityRollupManager(models.Manager):
+    """Manager for the DailyActivityRollup model"""
+    def get_events_count(self, start_date, end_date, event_types, group_ids=None, thread_id=None): # pylint: disable=too-many-arguments
+        """Returns the number of the compiled events in the date range, inclusive.
+        ``group_ids`` - the events of the users of these groups, all users if ``None``,
+        ``thread_id`` - the events of the posts of the thread, all events if ``None``
+        """
+        rollups = self.filter(date__gte=start_date, date__lte=end_date, event_type__in=event_types)
+        if group_ids is None:
+            rollups = rollups.filter(group__isnull=True)
+        else:
+            rollups = rollups.filter(group_id__in=group_ids)
+        if thread_id is not None:
+            rollups = rollups.filter(thread_id=thread_id)
+        return rollups.aggregate(total=models.Sum('count'))['total'] or 0
+
+
+class DailyActivityRollup(models.Model):
+    """Number of the events by day, event type, analytics group and thread,
+    compiled by ``askbot_compile_analytics`` for the activity pages.
+    The rows with the empty group count the events of all users, the rows
+    with the empty thread - the events not related to the posts."""
+    date = models.DateField(db_index=True)
+    event_type = models.SmallIntegerField(choices=Event.EVENT_TYPES)
+    group = models.ForeignKey(AskbotGroup, null=True, blank=True, related_name='+',
+                              on_delete=models.CASCADE)
+    thread = models.ForeignKey('askbot.Thread', null=True, blank=True, related_name='+',
+                               on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    objects = DailyActivityRollupManager()
+
+    def __str__(self):
+        return f"DailyActivityRollup: {self.date} {self.event_type} " \
+               f"{self.group_id} {self.thread_id} {self.count}" # pylint: disable=no-member
+
+
 class BaseSummary(models.Model):
     """
     An abstract model for per-interval summaries.
@@ -297,33 +526,33 @@ class DailyGroupSummary(DailySummary):
 @receiver(signals.user_registered)
 def record_user_registration(sender, user, **kwargs): # pylint: disable=unused-argument
     """Records user registration event"""
-    session = Session.objects.get_active_session(user)
-    if not session:
+    session_id = Session.objects.get_active_session_id(user)
+    if not session_id:
         return
 
     event = Event(
-        session=Session.objects.get_active_session(user),
+        session_id=session_id,
         event_type=Event.EVENT_TYPE_USER_REGISTERED,
         timestamp=user.date_joined,
         content_object=user
     )
-    event.save()
+    event_buffer.add(event)
 
 
 @receiver(signals.user_logged_in)
 def record_user_login(sender, user, **kwargs): # pylint: disable=unused-argument
     """Records user login event"""
-    session = Session.objects.get_active_session(user)
-    if not session:
+    session_id = Session.objects.get_active_session_id(user)
+    if not session_id:
         return
 
     event = Event(
-        session=session,
+        session_id=session_id,
         event_type=Event.EVENT_TYPE_LOGGED_IN,
         timestamp=timezone.now(),
         content_object=user
     )
-    event.save()
+    event_buffer.add(event)
 
 
 @receiver(signals.voted)
@@ -335,8 +564,8 @@ def record_user_vote(sender, user=None, vote_type=None, canceled=None, # pylint:
     * EVENT_TYPE_DOWNVOTED = 7
     * EVENT_TYPE_VOTE_CANCELED = 8
     """
-    session = Session.objects.get_active_session(user)
-    if not session:
+    session_id = Session.objects.get_active_session_id(user)
+    if not session_id:
         return
 
     if canceled:
@@ -349,44 +578,44 @@ def record_user_vote(sender, user=None, vote_type=None, canceled=None, # pylint:
         return
 
     event = Event(
-        session=session,
+        session_id=session_id,
         event_type=event_type,
         timestamp=timestamp,
         content_object=post
     )
-    event.save()
+    event_buffer.add(event)
 
 
 @receiver(signals.new_question_posted)
 def record_new_question(sender, question, **kwargs): # pylint: disable=unused-argument
     """Records new question event"""
-    session = Session.objects.get_active_session(question.author)
-    if not session:
+    session_id = Session.objects.get_active_session_id(question.author)
+    if not session_id:
         return
 
     event = Event(
-        session=session,
+        session_id=session_id,
         event_type=Event.EVENT_TYPE_ASKED,
         timestamp=question.added_at,
         content_object=question
     )
-    event.save()
+    event_buffer.add(event)
 
 
 @receiver(signals.new_answer_posted)
 def record_new_answer(sender, answer, **kwargs): # pylint: disable=unused-argument
     """Records new answer event"""
-    session = Session.objects.get_active_session(answer.author)
-    if not session:
+    session_id = Session.objects.get_active_session_id(answer.author)
+    if not session_id:
         return
 
     event = Event(
-        session=session,
+        session_id=session_id,
         event_type=Event.EVENT_TYPE_ANSWERED,
         timestamp=answer.added_at,
         content_object=answer
     )
-    event.save()
+    event_buffer.add(event)
 
 
 @receiver(signals.new_comment_posted)
@@ -396,8 +625,8 @@ def record_new_comment(sender, comment, **kwargs): # pylint: disable=unused-argu
     * EVENT_TYPE_QUESTION_COMMENTED = 11
     * EVENT_TYPE_ANSWER_COMMENTED = 12
     """
-    session = Session.objects.get_active_session(comment.author)
-    if not session:
+    session_id = Session.objects.get_active_session_id(comment.author)
+    if not session_id:
         return
 
     parent_type = comment.parent.post_type
@@ -409,28 +638,28 @@ def record_new_comment(sender, comment, **kwargs): # pylint: disable=unused-argu
         return
 
     event = Event(
-        session=session,
+        session_id=session_id,
         event_type=event_type,
         timestamp=comment.added_at,
         content_object=comment
     )
-    event.save()
+    event_buffer.add(event)
 
 
 @receiver(signals.tags_updated)
 def record_tag_update(sender, thread=None, user=None, timestamp=None, **kwargs): # pylint: disable=unused-argument
     """Records tag update event"""
-    session = Session.objects.get_active_session(user)
-    if not session:
+    session_id = Session.objects.get_active_session_id(user)
+    if not session_id:
         return
 
     event = Event(
-        session=session,
+        session_id=session_id,
         event_type=Event.EVENT_TYPE_QUESTION_RETAGGED,
         timestamp=timestamp,
         content_object=thread
     )
-    event.save()
+    event_buffer.add(event)
 
 @receiver(signals.question_visited)
 def record_question_visit(sender, request, question, timestamp, **kwargs): # pylint: disable=unused-argument
@@ -438,17 +667,17 @@ def record_question_visit(sender, request, question, timestamp, **kwargs): # pyl
     if not request.user.is_authenticated:
         return
 
-    session = Session.objects.get_active_session(request.user)
-    if not session:
+    session_id = Session.objects.get_active_session_id(request.user)
+    if not session_id:
         return
 
     event = Event(
-        session=session,
+        session_id=session_id,
         event_type=Event.EVENT_TYPE_QUESTION_VIEWED,
         timestamp=timestamp,
         content_object=question
     )
-    event.save()
+    event_buffer.add(event)
 
 
 """
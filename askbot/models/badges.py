@@ -18,13 +18,17 @@ corresponding event name, actor (user object), context_object and optionally
 - timestamp
 """
 import datetime
+import threading
 
 from django.template.defaultfilters import slugify
 from django.conf import settings as django_settings
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, Max, OuterRef, Subquery
 from django.utils.translation import gettext as _
 from django.utils.translation import ngettext
 from django.utils import timezone
+from django.core.signals import request_started
+from django.db import connection, transaction
 from django.dispatch import Signal
 
 from askbot import const
@@ -34,6 +38,15 @@ from askbot.utils.functions import format_setting_name
 from askbot.utils.loading import load_module
 
 
+def get_question_subquery(field):
+    """subquery returning the ``field`` of the question
+    in the thread of the outer post query"""
+    from askbot.models import Post
+    questions = Post.objects.filter(thread_id=OuterRef('thread_id'),
+                                    post_type='question')
+    return Subquery(questions.values(field)[:1])
+
+
 class Badge(object):
     """base class for the badges
 
@@ -54,11 +67,18 @@ class Badge(object):
         self.description = description
         self.multiple = multiple
         self.css_class = const.BADGE_CSS_CLASSES[self.level]
+        # set by the BadgeEvaluator which considers this badge
+        self.evaluator = None
+        self._stored_data = None
 
     def get_stored_data(self):
-        from askbot.models.repute import BadgeData
-        data, created = BadgeData.objects.get_or_create(slug=self.key)
-        return data
+        if self._stored_data is None:
+            if self.evaluator:
+                self._stored_data = self.evaluator.get_badge_data(self.key)
+            else:
+                from askbot.models.repute import BadgeData
+                self._stored_data = BadgeData.objects.get_or_create(slug=self.key)[0]
+        return self._stored_data
 
     @property
     def awarded_count(self):
@@ -95,7 +115,10 @@ class Badge(object):
         """
         from askbot.models.repute import Award
         if not self.multiple:
-            if recipient.badges.filter(slug=self.key).exists():
+            if self.evaluator:
+                if self.evaluator.has_badge(recipient, self.key):
+                    return False
+            elif recipient.badges.filter(slug=self.key).exists():
                 return False
         else:
             content_type = ContentType.objects.get_for_model(context_object)
@@ -106,13 +129,15 @@ class Badge(object):
                 'badge__slug': self.key,
             }
             # multiple badge is not re-awarded for the same post
-            if Award.objects.filter(**filters).count() != 0:
+            if Award.objects.filter(**filters).exists():
                 return False
 
         badge = self.get_stored_data()
         award = Award(user=recipient, badge=badge, awarded_at=timestamp,
                       content_object=context_object)
         award.save()  # note: there are signals that listen to saving the Award
+        if self.evaluator:
+            self.evaluator.add_badge(recipient, self.key)
         return True
 
     def consider_award(self, actor=None, context_object=None, timestamp=None):
@@ -125,6 +150,18 @@ class Badge(object):
         """
         return self.award(actor, context_object, timestamp)
 
+    def get_eligible_awards(self):
+        """Set-based counterpart of ``consider_award``, used to
+        award the badge retroactively to the whole user base
+        with the management command ``askbot_award_badges``.
+
+        Returns ``None`` if the badge does not support it, otherwise
+        a pair ``(model, rows)``, where ``rows`` is an iterable of
+        ``(user_id, object_id)`` tuples of the eligible users and
+        the context objects (instances of ``model``) of the awards.
+        """
+        return None
+
 
 class Disciplined(Badge):
     key = 'disciplined'
@@ -144,6 +181,13 @@ class Disciplined(Badge):
                 askbot_settings.DISCIPLINED_BADGE_MIN_UPVOTES:
             return self.award(actor, context_object, timestamp)
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        posts = Post.objects.filter(
+                        deleted=True, deleted_by_id=F('author_id'),
+                        points__gte=askbot_settings.DISCIPLINED_BADGE_MIN_UPVOTES)
+        return Post, posts.values_list('author_id', 'id')
+
 
 class PeerPressure(Badge):
     key = 'peer-pressure'
@@ -164,6 +208,13 @@ class PeerPressure(Badge):
             return self.award(actor, context_object, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        min_downvotes = askbot_settings.PEER_PRESSURE_BADGE_MIN_DOWNVOTES
+        posts = Post.objects.filter(deleted=True, deleted_by_id=F('author_id'),
+                                    points__lte=-1 * min_downvotes)
+        return Post, posts.values_list('author_id', 'id')
+
 
 class Teacher(Badge):
     key = 'teacher'
@@ -187,6 +238,13 @@ class Teacher(Badge):
             return self.award(context_object.author, context_object, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        answers = Post.objects.filter(
+                        post_type='answer',
+                        points__gte=askbot_settings.TEACHER_BADGE_MIN_UPVOTES)
+        return Post, answers.values_list('author_id', 'id')
+
 
 class FirstVote(Badge):
     """this badge is not awarded directly, but through
@@ -205,6 +263,13 @@ class FirstVote(Badge):
             return False
         return self.award(actor, context_object, timestamp)
 
+    def get_eligible_awards(self):
+        from askbot.models import Post, Vote
+        votes = Vote.objects.filter(vote=self.vote_value,
+                                    voted_post__post_type__in=('question', 'answer'))
+        rows = votes.values('user_id').annotate(post_id=Max('voted_post_id'))
+        return Post, rows.values_list('user_id', 'post_id')
+
 
 class Supporter(FirstVote):
     """first upvote"""
@@ -214,6 +279,7 @@ class Supporter(FirstVote):
         self = super(Supporter, cls).__new__(cls)
         self.name = _('Supporter')
         self.description = _('First upvote')
+        self.vote_value = 1
         return self
 
 
@@ -225,6 +291,7 @@ class Critic(FirstVote):
         self = super(Critic, cls).__new__(cls)
         self.name = _('Critic')
         self.description = _('First downvote')
+        self.vote_value = -1
         return self
 
 
@@ -247,6 +314,16 @@ class CivicDuty(Badge):
             return self.award(actor, obj, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import Post, Vote
+        rows = Vote.objects.values('user_id').annotate(
+                                        num_votes=Count('id'),
+                                        post_id=Max('voted_post_id')
+                                    ).filter(
+                                        num_votes__gte=askbot_settings.CIVIC_DUTY_BADGE_MIN_VOTES
+                                    )
+        return Post, rows.values_list('user_id', 'post_id')
+
 
 class SelfLearner(Badge):
     key = 'self-learner'
@@ -271,6 +348,16 @@ class SelfLearner(Badge):
         if question.author_id == answer.author_id and answer.points >= min_upvotes:
             self.award(context_object.author, context_object, timestamp)
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        answers = Post.objects.filter(
+                        post_type='answer',
+                        points__gte=askbot_settings.SELF_LEARNER_BADGE_MIN_UPVOTES
+                    ).annotate(
+                        question_author_id=get_question_subquery('author_id')
+                    ).filter(author_id=F('question_author_id'))
+        return Post, answers.values_list('author_id', 'id')
+
 
 class QualityPost(Badge):
     """Generic Badge for Nice/Good/Great Question or Answer
@@ -296,6 +383,12 @@ class QualityPost(Badge):
             return self.award(context_object.author, context_object, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        posts = Post.objects.filter(post_type=self.post_type,
+                                    points__gte=self.min_votes)
+        return Post, posts.values_list('author_id', 'id')
+
 
 class NiceAnswer(QualityPost):
     key = 'nice-answer'
@@ -438,6 +531,12 @@ class FrequentedQuestion(Badge):
             return self.award(context_object.author, context_object, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        questions = Post.objects.filter(post_type='question',
+                                        thread__view_count__gte=self.min_views)
+        return Post, questions.values_list('author_id', 'id')
+
 
 class PopularQuestion(FrequentedQuestion):
     key = 'popular-question'
@@ -508,6 +607,15 @@ class Scholar(Badge):
             return False
         return self.award(actor, context_object, timestamp)
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        answers = Post.objects.filter(
+                        post_type='answer', endorsed=True
+                    ).annotate(
+                        question_author_id=get_question_subquery('author_id')
+                    ).filter(endorsed_by_id=F('question_author_id'))
+        return Post, answers.values_list('question_author_id', 'id')
+
 
 class VotedAcceptedAnswer(Badge):
     """superclass for Enlightened and Guru badges
@@ -529,6 +637,12 @@ class VotedAcceptedAnswer(Badge):
         if answer.points >= self.min_votes and answer.endorsed:
             return self.award(answer.author, answer, timestamp)
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        answers = Post.objects.filter(post_type='answer', endorsed=True,
+                                      points__gte=self.min_votes)
+        return Post, answers.values_list('author_id', 'id')
+
 
 class Enlightened(VotedAcceptedAnswer):
     key = 'enlightened'
@@ -594,6 +708,17 @@ class Necromancer(Badge):
             return self.award(answer.author, answer, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        delta = datetime.timedelta(askbot_settings.NECROMANCER_BADGE_MIN_DELAY)
+        answers = Post.objects.filter(
+                        post_type='answer',
+                        points__gte=askbot_settings.NECROMANCER_BADGE_MIN_UPVOTES
+                    ).annotate(
+                        question_added_at=get_question_subquery('added_at')
+                    ).filter(added_at__gte=F('question_added_at') + delta)
+        return Post, answers.values_list('author_id', 'id')
+
 
 class CitizenPatrol(Badge):
     key = 'citizen-patrol'
@@ -705,6 +830,23 @@ class Autobiographer(Badge):
             return self.award(user, user, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import User
+        from askbot.models.user_profile import LocalizedUserProfile
+        with_about = LocalizedUserProfile.objects.exclude(about='')
+        users = User.objects.exclude(
+                            email=''
+                        ).exclude(
+                            askbot_profile__real_name=''
+                        ).exclude(
+                            askbot_profile__website=''
+                        ).exclude(
+                            askbot_profile__location=''
+                        ).filter(
+                            id__in=with_about.values('auth_user_id')
+                        )
+        return User, users.values_list('id', 'id')
+
 
 class FavoriteTypeBadge(Badge):
     """subclass must use __new__ and in addition
@@ -734,6 +876,21 @@ class FavoriteTypeBadge(Badge):
             return self.award(question.author, question, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        from askbot.models.question import FavoriteQuestion as Fave
+        stars = Fave.objects.filter(
+                        thread_id=OuterRef('thread_id')
+                    ).exclude(
+                        user_id=OuterRef('author_id')
+                    ).values('thread_id').annotate(num=Count('id')).values('num')
+        questions = Post.objects.filter(
+                            post_type='question'
+                        ).annotate(
+                            num_stars=Subquery(stars[:1])
+                        ).filter(num_stars__gte=self.min_stars)
+        return Post, questions.values_list('author_id', 'id')
+
 
 class StellarQuestion(FavoriteTypeBadge):
     key = 'stellar-question'
@@ -779,6 +936,13 @@ class Enthusiast(Badge):
             return self.award(actor, context_object, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import User
+        min_days = askbot_settings.ENTHUSIAST_BADGE_MIN_DAYS
+        users = User.objects.filter(
+                    askbot_profile__consecutive_days_visit_count__gte=min_days)
+        return User, users.values_list('id', 'id')
+
 
 class Commentator(Badge):
     """Commentator is a bronze badge that is
@@ -801,6 +965,16 @@ class Commentator(Badge):
             return self.award(actor, context_object, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import Post
+        rows = Post.objects.get_comments().values('author_id').annotate(
+                            num_comments=Count('id'),
+                            comment_id=Max('id')
+                        ).filter(
+                            num_comments__gte=askbot_settings.COMMENTATOR_BADGE_MIN_COMMENTS
+                        )
+        return Post, rows.values_list('author_id', 'comment_id')
+
 
 class Taxonomist(Badge):
     key = 'taxonomist'
@@ -821,6 +995,12 @@ class Taxonomist(Badge):
             return self.award(tag.created_by, tag, timestamp)
         return False
 
+    def get_eligible_awards(self):
+        from askbot.models import Tag
+        tags = Tag.objects.filter(
+                    used_count__gte=askbot_settings.TAXONOMIST_BADGE_MIN_USE_COUNT)
+        return Tag, tags.values_list('created_by_id', 'id')
+
 
 class RapidResponder(Badge):
     key = 'rapid-responder'
@@ -987,19 +1167,137 @@ award_badges_signal = Signal()
 # context_object - database object related to the event, e.g. question
 
 
+class BadgeEvaluator(object):
+    """Considers badges for a batch of events.
+
+    ``BadgeData`` rows are loaded once per evaluator, badges already
+    held by the recipients are looked up with one query per recipient,
+    and each badge is considered at most once for a given
+    (actor, badge, context object) combination within the batch.
+    """
+
+    def __init__(self):
+        self.badge_data = None
+        self.user_badges = dict()
+        self.considered = set()
+
+    def get_badge_data(self, key):
+        """returns the ``BadgeData`` row for the badge key"""
+        from askbot.models.repute import BadgeData
+        if self.badge_data is None:
+            self.badge_data = BadgeData.objects.in_bulk(field_name='slug')
+        if key not in self.badge_data:
+            self.badge_data[key] = BadgeData.objects.get_or_create(slug=key)[0]
+        return self.badge_data[key]
+
+    def get_user_badge_keys(self, user):
+        """returns set of keys of the badges awarded to the user"""
+        if user.pk not in self.user_badges:
+            keys = user.badges.values_list('slug', flat=True)
+            self.user_badges[user.pk] = set(keys)
+        return self.user_badges[user.pk]
+
+    def has_badge(self, user, key):
+        """True if user was awarded badge with the key"""
+        return key in self.get_user_badge_keys(user)
+
+    def add_badge(self, user, key):
+        """records the new award in the cache"""
+        self.get_user_badge_keys(user).add(key)
+
+    def evaluate(self, event, actor, context_object, timestamp):
+        """considers badges associated with the event"""
+        try:
+            consider_badges = EVENTS_TO_BADGES[event]
+        except KeyError:
+            raise NotImplementedError('event "%s" is not implemented' % event)
+
+        if context_object is None:
+            context_key = None
+        else:
+            context_key = (context_object._meta.label, context_object.pk)
+
+        for badge_class in consider_badges:
+            if not badge_class.is_enabled():
+                continue
+            key = (badge_class.key, actor.pk, context_key)
+            if key in self.considered:
+                continue
+            self.considered.add(key)
+
+            badge = badge_class()
+            badge.evaluator = self
+            badge.consider_award(actor, context_object, timestamp)
+
+
+class BadgeEventQueue(threading.local):
+    """Collects badge events of the current transaction and
+    hands them over to the celery task in one batch, after
+    the transaction is committed. Outside of the transactions
+    the events are handed over at once"""
+
+    def __init__(self):
+        super(BadgeEventQueue, self).__init__()
+        self.events = dict()
+
+    def reset(self, **kwargs): # pylint: disable=unused-argument
+        """discards the events of the rolled back transactions"""
+        self.events = dict()
+
+    def add(self, event, actor, context_object, timestamp):
+        """adds event to the batch, the duplicates are ignored"""
+        if context_object is None:
+            content_type_id = object_id = None
+        else:
+            content_type_id = ContentType.objects.get_for_model(context_object).pk
+            object_id = context_object.pk
+
+        item = (event, actor.pk, content_type_id, object_id)
+        if not connection.in_atomic_block:
+            # the transaction which had collected the events was rolled back
+            self.reset()
+            self.send({item: timestamp})
+            return
+
+        self.events.setdefault(item, timestamp)
+        # registered with each event, because the callbacks registered
+        # within a savepoint are dropped when the savepoint is rolled back;
+        # the callbacks after the first one find the batch empty
+        transaction.on_commit(self.flush)
+
+    def flush(self):
+        """sends the collected events to the celery task"""
+        events, self.events = self.events, dict()
+        self.send(events)
+
+    @classmethod
+    def send(cls, events):
+        """sends the events to the celery task"""
+        if events:
+            from askbot.tasks import award_badges_celery_task
+            batch = [item + (timestamp,) for item, timestamp in events.items()]
+            award_badges_celery_task.apply_async(kwargs={'events': batch})
+
+
+badge_event_queue = BadgeEventQueue()
+request_started.connect(badge_event_queue.reset)
+
+
 @auto_now_timestamp
 def award_badges(event=None, actor=None,
                  context_object=None, timestamp=None, **kwargs):
     """function that is called when signal `award_badges_signal` is sent
+
+    With the eager celery configuration badges are considered right away,
+    otherwise the event is queued and the badges are considered
+    by the celery worker, after the current transaction is committed.
     """
-    try:
-        consider_badges = EVENTS_TO_BADGES[event]
-    except KeyError:
+    if event not in EVENTS_TO_BADGES:
         raise NotImplementedError('event "%s" is not implemented' % event)
 
-    for badge in consider_badges:
-        badge_instance = badge()
-        if badge_instance.is_enabled():
-            badge_instance.consider_award(actor, context_object, timestamp)
+    if getattr(django_settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+        BadgeEvaluator().evaluate(event, actor, context_object, timestamp)
+    else:
+        badge_event_queue.add(event, actor, context_object, timestamp)
 
 award_badges_signal.connect(award_badges)
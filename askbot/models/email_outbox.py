@@ -0,0 +1,167 @@
+"""Database-backed outbox for outgoing email.
+
+When ``ASKBOT_EMAIL_OUTBOX_ENABLED`` is true, :func:`askbot.mail.send_mail`
+stores the fully rendered message here instead of talking to the
+SMTP server inside the request. The ``drain_email_outbox`` management
+command delivers the queued messages in batches, one SMTP connection
+per batch, at a configurable rate and retries failures with
+exponential backoff.
+"""
+import datetime
+from django.conf import settings as django_settings
+from django.db import models, transaction
+from django.db import connection as db_connection
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from picklefield.fields import PickledObjectField
+from askbot.models.base import BaseQuerySetManager
+
+
+class QueuedEmailQuerySet(models.QuerySet):
+    """Chainable filters for the :class:`QueuedEmail` model"""
+
+    def pending(self):
+        """Messages that were neither sent nor abandoned"""
+        return self.filter(status=QueuedEmail.STATUS_PENDING)
+
+    def due(self, now=None):
+        """Pending messages whose next delivery attempt is due"""
+        now = now or timezone.now()
+        return self.pending().filter(next_attempt_at__lte=now)
+
+
+class QueuedEmailManager(BaseQuerySetManager):
+    """Manager for the :class:`QueuedEmail` model"""
+
+    def get_queryset(self):
+        return QueuedEmailQuerySet(self.model)
+
+    def enqueue(self, subject_line, body_text, from_email, # pylint: disable=too-many-arguments
+                recipient_list, headers=None, attachments=None,
+                html_enabled=False):
+        """Stores a rendered message for the delivery by the drain worker"""
+        now = timezone.now()
+        return self.create(
+            subject_line=subject_line,
+            body_text=body_text,
+            from_email=from_email,
+            recipient_list=list(recipient_list),
+            headers=headers or {},
+            attachments=list(attachments or []),
+            html_enabled=html_enabled,
+            created_at=now,
+            next_attempt_at=now
+        )
+
+    def claim_batch(self, batch_size, lease_seconds=600):
+        """Returns a list of due messages and postpones their next
+        attempt by ``lease_seconds``, so that concurrent drain workers
+        do not pick up the same messages. If a worker dies while
+        holding the lease, the messages become due again once the
+        lease expires.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            queryset = self.due(now).order_by('next_attempt_at', 'id')
+            features = db_connection.features
+            if features.has_select_for_update_skip_locked:
+                queryset = queryset.select_for_update(skip_locked=True)
+            elif features.has_select_for_update:
+                queryset = queryset.select_for_update()
+            messages = list(queryset[:batch_size])
+            lease_until = now + datetime.timedelta(seconds=lease_seconds)
+            self.filter(id__in=[message.id for message in messages]).update(
+                                                        next_attempt_at=lease_until)
+        return messages
+
+    def get_queue_depth(self):
+        """Returns dictionary with the numbers of pending, due
+        and failed messages, plus the age of the oldest pending message
+        in seconds (or ``None`` if the queue is empty)"""
+        now = timezone.now()
+        pending = self.pending()
+        oldest = pending.aggregate(oldest=models.Min('created_at'))['oldest']
+        return {
+            'pending': pending.count(),
+            'due': self.due(now).count(),
+            'failed': self.filter(status=QueuedEmail.STATUS_FAILED).count(),
+            'oldest_pending_age': (now - oldest).total_seconds() if oldest else None,
+        }
+
+    def purge_sent(self, older_than):
+        """Deletes the delivered messages sent before the ``older_than`` timestamp"""
+        return self.filter(status=QueuedEmail.STATUS_SENT,
+                           sent_at__lt=older_than).delete()
+
+
+class QueuedEmail(models.Model):
+    """An outgoing email message waiting for delivery"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('pending')),
+        (STATUS_SENT, _('sent')),
+        (STATUS_FAILED, _('failed')),
+    )
+
+    subject_line = models.TextField()
+    body_text = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipient_list = PickledObjectField(default=list)
+    headers = PickledObjectField(default=dict)
+    attachments = PickledObjectField(default=list)
+    html_enabled = models.BooleanField(default=False)
+
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES,
+                              default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    objects = QueuedEmailManager()
+
+    class Meta:
+        app_label = 'askbot'
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+        verbose_name = _('queued email')
+        verbose_name_plural = _('queued emails')
+
+    def __str__(self):
+        return f'QueuedEmail: {self.subject_line} ({self.status})'
+
+    def get_retry_delay(self):
+        """Exponential backoff delay before the next attempt,
+        capped by ``ASKBOT_EMAIL_OUTBOX_MAX_RETRY_DELAY_SECONDS``"""
+        base = django_settings.ASKBOT_EMAIL_OUTBOX_RETRY_DELAY_SECONDS
+        cap = django_settings.ASKBOT_EMAIL_OUTBOX_MAX_RETRY_DELAY_SECONDS
+        seconds = min(base * 2 ** max(self.attempts - 1, 0), cap)
+        return datetime.timedelta(seconds=seconds)
+
+    def mark_sent(self):
+        """Records the successful delivery"""
+        self.attempts += 1
+        self.status = self.STATUS_SENT
+        self.sent_at = timezone.now()
+        self.last_error = ''
+        self.save(update_fields=['attempts', 'status', 'sent_at', 'last_error'])
+
+    def mark_failed_attempt(self, error):
+        """Schedules a retry with backoff or gives up on the message
+        after ``ASKBOT_EMAIL_OUTBOX_MAX_ATTEMPTS`` attempts"""
+        self.attempts += 1
+        self.last_error = str(error)
+        if self.attempts >= django_settings.ASKBOT_EMAIL_OUTBOX_MAX_ATTEMPTS:
+            self.status = self.STATUS_FAILED
+        else:
+            self.next_attempt_at = timezone.now() + self.get_retry_delay()
+        self.save(update_fields=['attempts', 'status', 'last_error', 'next_attempt_at'])
+
+    def requeue(self):
+        """Puts a failed message back into the queue"""
+        self.status = self.STATUS_PENDING
+        self.attempts = 0
+        self.next_attempt_at = timezone.now()
+        self.save(update_fields=['status', 'attempts', 'next_attempt_at'])
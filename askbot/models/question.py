@@ -29,6 +29,7 @@ from askbot.models.user import Activity, Group, PERSONAL_GROUP_NAME_PREFIX
 from askbot.models.fields import LanguageCodeField
 from askbot import signals
 from askbot import const
+from askbot.utils import cache as cache_utils
 from askbot.utils.lists import LazyList
 from askbot.utils.loading import load_plugin
 from askbot.search import mysql
@@ -1058,21 +1059,36 @@ class Thread(models.Model):
             return key
         return key + '-' + '-'.join(sorted([group.id for group in groups]))
 
-    def invalidate_cached_post_data(self):
+    def get_cache_namespace(self):
+        """namespace of the cached post data of the thread"""
+        return f'thread-{self.id}'
+
+    def get_surrogate_tags(self):
+        """surrogate tags of the pages showing the thread,
+        see ``askbot.utils.cache.add_surrogate_tags``"""
+        tags = [cache_utils.get_tag_surrogate_tag(name) for name in self.get_tag_names()]
+        return [self.get_cache_namespace()] + tags
+
+    def invalidate_cached_post_data(self, lists=True):
         """needs to be called when anything notable
         changes in the post data - on votes, adding,
-        deleting, editing content"""
-        # we can call delete_many() here if using Django > 1.2
-        sort_methods = [v[0] for v in const.ANSWER_SORT_METHODS]
-        keys = [self.get_post_data_cache_key(v) for v in sort_methods]
-        cache.cache.delete_many(keys)
-
-    def reset_cached_data(self):
-        self.clear_cached_data()
+        deleting, editing content.
+
+        ``lists=False`` keeps the cached question lists, use it for
+        the changes not affecting them, like votes: the lists
+        are purged on the new, deleted, retagged or retitled threads
+        and on the new activity"""
+        tags = [self.get_cache_namespace()]
+        if lists:
+            tags.append(cache_utils.QUESTIONS_SURROGATE_TAG)
+        cache_utils.purge_surrogate_tags(tags)
+
+    def reset_cached_data(self, lists=True):
+        self.clear_cached_data(lists=lists)
         self.update_summary_html()
 
-    def clear_cached_data(self):
-        self.invalidate_cached_post_data()
+    def clear_cached_data(self, lists=True):
+        self.invalidate_cached_post_data(lists=lists)
         self.invalidate_cached_summary_html()
 
     def get_public_posts(self):
@@ -1216,11 +1232,12 @@ class Thread(models.Model):
             return self.get_post_data(sort_method=sort_method, groups=groups)
 
         key = self.get_post_data_cache_key(sort_method, groups)
-        post_data = cache.cache.get(key)
-        if not post_data:
-            post_data = self.get_post_data(sort_method=sort_method, groups=groups)
-            cache.cache.set(key, post_data, const.LONG_TIME)
-        return post_data
+        return cache_utils.get_or_set(
+                        key,
+                        lambda: self.get_post_data(sort_method=sort_method, groups=groups),
+                        timeout=const.LONG_TIME,
+                        namespace=self.get_cache_namespace()
+                    )
 
     def get_post_data(self, sort_method=None, groups=None):
         """
@@ -1414,11 +1431,7 @@ class Thread(models.Model):
             with the default expiration delay
             """
             key = 'similar-threads-%s' % self.id
-            data = cache.cache.get(key)
-            if data is None:
-                data = get_data()
-                cache.cache.set(key, data)
-            return data
+            return cache_utils.get_or_set(key, get_data)
 
         return LazyList(get_cached_data)
 
@@ -1,12 +1,14 @@
 """`AvatarBlockData` - class helping to access data
 needed to draw user avatars on the main page"""
 from collections import defaultdict
-from django.core.cache import cache
 from askbot import const
 from askbot.models import Activity, Post, User
 from askbot.conf import settings as askbot_settings
+from askbot.utils import cache as cache_utils
 from askbot.utils.translation import get_language
 
+avatars_cache = cache_utils.LocalCacheFamily('avatars')
+
 
 class AvatarsBlockData(object):
     """Class managing data for the avatars
@@ -19,22 +21,20 @@ class AvatarsBlockData(object):
         if not askbot_settings.SIDEBAR_MAIN_SHOW_AVATARS:
             return []
 
-        data = cls.get_cached_data()
-        if data:
-            return data
-        data = cls.get_fresh_data()
-        cls.cache_data(data[:askbot_settings.SIDEBAR_MAIN_AVATAR_LIMIT])
-        return data
+        return cache_utils.get_or_set(cls.CACHE_KEY, cls.get_fresh_data,
+                                      backend=avatars_cache)
 
 
     @classmethod
     def get_cached_data(cls): #pylint: disable=missing-docstring
-        return cache.get(cls.CACHE_KEY)
+        return cache_utils.get_cached(cls.CACHE_KEY, backend=avatars_cache)
 
 
     @classmethod
     def cache_data(cls, data): #pylint: disable=missing-docstring
-        cache.set(cls.CACHE_KEY, data[:askbot_settings.SIDEBAR_MAIN_AVATAR_LIMIT])
+        cache_utils.set_cached(cls.CACHE_KEY,
+                               data[:askbot_settings.SIDEBAR_MAIN_AVATAR_LIMIT],
+                               backend=avatars_cache)
 
 
     @classmethod
@@ -3,6 +3,7 @@ import datetime
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import fields
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
 from django.utils.translation import gettext as _
 from django.utils.html import escape
@@ -172,6 +173,12 @@ class Award(models.Model):
         verbose_name_plural = _("awards")
 
 
+def get_upvoted_today_cache_key(user, date):
+    """cache key for the counter of reputation received
+    by the user for the upvotes on the given date"""
+    return 'askbot-upvoted-rep-{}-{}'.format(user.pk, date.isoformat())
+
+
 class ReputeManager(models.Manager):
     def get_reputation_by_upvoted_today(self, user):
         """
@@ -201,6 +208,30 @@ class ReputeManager(models.Manager):
             else:
                 return 0
 
+    def add_reputation_by_upvoted_today(self, user, points):
+        """Adds ``points`` to the cached counter of reputation
+        received by the user for the upvotes today and returns
+        the counter value *before* the addition.
+
+        The counter is an atomic cache increment, so that the
+        vote path does not run the aggregate query of
+        ``get_reputation_by_upvoted_today`` on each vote
+        and does not lock any rows. On a cache miss the counter
+        is seeded from the ``Repute`` records.
+        """
+        today = datetime.date.today()
+        key = get_upvoted_today_cache_key(user, today)
+        timeout = const.UPVOTED_TODAY_CACHE_TIMEOUT
+        if cache.get(key) is None:
+            cache.add(key, self.get_reputation_by_upvoted_today(user), timeout)
+        try:
+            return cache.incr(key, points) - points
+        except ValueError:
+            # the key was evicted between the calls
+            total = self.get_reputation_by_upvoted_today(user)
+            cache.set(key, total + points, timeout)
+            return total
+
 
 class Repute(models.Model):
     """The reputation histories for user"""
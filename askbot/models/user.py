@@ -16,9 +16,17 @@ import tldextract
 from askbot import const
 from askbot.conf import settings as askbot_settings
 from askbot.utils import functions
+from askbot.utils import cache as cache_utils
 from askbot.models.base import BaseQuerySetManager
 from askbot.models.tag import get_tags_by_names, Tag
 
+global_group_cache = cache_utils.LocalCacheFamily('global-group')
+
+
+def get_global_group_cache_key(group_name):
+    """cache key of the global group"""
+    return 'askbot-global-group-' + group_name
+
 PERSONAL_GROUP_NAME_PREFIX = '_personal_'
 
 def get_organization_name_from_domain(domain):
@@ -576,6 +584,17 @@ class GroupManager(BaseQuerySetManager):
         #revert the values
         #todo: change groups to django groups
         group_name = askbot_settings.GLOBAL_GROUP_NAME
+        if global_group_cache.enabled:
+            return cache_utils.get_or_set(
+                            get_global_group_cache_key(group_name),
+                            lambda: self.get_global_group_from_db(group_name),
+                            backend=global_group_cache
+                        )
+        return self.get_global_group_from_db(group_name)
+
+    def get_global_group_from_db(self, group_name):
+        """Returns the global group from the database,
+        if necessary, creates one"""
         try:
             return self.get_queryset().get(name=group_name)
         except Group.DoesNotExist:
@@ -745,6 +764,12 @@ class Group(AuthGroup):
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
+        if self.name == askbot_settings.GLOBAL_GROUP_NAME:
+            global_group_cache.delete(get_global_group_cache_key(self.name))
+
+    def delete(self, *args, **kwargs): # pylint: disable=arguments-differ
+        global_group_cache.delete(get_global_group_cache_key(self.name))
+        return super().delete(*args, **kwargs)
 
 
 class BulkTagSubscriptionManager(BaseQuerySetManager): # pylint: disable=too-few-public-methods
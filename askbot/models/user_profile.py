@@ -3,11 +3,16 @@ from django.core.cache import cache
 from django.db.models.signals import post_save
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django_countries.fields import CountryField
 from jsonfield import JSONField
 from askbot import const
 from askbot.models.fields import LanguageCodeField
+from askbot.utils.cache import LocalCacheFamily
+
+profile_cache = LocalCacheFamily('profiles')
 
 # the mere fact that this method's use case is so specific,
 # that the parameter is called "user" ...
@@ -33,15 +38,50 @@ def get_profile_from_db(user):
 
 def get_profile(user):
     key = get_profile_cache_key(user)
-    profile = cache.get(key)
+    profile = profile_cache.get(key)
     if not profile:
         profile = get_profile_from_db(user)
-        cache.set(key, profile)
+        profile_cache.set(key, profile)
 
     setattr(user, 'askbot_profile', profile)
     return profile
 
 
+def add_reputation(user, num_points):
+    """Adds ``num_points`` to the user reputation with a single
+    ``UPDATE ... SET reputation = reputation + num_points``,
+    so that concurrent updates are not lost. Reputation does not go
+    below ``const.MIN_REPUTATION``. Returns the new reputation value.
+    """
+    profile = get_profile(user)
+    profiles = UserProfile.objects.filter(pk=profile.pk) # pylint: disable=no-member
+    profiles.update(
+        reputation=Greatest(F('reputation') + num_points, const.MIN_REPUTATION)
+    )
+    profile.reputation = profiles.values_list('reputation', flat=True).get()
+    profile.update_cache()
+    return profile.reputation
+
+
+def add_localized_reputation(user, language_code, num_points):
+    """Same as ``add_reputation``, for the per-language reputation,
+    which starts with 0. Creates the localized profile if necessary."""
+    profiles = LocalizedUserProfile.objects.filter( # pylint: disable=no-member
+                                            auth_user=user,
+                                            language_code=language_code
+                                        )
+    updated = profiles.update(reputation=Greatest(F('reputation') + num_points, 0))
+    if updated:
+        cache.delete(get_localized_profile_cache_key(user, language_code))
+    else:
+        profile = LocalizedUserProfile(
+                                    auth_user=user,
+                                    language_code=language_code,
+                                    reputation=max(0, num_points)
+                                )
+        profile.save()
+
+
 def user_profile_property(field_name):
     """returns property that will access Askbot UserProfile
     of auth_user by field name"""
@@ -226,7 +266,7 @@ class UserProfile(models.Model):
 
     def update_cache(self):
         key = self.get_cache_key()
-        cache.set(key, self)
+        profile_cache.set(key, self)
 
     def save(self, *args, **kwargs):
         self.update_cache()
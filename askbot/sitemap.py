@@ -1,22 +1,144 @@
+"""Sitemap of the questions.
+
+``/sitemap.xml`` is a sitemap index, listing one sitemap
+per range of ``ASKBOT_SITEMAP_SHARD_SIZE`` question ids.
+The shards are rendered from the ``values()`` rows, read with
+``iterator()``, without instantiating the posts.
+
+The rendered shard is cached under the key containing its id range,
+the number of the questions and their latest activity time,
+so a shard is rendered again only when a question in its range
+is added, deleted or has new activity.
+"""
+import io
+from urllib.parse import quote as django_urlquote
+from django.conf import settings as django_settings
 from django.contrib.sitemaps import Sitemap
+from django.db.models import Count, F, Max
+from django.db.models.functions import Mod
+from django.urls import reverse
+from django.utils import translation
+from django.utils.xmlutils import SimplerXMLGenerator
+import askbot
 from askbot.models import Post
+from askbot.utils.cache import get_or_set
+from askbot.utils.slug import slugify
+
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+SHARD_CACHE_TIMEOUT = 24 * 60 * 60
+QUESTION_FIELDS = ('id', 'language_code', 'thread__title', 'thread__last_activity_at')
+
+
+def get_questions():
+    """returns query set of the questions listed in the sitemap"""
+    questions = Post.objects.get_questions()
+    return questions.filter(deleted=False, approved=True)
+
+
+def get_shard_questions(shard):
+    """returns query set of the questions in the id range of the shard"""
+    shard_size = django_settings.ASKBOT_SITEMAP_SHARD_SIZE
+    return get_questions().filter(id__gte=shard * shard_size,
+                                  id__lt=(shard + 1) * shard_size)
+
+
+def get_shards():
+    """returns list of dictionaries with keys ``shard``,
+    ``lastmod`` and ``count`` of the non-empty shards,
+    computed with one grouped query"""
+    shard_size = django_settings.ASKBOT_SITEMAP_SHARD_SIZE
+    questions = get_questions().annotate(range_start=F('id') - Mod('id', shard_size))
+    rows = questions.values('range_start').annotate(
+        lastmod=Max('thread__last_activity_at'), count=Count('id')
+    ).order_by('range_start')
+    # the database may return the result of Mod as a float
+    return [{'shard': int(row['range_start']) // shard_size,
+             'lastmod': row['lastmod'],
+             'count': row['count']} for row in rows]
+
+
+def get_shard_info(shard):
+    """returns dictionary with keys ``lastmod`` and ``count``
+    of the questions in the shard"""
+    return get_shard_questions(shard).aggregate(lastmod=Max('thread__last_activity_at'),
+                                                count=Count('id'))
+
+
+def get_question_url(row):
+    """returns path of the question from the ``values()`` row,
+    same as ``Post.get_absolute_url``"""
+    if askbot.is_multilingual():
+        with translation.override(row['language_code']):
+            url = reverse('question', args=[row['id']])
+    else:
+        url = reverse('question', args=[row['id']])
+    return url + django_urlquote(slugify(row['thread__title'])) + '/'
+
+
+def format_lastmod(lastmod):
+    """returns W3C datetime of the last modification"""
+    return lastmod.isoformat(timespec='seconds')
+
+
+def render_shard(shard, site_url, chunk_size=1000):
+    """returns xml of the sitemap of the questions in the shard,
+    ``site_url`` is the protocol and the domain of the links"""
+    questions = get_shard_questions(shard).values(*QUESTION_FIELDS).order_by('id')
+    output = io.StringIO()
+    xml = SimplerXMLGenerator(output, 'utf-8')
+    xml.startDocument()
+    xml.startElement('urlset', {'xmlns': SITEMAP_NAMESPACE})
+    for row in questions.iterator(chunk_size=chunk_size):
+        xml.startElement('url', {})
+        xml.addQuickElement('loc', site_url + get_question_url(row))
+        xml.addQuickElement('lastmod', format_lastmod(row['thread__last_activity_at']))
+        xml.addQuickElement('changefreq', QuestionsSitemap.changefreq)
+        xml.addQuickElement('priority', str(QuestionsSitemap.priority))
+        xml.endElement('url')
+    xml.endElement('urlset')
+    xml.endDocument()
+    return output.getvalue()
+
+
+def get_cached_shard(shard, site_url, shard_info):
+    """returns xml of the shard, cached until the
+    number or the latest activity of its questions changes"""
+    key = 'sitemap-questions:%s:%s:%d:%d:%s' % (
+        site_url, translation.get_language(), shard,
+        shard_info['count'], shard_info['lastmod'].timestamp()
+    )
+    return get_or_set(key, lambda: render_shard(shard, site_url),
+                      timeout=SHARD_CACHE_TIMEOUT)
+
+
+def render_index(site_url):
+    """returns xml of the sitemap index listing the shards"""
+    output = io.StringIO()
+    xml = SimplerXMLGenerator(output, 'utf-8')
+    xml.startDocument()
+    xml.startElement('sitemapindex', {'xmlns': SITEMAP_NAMESPACE})
+    for shard in get_shards():
+        xml.startElement('sitemap', {})
+        url = reverse('sitemap_questions', kwargs={'shard': shard['shard']})
+        xml.addQuickElement('loc', site_url + url)
+        xml.addQuickElement('lastmod', format_lastmod(shard['lastmod']))
+        xml.endElement('sitemap')
+    xml.endElement('sitemapindex')
+    xml.endDocument()
+    return output.getvalue()
 
 
 class QuestionsSitemap(Sitemap):
+    """Questions sitemap for the ``django.contrib.sitemaps`` views,
+    the items are the ``values()`` rows of the questions"""
     changefreq = 'daily'
     priority = 0.5
 
     def items(self):
-        questions = Post.objects.get_questions()
-        questions = questions.exclude(deleted=True)
-        questions = questions.exclude(approved=False)
-        # this also references fields of another object, rather than just the
-        # related object. Removing the field references, leaving only object
-        # reference
-        return questions.select_related('thread')
+        return get_questions().values(*QUESTION_FIELDS).order_by('id')
 
     def lastmod(self, obj):
-        return obj.thread.last_activity_at
+        return obj['thread__last_activity_at']
 
     def location(self, obj):
-        return obj.get_absolute_url()
+        return get_question_url(obj)
@@ -1,7 +1,9 @@
+import time
 from django_jinja.base import dict_from_context
 import django.template.backends.jinja2
 from django.template.backends.jinja2 import Template as OriginalJinja2Template
 from django.template.context import BaseContext
+from askbot.utils.profiling import record_template_render
 
 class Template(OriginalJinja2Template):
     # backend parameter was added with Django 1.11
@@ -14,6 +16,10 @@ class Template(OriginalJinja2Template):
         if isinstance(context,BaseContext):
             context = dict_from_context(context)
 
-        return super(Template, self).render(context, request)
+        start = time.perf_counter()
+        try:
+            return super(Template, self).render(context, request)
+        finally:
+            record_template_render(time.perf_counter() - start)
 
 django.template.backends.jinja2.Template = Template
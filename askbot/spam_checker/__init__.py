@@ -1,7 +1,27 @@
+"""Spam checking of the posted content.
+
+``is_spam`` calls the function selected with ``ASKBOT_SPAM_CHECKER_FUNCTION``,
+caches the verdicts by the content and the user for
+``ASKBOT_SPAM_VERDICT_CACHE_TIMEOUT`` seconds and counts the checks
+and their latency (see ``get_stats``). With
+``ASKBOT_SPAM_CHECK_MODE = 'async'`` the new posts and the edits
+by the registered users are published at once and checked by
+a celery task, posts found to be spam are moved to the moderation queue.
+"""
+import hashlib
+import logging
+import time
 from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.utils import timezone
 from askbot.utils.loading import load_function
 
-is_spam = load_function(django_settings.ASKBOT_SPAM_CHECKER_FUNCTION)
+LOG = logging.getLogger('askbot.spam_checker')
+STATS_KEY_PREFIX = 'askbot-spam-checker-stats:'
+STATS_METRICS = ('checks', 'cache_hits', 'spam', 'slow', 'total_ms', 'max_ms')
+
+check_spam = load_function(django_settings.ASKBOT_SPAM_CHECKER_FUNCTION)
+
 
 def get_params_from_request(request):
     """Returns a dictionary of parameters to be passed to the spam checker"""
@@ -14,4 +34,127 @@ def get_params_from_request(request):
         'email': email,
         'ip_addr': request.META.get('REMOTE_ADDR', None),
         'user_agent': request.META.get('HTTP_USER_AGENT', None),
-    }
\ No newline at end of file
+    }
+
+
+def get_verdict_cache_key(text, username=None, ip_addr=None, **kwargs): # pylint: disable=unused-argument
+    """the verdict is cached per checker, text and user,
+    anonymous users are told apart by the ip address"""
+    user = 'user:' + username if username else 'ip:' + (ip_addr or '')
+    source = '\0'.join((django_settings.ASKBOT_SPAM_CHECKER_FUNCTION, user, text))
+    return 'spam-verdict:' + hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def record_metric(name, value=1):
+    """adds the value to the counter in the cache"""
+    key = STATS_KEY_PREFIX + name
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        if not cache.add(key, value, timeout=None):
+            cache.incr(key, value)
+
+
+def record_check(duration_ms, verdict):
+    """records the call of the spam checker function"""
+    record_metric('checks')
+    record_metric('total_ms', int(round(duration_ms)))
+    if verdict:
+        record_metric('spam')
+    # max is not updated atomically, it is informative only
+    max_key = STATS_KEY_PREFIX + 'max_ms'
+    if duration_ms > cache.get(max_key, 0):
+        cache.set(max_key, int(round(duration_ms)), timeout=None)
+    if duration_ms >= django_settings.ASKBOT_SPAM_CHECKER_SLOW_MS:
+        record_metric('slow')
+        LOG.warning('slow spam check: %dms', duration_ms)
+    else:
+        LOG.debug('spam check: %dms', duration_ms)
+
+
+def get_stats():
+    """returns dictionary with the spam checker counters"""
+    stats = cache.get_many([STATS_KEY_PREFIX + name for name in STATS_METRICS])
+    stats = {name: stats.get(STATS_KEY_PREFIX + name, 0) for name in STATS_METRICS}
+    stats['avg_ms'] = round(float(stats['total_ms']) / stats['checks'], 1) \
+                      if stats['checks'] else None
+    return stats
+
+
+def reset_stats():
+    """deletes the spam checker counters"""
+    cache.delete_many([STATS_KEY_PREFIX + name for name in STATS_METRICS])
+
+
+def is_spam(text, **kwargs):
+    """Returns True if the text is classified as spam,
+    `kwargs` are passed to the spam checker function"""
+    timeout = django_settings.ASKBOT_SPAM_VERDICT_CACHE_TIMEOUT
+    if timeout:
+        key = get_verdict_cache_key(text, **kwargs)
+        verdict = cache.get(key)
+        if verdict is not None:
+            record_metric('cache_hits')
+            return verdict
+
+    start = time.perf_counter()
+    verdict = bool(check_spam(text, **kwargs))
+    record_check((time.perf_counter() - start) * 1000, verdict)
+
+    if timeout:
+        cache.set(key, verdict, timeout)
+    return verdict
+
+
+def is_async_mode():
+    """True if the posts are checked by the celery task"""
+    return django_settings.ASKBOT_SPAM_CHECK_MODE == 'async'
+
+
+def check_post_later(post, request):
+    """Schedules the spam check of the just published
+    latest revision of the post"""
+    from askbot.tasks import check_post_revision_for_spam_celery_task
+    from askbot.utils.celery_utils import defer_celery_task
+    revision = post.revisions.order_by('-id').first()
+    defer_celery_task(
+        check_post_revision_for_spam_celery_task,
+        kwargs={'revision_id': revision.pk,
+                'spam_checker_params': get_params_from_request(request)}
+    )
+
+
+def move_revision_to_moderation_queue(revision):
+    """Unpublishes the revision found to be spam after it was published
+    and places it on the moderation queue, as if the revision had been
+    premoderated. A new post is hidden, an edit is reverted to the
+    previous revision until a moderator approves it."""
+    post = revision.post
+    previous = post.revisions.exclude(pk=revision.pk).filter(revision__gt=0)
+    previous = previous.order_by('-revision').first()
+
+    revision.revision = 0
+    revision.approved = False
+    revision.save()
+
+    if previous is None:
+        # the approval counts the answer and the comment again
+        if post.is_answer():
+            post.thread.answer_count -= 1
+            post.thread.save()
+        revision.place_on_moderation_queue()
+        if post.is_comment():
+            post.parent.recount_comments()
+            post.parent.save()
+    else:
+        if post.is_question():
+            # the title and the tags are edited with their own revisions
+            post.thread.title = previous.title
+            post.thread.update_tags(tagnames=previous.tagnames, user=previous.author,
+                                    timestamp=timezone.now())
+            post.thread.save()
+        post.text = previous.text
+        post.parse_and_save(author=previous.author)
+        revision.place_on_moderation_queue()
+
+    post.thread.reset_cached_data()
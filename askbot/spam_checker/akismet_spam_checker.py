@@ -1,11 +1,53 @@
 from akismet import Akismet, APIKeyError, AkismetError
 from askbot.conf import settings as askbot_settings
 from askbot import get_version
+from askbot.spam_checker.askbot_spam_checker import get_session
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.encoding import smart_str
 from askbot.utils.html import site_url
 from django.urls import reverse
 import logging
+import threading
+
+_clients = dict() # pylint: disable=invalid-name
+_clients_lock = threading.Lock() # pylint: disable=invalid-name
+
+
+class PooledAkismet(Akismet):
+    """Akismet client sending the API calls through the pooled
+    session of the spam checkers, the library posts each request
+    with a new connection. Overrides ``_api_request`` of the
+    ``akismet==1.0.1`` release, the key is verified by the
+    constructor, once per client, with a separate connection."""
+
+    def _api_request(self, endpoint, user_ip, user_agent, **kwargs):
+        data = {'blog': self.blog_url,
+                'user_ip': user_ip,
+                'user_agent': user_agent}
+        for key in self.OPTIONAL_KEYS:
+            if key in kwargs:
+                data[key] = kwargs[key]
+        return get_session().post(endpoint.format(self.api_key),
+                                  data=data,
+                                  headers=self.user_agent_header)
+
+
+def get_client(key, blog_url):
+    """returns the process-wide Akismet client for the key and the url,
+    so that the key is verified once per process"""
+    with _clients_lock:
+        client = _clients.get((key, blog_url))
+        if client is None:
+            client = PooledAkismet(key=key, blog_url=blog_url)
+            _clients[(key, blog_url)] = client
+    return client
+
+
+def reset_clients():
+    """forgets the clients, the keys are verified again"""
+    with _clients_lock:
+        _clients.clear()
+
 
 def get_user(user, request):
     return user or request.user
@@ -58,8 +100,8 @@ def call_akismet(text,
         if email:
             data['comment_author_email'] = email
 
-        api = Akismet(key=askbot_settings.AKISMET_API_KEY,
-                      blog_url=smart_str(site_url(reverse('questions'))))
+        api = get_client(askbot_settings.AKISMET_API_KEY,
+                         smart_str(site_url(reverse('questions'))))
 
         if command == 'check_spam':
             return api.comment_check(ip_addr, user_agent, **data)
@@ -1,8 +1,30 @@
 """Custom built spam checker for Askbot"""
 import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings as django_settings
 
+_session = None # pylint: disable=invalid-name
+_session_lock = threading.Lock() # pylint: disable=invalid-name
+
+
+def get_session():
+    """Returns the process-wide session keeping the connections to the
+    spam checker API alive, so that the checks do not pay for the TCP
+    and TLS handshakes"""
+    global _session # pylint: disable=global-statement
+    with _session_lock:
+        if _session is None:
+            pool_size = django_settings.ASKBOT_SPAM_CHECKER_POOL_SIZE
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
+
 def is_spam(text, **kwargs): # pylint: disable=unused-argument
     """Returns True if the text is spam, `kwargs` are ignored.
     If there is an error while calling the spam checker API, it returns False.
@@ -14,7 +36,7 @@ def is_spam(text, **kwargs): # pylint: disable=unused-argument
         api_url = django_settings.ASKBOT_SPAM_CHECKER_API_URL
         timeout = django_settings.ASKBOT_SPAM_CHECKER_TIMEOUT_SECONDS
         data = {"api_key": api_key, "text": text}
-        response = requests.post(api_url, json=data, timeout=timeout)
+        response = get_session().post(api_url, json=data, timeout=timeout)
     except Exception as error: # pylint: disable=broad-except
         logging.critical('Error while calling spam checker API %s', str(error))
         return False
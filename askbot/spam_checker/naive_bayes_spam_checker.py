@@ -0,0 +1,155 @@
+"""Offline naive Bayes spam checker.
+
+Needs no external service: the model is trained by the
+``askbot_train_spam_classifier`` management command from the file
+written by ``askbot_get_spam_training_set`` and is read from
+``ASKBOT_SPAM_CLASSIFIER_MODEL_FILE``. To enable, set::
+
+    ASKBOT_SPAM_CHECKER_FUNCTION = 'askbot.spam_checker.naive_bayes_spam_checker.is_spam'
+
+The features are the word n-grams of the text hashed into a fixed
+number of buckets, so the model size does not grow with the vocabulary.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from django.conf import settings as django_settings
+
+MODEL_VERSION = 1
+CLASSES = ('spam', 'ham')
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+#path -> (modification time, model) of the loaded models
+_models = {} # pylint: disable=invalid-name
+_models_lock = threading.Lock() # pylint: disable=invalid-name
+
+
+def get_features(text, ngrams, buckets):
+    """returns set of the hashed word n-grams of the text"""
+    words = WORD_RE.findall(text.lower())
+    features = set()
+    for size in range(1, ngrams + 1):
+        for start in range(len(words) - size + 1):
+            gram = ' '.join(words[start:start + size])
+            features.add(zlib.crc32(gram.encode('utf-8')) % buckets)
+    return features
+
+
+class NaiveBayesModel(object):
+    """Multinomial naive Bayes over the presence of the hashed n-grams
+    with the additive (Laplace) smoothing"""
+
+    def __init__(self, ngrams=2, buckets=2 ** 20, alpha=1.0):
+        self.ngrams = ngrams
+        self.buckets = buckets
+        self.alpha = alpha
+        self.documents = dict.fromkeys(CLASSES, 0)
+        self.totals = dict.fromkeys(CLASSES, 0)
+        self.counts = {name: Counter() for name in CLASSES}
+
+    def train(self, texts, label):
+        """adds the texts of the class ``label`` to the model"""
+        counts = self.counts[label]
+        for text in texts:
+            features = get_features(text, self.ngrams, self.buckets)
+            counts.update(features)
+            self.totals[label] += len(features)
+            self.documents[label] += 1
+
+    def get_spam_probability(self, text):
+        """returns the probability of the text being spam, 0.5
+        if the model has not seen any documents of either class"""
+        if not all(self.documents.values()):
+            return 0.5
+
+        features = get_features(text, self.ngrams, self.buckets)
+        all_documents = sum(self.documents.values())
+        scores = dict()
+        for label in CLASSES:
+            counts = self.counts[label]
+            denominator = math.log(self.totals[label] + self.alpha * self.buckets)
+            score = math.log(self.documents[label] / all_documents)
+            for feature in features:
+                score += math.log(counts[feature] + self.alpha) - denominator
+            scores[label] = score
+
+        #logistic of the log-odds, avoiding the overflow of exp
+        log_odds = scores['spam'] - scores['ham']
+        if log_odds < 0:
+            odds = math.exp(log_odds)
+            return odds / (1 + odds)
+        return 1 / (1 + math.exp(-log_odds))
+
+    def to_dict(self):
+        """returns the model as a JSON-serializable dictionary"""
+        return {
+            'version': MODEL_VERSION,
+            'ngrams': self.ngrams,
+            'buckets': self.buckets,
+            'alpha': self.alpha,
+            'documents': self.documents,
+            'totals': self.totals,
+            'counts': {label: {str(feature): count for feature, count in counts.items()}
+                       for label, counts in self.counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """the reverse of ``to_dict``"""
+        if data.get('version') != MODEL_VERSION:
+            raise ValueError('unsupported spam classifier model version %r' % data.get('version'))
+        model = cls(ngrams=data['ngrams'], buckets=data['buckets'], alpha=data['alpha'])
+        model.documents = data['documents']
+        model.totals = data['totals']
+        model.counts = {label: Counter({int(feature): count for feature, count in counts.items()})
+                        for label, counts in data['counts'].items()}
+        return model
+
+    def save(self, file_name):
+        """writes the model to the file, replacing it atomically
+        so that the running processes never read a partial file"""
+        temp_name = file_name + '.tmp'
+        with open(temp_name, 'w', encoding='utf-8') as model_file:
+            json.dump(self.to_dict(), model_file)
+        os.replace(temp_name, file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        """reads the model written by ``save``"""
+        with open(file_name, encoding='utf-8') as model_file:
+            return cls.from_dict(json.load(model_file))
+
+
+def get_model():
+    """returns the model from ``ASKBOT_SPAM_CLASSIFIER_MODEL_FILE``,
+    the file is read again when it is modified, e.g. by retraining"""
+    file_name = django_settings.ASKBOT_SPAM_CLASSIFIER_MODEL_FILE
+    if not file_name:
+        raise ValueError('ASKBOT_SPAM_CLASSIFIER_MODEL_FILE is not set')
+    mtime = os.path.getmtime(file_name)
+    with _models_lock:
+        loaded = _models.get(file_name)
+        if loaded is None or loaded[0] != mtime:
+            loaded = (mtime, NaiveBayesModel.load(file_name))
+            _models[file_name] = loaded
+    return loaded[1]
+
+
+def is_spam(text, **kwargs): # pylint: disable=unused-argument
+    """Returns True if the spam probability of the text is above
+    ``ASKBOT_SPAM_CLASSIFIER_THRESHOLD``, `kwargs` are ignored.
+    Like the other checkers returns False if the model cannot be used,
+    so that the users are not blocked from posting.
+    """
+    try:
+        model = get_model()
+    except Exception as error: # pylint: disable=broad-except
+        logging.critical('Error while loading the spam classifier model %s', str(error))
+        return False
+    threshold = django_settings.ASKBOT_SPAM_CLASSIFIER_THRESHOLD
+    return model.get_spam_probability(text) > threshold
@@ -46,9 +46,10 @@ from askbot.models import (
     ReplyAddress,
 )
 from askbot.models.user import get_invited_moderators
-from askbot.models.badges import award_badges_signal
+from askbot.models.badges import award_badges_signal, BadgeEvaluator
 from askbot import exceptions as askbot_exceptions
 from askbot.utils.twitter import Twitter
+from askbot import spam_checker
 from askbot.spam_checker.akismet_spam_checker import akismet_submit_spam
 from askbot.utils.debug_logging import log_instant_email, log_instant_email_error
 
@@ -103,6 +104,29 @@ def submit_spam_posts_to_akismet(post_ids):
                             email=post.author.email)
 
 
+@shared_task(ignore_result=True)
+def check_post_revision_for_spam_celery_task(revision_id, spam_checker_params):
+    """checks the published revision in the async spam check mode,
+    the revision found to be spam is moved to the moderation queue"""
+    try:
+        revision = PostRevision.objects.select_related('post').get(pk=revision_id)
+    except PostRevision.DoesNotExist:
+        return
+    post = revision.post
+    if post.deleted or revision.revision == 0:
+        return
+    if post.revisions.filter(revision__gt=revision.revision).exists():
+        # the newer revision is checked by its own task
+        return
+    if post.is_question():
+        text = post.get_text_content(title=revision.title, body_text=revision.text,
+                                     tags=revision.tagnames)
+    else:
+        text = post.get_text_content(body_text=revision.text)
+    if spam_checker.is_spam(text, **spam_checker_params):
+        spam_checker.move_revision_to_moderation_queue(revision)
+
+
 @shared_task(ignore_result=True)
 def export_user_data(user_id):
     """Exports user data by ID"""
@@ -231,6 +255,45 @@ def record_post_update_celery_task( # pylint: disable=too-many-arguments
         logger.error(str(traceback.format_exc()).encode('utf-8'))
 
 
+@shared_task(ignore_result=True)
+def award_badges_celery_task(events):
+    """considers badges for a batch of events queued by
+    ``askbot.models.badges.award_badges``
+
+    each event is a tuple
+    (event name, actor id, content type id, object id, timestamp)
+    """
+    actors = User.objects.in_bulk([event[1] for event in events])
+
+    object_ids = dict()
+    for event in events:
+        if event[2] is not None:
+            object_ids.setdefault(event[2], set()).add(event[3])
+
+    context_objects = dict()
+    for content_type_id, ids in object_ids.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        for obj in model.objects.filter(pk__in=ids):
+            context_objects[(content_type_id, obj.pk)] = obj
+
+    evaluator = BadgeEvaluator()
+    for event, actor_id, content_type_id, object_id, timestamp in events:
+        actor = actors.get(actor_id)
+        if actor is None:
+            continue
+        if content_type_id is None:
+            context_object = None
+        else:
+            context_object = context_objects.get((content_type_id, object_id))
+            if context_object is None:
+                # the object was deleted before the badges were considered
+                continue
+        try:
+            evaluator.evaluate(event, actor, context_object, timestamp)
+        except Exception: # pylint: disable=broad-except
+            logger.error(str(traceback.format_exc()).encode('utf-8'))
+
+
 @shared_task(ignore_result=True)
 def record_question_visit(
         language_code=None, question_post_id=None, update_view_count=False,
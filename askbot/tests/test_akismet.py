@@ -1,6 +1,8 @@
+from unittest.mock import patch
 from django.test import override_settings
 from askbot.tests.utils import AskbotTestCase, with_settings
 from askbot.spam_checker import is_spam
+from askbot.spam_checker import akismet_spam_checker
 import responses
 from urllib.parse import parse_qsl
 
@@ -62,8 +64,26 @@ def get_request_params(idx):
     """
     return dict(parse_qsl(responses.calls[idx].request.body))
 
+@override_settings(ASKBOT_SPAM_VERDICT_CACHE_TIMEOUT=0)
 class AkismetApiTests(AskbotTestCase):
 
+    def setUp(self):
+        akismet_spam_checker.reset_clients()
+
+    @responses.activate
+    @override_settings(ASKBOT_SPAM_CHECKER_FUNCTION=AKISMET_CLASSIFIER)
+    @with_settings(SPAM_FILTER_ENABLED=True, AKISMET_API_KEY=API_KEY, APP_URL='http://askbot.com/')
+    def test_key_is_verified_once(self):
+        mock_akismet()
+        with patch.object(akismet_spam_checker, 'get_session',
+                          wraps=akismet_spam_checker.get_session) as get_session:
+            is_spam(TEXT, ip_addr=USER_IP, user_agent=USER_AGENT)
+            is_spam(TEXT, ip_addr=USER_IP, user_agent=USER_AGENT)
+        # the checks go through the pooled session
+        self.assertEqual(get_session.call_count, 2)
+        urls = [call.request.url for call in responses.calls]
+        self.assertEqual(urls, [VERIFY_KEY_URL, CHECK_SPAM_URL, CHECK_SPAM_URL])
+
     @responses.activate
     @override_settings(ASKBOT_SPAM_CHECKER_FUNCTION=AKISMET_CLASSIFIER)
     @with_settings(SPAM_FILTER_ENABLED=True, AKISMET_API_KEY=API_KEY, APP_URL='http://askbot.com/')
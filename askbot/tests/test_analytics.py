@@ -1,13 +1,26 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import time_machine
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.test.utils import override_settings
 from django.http import HttpRequest
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models import F, Sum
+from django.urls import reverse
+from django.utils import timezone
 from askbot.tests.utils import AskbotTestCase
 from askbot import signals
-from askbot.models.analytics import (Session, Event, HourlyUserSummary,
+from askbot.models import Group
+from askbot.utils import analytics_partitions
+from askbot.models.analytics import (Session, Event, DailyActivityRollup, HourlyUserSummary,
                                      HourlyGroupSummary, DailyUserSummary,
-                                     DailyGroupSummary)
+                                     DailyGroupSummary, QuestionViewCount,
+                                     SummaryWatermark, event_buffer)
+from askbot.views.analytics.utils import (filter_events_by_content_segment,
+                                          filter_events_by_users_segment,
+                                          get_events_count)
 
 class TestAnalytics(AskbotTestCase):
 
@@ -219,3 +232,299 @@ class TestAnalytics(AskbotTestCase):
         dgs = DailyGroupSummary.objects.all() # pylint: disable=no-member
         self.assertEqual(dgs.count(), 1)
         self.assertEqual(dgs[0].question_views, 2)
+
+
+class TestCompileAnalyticsWatermarks(AskbotTestCase):
+    """Tests the set-based compilation of the events"""
+
+    def setUp(self):
+        self.user = self.create_user('user')
+        self.question = self.post_question(user=self.user)
+        start = timezone.make_aware(datetime(2024, 2, 29, 12, 0), dt_timezone.utc)
+        self.session = Session.objects.create(user=self.user, created_at=start, # pylint: disable=no-member
+                                              updated_at=start, last_summarized_at=start)
+
+    def add_events(self, event_type, count, timestamp, **kwargs):
+        content_type = ContentType.objects.get_for_model(self.question)
+        Event.objects.bulk_create([ # pylint: disable=no-member
+            Event(session=self.session, event_type=event_type, timestamp=timestamp,
+                  content_type=content_type, object_id=self.question.id, **kwargs)
+            for _ in range(count)
+        ])
+
+    def test_events_are_counted_once(self):
+        hour = timezone.make_aware(datetime(2024, 2, 29, 12, 0), dt_timezone.utc)
+        self.add_events(Event.EVENT_TYPE_QUESTION_VIEWED, 5, hour + timedelta(minutes=10))
+        self.add_events(Event.EVENT_TYPE_QUESTION_VIEWED, 2, hour + timedelta(minutes=20),
+                        summarized=True) # compiled by the earlier version of the command
+        self.add_events(Event.EVENT_TYPE_UPVOTED, 3, hour + timedelta(hours=1))
+
+        with time_machine.travel('2024-03-01 12:00:00'):
+            call_command('askbot_compile_analytics', batch_size=4)
+            call_command('askbot_compile_analytics', batch_size=4)
+
+        hus = HourlyUserSummary.objects.order_by('hour') # pylint: disable=no-member
+        self.assertEqual([(s.question_views, s.num_upvotes) for s in hus], [(5, 0), (0, 3)])
+        dus = DailyUserSummary.objects.get() # pylint: disable=no-member
+        self.assertEqual((dus.question_views, dus.num_upvotes), (5, 3))
+        self.assertEqual(SummaryWatermark.objects.get(name='events').last_id, # pylint: disable=no-member
+                         Event.objects.order_by('-id')[0].id) # pylint: disable=no-member
+
+        # new events of the compiled hours are not compiled into the daily summaries again
+        self.add_events(Event.EVENT_TYPE_ASKED, 1, timezone.now())
+        with time_machine.travel('2024-03-02 12:00:00'):
+            call_command('askbot_compile_analytics')
+        dus = DailyUserSummary.objects.get(date=dus.date) # pylint: disable=no-member
+        self.assertEqual((dus.question_views, dus.num_upvotes), (5, 3))
+
+    def test_question_views_are_counted_by_segment(self):
+        group = Group.objects.create(name='Engineering', used_for_analytics=True)
+        engineer = self.create_user('engineer')
+        engineer.groups.add(group)
+        engineer_session = Session.objects.create_session(engineer, '127.0.0.1', 'test') # pylint: disable=no-member
+        now = timezone.now()
+        self.add_events(Event.EVENT_TYPE_QUESTION_VIEWED, 2, now)
+        self.session, user_session = engineer_session, self.session
+        self.add_events(Event.EVENT_TYPE_QUESTION_VIEWED, 3, now)
+
+        segments = [{'name': 'Engineering', 'slug': 'eng', 'description': '',
+                     'group_ids': [group.id]}]
+        with override_settings(ASKBOT_ANALYTICS_NAMED_SEGMENTS=segments):
+            call_command('askbot_compile_analytics', batch_size=4)
+            self.session = user_session
+            self.add_events(Event.EVENT_TYPE_QUESTION_VIEWED, 1, now)
+            call_command('askbot_compile_analytics', batch_size=4)
+
+            counts = QuestionViewCount.objects.get_counts_by_segment(self.question) # pylint: disable=no-member
+            self.assertEqual(counts, {'eng': 3, 'rest': 3})
+            self.assertEqual(counts['eng'], Event.objects.get_question_visits_count_by_group_ids( # pylint: disable=no-member
+                                                self.question, [group.id]))
+            self.assertEqual(counts['rest'], Event.objects.get_question_visits_count_by_default_segment( # pylint: disable=no-member
+                                                self.question))
+
+    def test_time_on_site_is_counted_from_last_summary(self):
+        sessions = Session.objects.filter(id=self.session.id) # pylint: disable=no-member
+        sessions.update(updated_at=F('updated_at') + timedelta(minutes=30))
+        call_command('askbot_compile_analytics')
+        sessions.update(updated_at=F('updated_at') + timedelta(minutes=45))
+        call_command('askbot_compile_analytics')
+        hus = HourlyUserSummary.objects.order_by('hour') # pylint: disable=no-member
+        self.assertEqual([s.time_on_site for s in hus],
+                         [timedelta(hours=1), timedelta(minutes=15)])
+
+
+class TestEventBuffer(AskbotTestCase):
+    """Tests the buffered events and the cached sessions"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user('user')
+        self.question = self.post_question(user=self.user)
+        self.request = HttpRequest()
+        self.request.user = self.user
+        Event.objects.all().delete() # pylint: disable=no-member
+        event_buffer.flush()
+
+    def visit_question(self):
+        signals.question_visited.send(None, request=self.request, question=self.question,
+                                      timestamp=timezone.now())
+
+    @override_settings(ASKBOT_ANALYTICS_EVENT_BUFFER_SIZE=3,
+                       ASKBOT_ANALYTICS_EVENT_BUFFER_SECONDS=3600)
+    def test_events_are_saved_in_bulk(self):
+        Session.objects.create_session(self.user, '127.0.0.1', 'test') # pylint: disable=no-member
+        ContentType.objects.get_for_model(self.question) # cached by django
+        with self.assertNumQueries(0):
+            self.visit_question()
+            self.visit_question()
+        # the tests run in a transaction, the full buffer is saved on commit,
+        # with one insert in a savepoint
+        with self.assertNumQueries(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.visit_question()
+        self.assertEqual(Event.objects.count(), 3) # pylint: disable=no-member
+
+        self.visit_question()
+        self.assertEqual(Event.objects.count(), 3) # pylint: disable=no-member
+        self.assertIsNotNone(event_buffer.timer)
+        self.assertEqual(event_buffer.flush(), 1)
+        self.assertIsNone(event_buffer.timer)
+        self.assertEqual(Event.objects.count(), 4) # pylint: disable=no-member
+
+    @override_settings(ASKBOT_ANALYTICS_EVENT_BUFFER_SIZE=2,
+                       ASKBOT_ANALYTICS_EVENT_BUFFER_SECONDS=3600)
+    def test_full_buffer_is_saved_after_commit(self):
+        Session.objects.create_session(self.user, '127.0.0.1', 'test') # pylint: disable=no-member
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                self.visit_question()
+                self.visit_question()
+        self.assertEqual(Event.objects.count(), 0) # pylint: disable=no-member
+        self.assertEqual(callbacks, [event_buffer.flush])
+        callbacks[0]()
+        self.assertEqual(Event.objects.count(), 2) # pylint: disable=no-member
+
+    @override_settings(ASKBOT_ANALYTICS_EVENT_BUFFER_SIZE=3,
+                       ASKBOT_ANALYTICS_EVENT_BUFFER_SECONDS=3600)
+    def test_bad_event_does_not_drop_batch(self):
+        Session.objects.create_session(self.user, '127.0.0.1', 'test') # pylint: disable=no-member
+        self.visit_question()
+        self.visit_question()
+        event_buffer.events[0].event_type = None
+        with transaction.atomic():
+            self.assertEqual(event_buffer.flush(), 1)
+            # the transaction of the caller is usable
+            self.assertEqual(Event.objects.count(), 1) # pylint: disable=no-member
+
+    def test_active_session_is_cached(self):
+        session_id = Session.objects.touch_active_session(self.user, '127.0.0.1', 'test') # pylint: disable=no-member
+        with self.assertNumQueries(0):
+            self.assertEqual(Session.objects.touch_active_session(self.user, '127.0.0.1', 'test'), # pylint: disable=no-member
+                             session_id)
+            self.assertEqual(Session.objects.get_active_session_id(self.user), session_id) # pylint: disable=no-member
+
+        with time_machine.travel(timezone.now() + timedelta(minutes=10)):
+            Session.objects.touch_active_session(self.user, '127.0.0.1', 'test') # pylint: disable=no-member
+        self.assertEqual(Session.objects.count(), 1) # pylint: disable=no-member
+        self.assertGreater(Session.objects.get().updated_at, Session.objects.get().created_at) # pylint: disable=no-member
+
+        with time_machine.travel(timezone.now() + timedelta(hours=2)):
+            self.assertIsNone(Session.objects.get_active_session_id(self.user)) # pylint: disable=no-member
+
+
+class TestActivityRollups(AskbotTestCase):
+    """Tests the event counts from the activity rollups and the analytics pages"""
+
+    def setUp(self):
+        self.admin = self.create_user('admin', status='d')
+        self.group = Group.objects.create(name='Engineering', used_for_analytics=True)
+        self.engineer = self.create_user('engineer')
+        self.engineer.groups.add(self.group)
+        self.user = self.create_user('user')
+        self.question = self.post_question(user=self.user)
+        self.other_question = self.post_question(user=self.user, title='other question')
+        self.segments = [{'name': 'Engineering', 'slug': 'eng', 'description': '',
+                          'group_ids': [self.group.id]}]
+
+    def visit(self, user, question, count):
+        session = Session.objects.create_session(user, '127.0.0.1', 'test') # pylint: disable=no-member
+        Event.objects.bulk_create([ # pylint: disable=no-member
+            Event(session=session, event_type=Event.EVENT_TYPE_QUESTION_VIEWED,
+                  timestamp=timezone.now(), content_object=question)
+            for _ in range(count)
+        ])
+
+    def assert_counts_match_events(self, event_types):
+        today = timezone.now().date()
+        for users_segment in ('all-users', 'eng', 'rest', f'group:{self.group.id}'):
+            for content_segment in ('all-content', f'thread:{self.question.thread_id}'):
+                events = Event.objects.filter(event_type__in=event_types) # pylint: disable=no-member
+                events = filter_events_by_content_segment(events, content_segment)
+                events = filter_events_by_users_segment(events, users_segment)
+                self.assertEqual(get_events_count(events, today, today, event_types,
+                                                  users_segment, content_segment),
+                                 events.count(), (users_segment, content_segment))
+
+    def test_events_are_counted_from_rollups(self):
+        event_types = [Event.EVENT_TYPE_QUESTION_VIEWED]
+        self.visit(self.engineer, self.question, 3)
+        self.visit(self.user, self.question, 2)
+        self.visit(self.user, self.other_question, 1)
+        with override_settings(ASKBOT_ANALYTICS_NAMED_SEGMENTS=self.segments):
+            call_command('askbot_compile_analytics')
+            self.visit(self.engineer, self.question, 1) # not compiled yet
+            self.assert_counts_match_events(event_types)
+
+        today = timezone.now().date()
+        rollups = DailyActivityRollup.objects # pylint: disable=no-member
+        self.assertEqual(rollups.get_events_count(today, today, event_types), 6)
+        self.assertEqual(rollups.get_events_count(today, today, event_types,
+                                                  group_ids=[self.group.id]), 3)
+        self.assertEqual(rollups.get_events_count(today, today, event_types,
+                                                  thread_id=self.question.thread_id), 5)
+
+    def test_analytics_pages_load(self):
+        self.visit(self.engineer, self.question, 3)
+        self.client.force_login(self.admin)
+        with override_settings(ASKBOT_ANALYTICS_NAMED_SEGMENTS=self.segments):
+            call_command('askbot_compile_analytics')
+            for users_segment in ('all-users', 'rest', 'eng'):
+                url = reverse('analytics_users', kwargs={'dates': 'all-time',
+                                                         'users_segment': users_segment})
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+            url = reverse('analytics_activity', kwargs={'activity_segment': 'all-activity',
+                                                        'content_segment': 'all-content',
+                                                        'users_segment': 'eng',
+                                                        'dates': 'all-time'})
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class TestCompactAnalytics(AskbotTestCase):
+    """Tests the deletion of the expired events and sessions"""
+
+    def setUp(self):
+        self.user = self.create_user('user')
+        self.question = self.post_question(user=self.user)
+
+    def add_session(self, timestamp, num_events):
+        session = Session.objects.create(user=self.user, created_at=timestamp, # pylint: disable=no-member
+                                         updated_at=timestamp, last_summarized_at=timestamp)
+        content_type = ContentType.objects.get_for_model(self.question)
+        Event.objects.bulk_create([ # pylint: disable=no-member
+            Event(session=session, event_type=Event.EVENT_TYPE_QUESTION_VIEWED,
+                  timestamp=timestamp, content_type=content_type, object_id=self.question.id)
+            for _ in range(num_events)
+        ])
+        return session
+
+    def test_compiled_expired_events_are_deleted(self):
+        old_time = timezone.make_aware(datetime(2024, 1, 10, 12, 0), dt_timezone.utc)
+        new_time = timezone.make_aware(datetime(2024, 3, 10, 12, 0), dt_timezone.utc)
+        old_session = self.add_session(old_time, 5)
+        new_session = self.add_session(new_time, 2)
+
+        with time_machine.travel('2024-03-11 12:00:00'):
+            call_command('askbot_compile_analytics', silent=True)
+            not_compiled_session = self.add_session(old_time, 3)
+            call_command('askbot_compact_analytics', days=30, batch_size=2, silent=True)
+
+        self.assertEqual(Event.objects.filter(session=old_session).count(), 0) # pylint: disable=no-member
+        self.assertEqual(Event.objects.filter(session=new_session).count(), 2) # pylint: disable=no-member
+        self.assertEqual(Event.objects.filter(session=not_compiled_session).count(), 3) # pylint: disable=no-member
+        session_ids = set(Session.objects.values_list('id', flat=True)) # pylint: disable=no-member
+        self.assertEqual(session_ids, {new_session.id, not_compiled_session.id})
+
+        # the summaries are kept
+        views = HourlyUserSummary.objects.aggregate(views=Sum('question_views'))['views'] # pylint: disable=no-member
+        self.assertEqual(views, 7)
+
+    def test_retention_must_be_set(self):
+        with self.assertRaises(CommandError):
+            call_command('askbot_compact_analytics', silent=True)
+
+    def test_partition_names(self):
+        december = datetime(2024, 12, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(analytics_partitions.get_next_month_start(december),
+                         datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        name = analytics_partitions.get_partition_name(december)
+        self.assertEqual(name, 'askbot_event_y2024m12')
+        self.assertEqual(analytics_partitions.parse_partition_name(name), december)
+        self.assertEqual(analytics_partitions.parse_partition_name('askbot_event_default'), None)
+
+    def test_late_partition_takes_rows_from_default(self):
+        if not analytics_partitions.is_supported():
+            return
+        analytics_partitions.partition_events_table(months_ahead=1)
+        month_start = analytics_partitions.get_last_month_start(3)
+        session = self.add_session(month_start + timedelta(days=1), 2)
+        name = analytics_partitions.create_partition(month_start)
+        self.assertEqual(analytics_partitions.get_max_event_id(name),
+                         Event.objects.filter(session=session).latest('id').id) # pylint: disable=no-member
+        self.assertEqual(Event.objects.filter(session=session).count(), 2) # pylint: disable=no-member
+
+    def test_partitioning_requires_postgresql(self):
+        if analytics_partitions.is_supported():
+            return
+        with self.assertRaises(CommandError):
+            call_command('askbot_partition_analytics_events', silent=True)
@@ -1,6 +1,10 @@
-from askbot.tests.utils import AskbotTestCase
+from datetime import timedelta
+from askbot.tests.utils import AskbotTestCase, with_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 import json
+from askbot.models import Thread
 from askbot.utils.html import site_url
 from askbot.utils.functions import get_epoch_str
 
@@ -69,3 +73,173 @@ class ApiV1Tests(AskbotTestCase):
         last_act_info = response_data['questions'][0]['last_activity_by']
         self.assertEqual(set(last_act_info.keys()), set(['id', 'username']))
         self.assertEqual(set(last_act_info.values()), set([user.id, user.username]))
+
+    def get_questions_query_count(self, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('api_v1_questions'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_api_v1_questions_query_count(self):
+        user = self.create_user('user')
+        editor = self.create_user('editor', status='m')
+        for _ in range(2):
+            question = self.post_question(user=user)
+            self.post_answer(user=editor, question=question)
+        self.get_questions_query_count() # warms the caches
+        query_count = self.get_questions_query_count()
+
+        for _ in range(3):
+            question = self.post_question(user=user)
+            self.post_answer(user=editor, question=question)
+            editor.edit_question(question=question, title='edited title', body_text='edited body',
+                                 revision_comment='edit', tags='edited')
+            editor.close_question(question=question, reason='duplicate')
+        self.assertEqual(self.get_questions_query_count(), query_count)
+
+    def test_api_v1_questions_fields(self):
+        user = self.create_user('user')
+        question = self.post_question(user=user)
+        answer = self.post_answer(user=user, question=question)
+        response = self.client.get(reverse('api_v1_questions'), {'fields': 'title,answer_ids'})
+        data = json.loads(response.content)['questions'][0]
+        self.assertEqual(data, {'id': question.id, 'title': question.thread.title,
+                                'answer_ids': [answer.id]})
+
+        response = self.client.get(reverse('api_v1_question', args=(question.id,)),
+                                   {'fields': 'author'})
+        data = json.loads(response.content)
+        self.assertEqual(data, {'id': question.id,
+                                'author': {'id': user.id, 'username': user.username}})
+
+        response = self.client.get(reverse('api_v1_questions'), {'fields': 'title,body'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_v1_users_fields(self):
+        user = self.create_user('apiuser')
+        response = self.client.get(reverse('api_v1_users'), {'fields': 'username'})
+        data = json.loads(response.content)
+        self.assertEqual(data['users'][0].keys(), {'id', 'username'})
+
+        response = self.client.get(reverse('api_v1_user', args=(user.id,)),
+                                   {'fields': 'reputation,questions'})
+        data = json.loads(response.content)
+        self.assertEqual(data, {'id': user.id, 'reputation': user.reputation, 'questions': 0})
+
+    def get_export_records(self, **params):
+        response = self.client.get(reverse('api_v1_export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_api_v1_export(self):
+        user = self.create_user('user')
+        question = self.post_question(user=user, tags='one two')
+        answer = self.post_answer(user=user, question=question)
+        records = self.get_export_records()
+        types = [record['type'] for record in records]
+        self.assertEqual(types, ['thread', 'post', 'post', 'revision', 'revision',
+                                 'tag', 'tag', 'watermark'])
+        self.assertEqual(records[0]['tags'], ['one', 'two'])
+        self.assertEqual({records[1]['id'], records[2]['id']}, {question.id, answer.id})
+
+        # incremental export
+        watermark = records[-1]['updated_since']
+        self.post_answer(user=self.create_user('other'), question=question,
+                         body_text='second answer')
+        user.delete_answer(answer=answer)
+        records = self.get_export_records(updated_since=watermark, types='posts')
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['text'], 'second answer')
+        self.assertEqual(records[1], {'type': 'post', 'id': answer.id, 'deleted': True})
+
+    def get_exported_posts(self, **params):
+        records = self.get_export_records(**params)
+        return {(record['type'], record['id']) for record in records
+                if record['type'] in ('post', 'revision')}
+
+    def test_api_v1_export_deleted_thread(self):
+        user = self.create_user('user')
+        question = self.post_question(user=user)
+        watermark = self.get_export_records()[-1]['updated_since']
+        answer = self.post_answer(user=self.create_user('other'), question=question)
+        comment = self.post_comment(user=user, parent_post=answer)
+        user.delete_question(question)
+
+        records = self.get_export_records()
+        self.assertEqual([record['type'] for record in records], ['watermark'])
+
+        records = self.get_export_records(updated_since=watermark, types='threads,posts')
+        self.assertIn({'type': 'thread', 'id': question.thread_id, 'deleted': True}, records)
+        exported_ids = {record['id'] for record in records
+                        if record['type'] == 'post' and not record.get('deleted')}
+        self.assertFalse(exported_ids & {answer.id, comment.id})
+
+    def test_api_v1_export_comments_of_deleted_posts(self):
+        user = self.create_user('user')
+        question = self.post_question(user=user)
+        answer = self.post_answer(user=self.create_user('other'), question=question)
+        comment = self.post_comment(user=user, parent_post=answer)
+        answer.author.delete_answer(answer=answer)
+        posts = self.get_exported_posts(types='posts')
+        self.assertIn(('post', question.id), posts)
+        self.assertNotIn(('post', comment.id), posts)
+
+    @with_settings(CONTENT_MODERATION_MODE='premoderation')
+    def test_api_v1_export_unapproved_thread(self):
+        user = self.create_user('user', status='a')
+        question = self.post_question(user=user)
+        answer = self.post_answer(user=self.create_user('other', status='a'), question=question)
+        Thread.objects.filter(id=question.thread_id).update(approved=False)
+        posts = self.get_exported_posts(types='posts,revisions')
+        self.assertNotIn(('post', answer.id), posts)
+        self.assertFalse([item for item in posts if item[0] == 'revision'])
+
+    @with_settings(GROUPS_ENABLED=True)
+    def test_api_v1_export_private_thread(self):
+        user = self.create_user('user')
+        group = self.create_group(group_name='private')
+        group.can_post_questions = True
+        group.can_post_answers = True
+        group.save()
+        user.join_group(group)
+        question = self.post_question(user=user, is_private=True)
+        answer = self.post_answer(user=user, question=question)
+        records = self.get_export_records(types='threads,posts')
+        self.assertNotIn(question.thread_id, [record['id'] for record in records
+                                              if record['type'] == 'thread'])
+        self.assertNotIn(('post', answer.id), self.get_exported_posts(types='posts'))
+
+    def test_api_v1_export_errors(self):
+        response = self.client.get(reverse('api_v1_export'), {'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('api_v1_export'), {'types': 'posts,users'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_v1_questions_not_modified(self):
+        user = self.create_user('user')
+        question = self.post_question(user=user)
+        url = reverse('api_v1_questions')
+        response = self.client.get(url)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, {'fields': 'title'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        question_url = reverse('api_v1_question', args=(question.id,))
+        question_etag = self.client.get(question_url)['ETag']
+        response = self.client.get(question_url, HTTP_IF_NONE_MATCH=question_etag)
+        self.assertEqual(response.status_code, 304)
+
+        timestamp = question.thread.last_activity_at + timedelta(minutes=1)
+        self.post_answer(user=user, question=question, timestamp=timestamp)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(question_url, HTTP_IF_NONE_MATCH=question_etag)
+        self.assertEqual(response.status_code, 200)
@@ -1,12 +1,20 @@
 import datetime
+from io import StringIO
+from unittest.mock import patch
+from django.core import management
 from django.conf import settings as django_settings
 from django.urls import reverse
+from django.db import transaction
+from django.test import TransactionTestCase
 from django.test.client import Client
+from django.test.utils import override_settings
 from django.utils import timezone
-from askbot.tests.utils import AskbotTestCase
+from askbot.tests.utils import AskbotTestCase, create_user, with_settings
 from askbot.conf import settings
+from askbot import const
 from askbot import models
 from askbot.models import badges
+from askbot.tasks import award_badges_celery_task
 
 
 class BadgeTests(AskbotTestCase):
@@ -541,3 +549,134 @@ class BadgeTests(AskbotTestCase):
         expired = badges.RapidResponder.expire(award)
         self.assertTrue(expired)
         self.assert_have_badge(badges.RapidResponder.key, self.u2, expected_count=0)
+
+
+class QueuedBadgeEvaluationTests(AskbotTestCase):
+
+    def setUp(self):
+        self.u1 = self.create_user(username='user1')
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_events_are_batched_after_commit(self):
+        self.u1.real_name = 'blah'
+        self.u1.website = 'cnn.com'
+        self.u1.location = 'irvine'
+        self.u1.save()
+        self.u1.update_localized_profile(about='blabla bla')
+
+        task_path = 'askbot.tasks.award_badges_celery_task.apply_async'
+        with patch(task_path) as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(3):
+                    badges.award_badges_signal.send(None,
+                                                    event='update_user_profile',
+                                                    actor=self.u1,
+                                                    context_object=self.u1)
+                # nothing is awarded within the transaction
+                self.assertEqual(self.u1.badges.count(), 0)
+
+        # duplicate events were merged into one
+        self.assertEqual(apply_async.call_count, 1)
+        events = apply_async.call_args[1]['kwargs']['events']
+        self.assertEqual(len(events), 1)
+
+        award_badges_celery_task(events)
+        award_badges_celery_task(events)
+        awards = models.Award.objects.filter(user=self.u1,
+                                             badge__slug='autobiographer')
+        self.assertEqual(awards.count(), 1)
+        badge_data = models.BadgeData.objects.get(slug='autobiographer')
+        self.assertEqual(badge_data.awarded_count, 1)
+
+
+class AwardBadgesCommandTests(AskbotTestCase):
+
+    def setUp(self):
+        self.u1 = self.create_user(username='user1')
+        self.u2 = self.create_user(username='user2')
+
+    def test_award_badges_command(self):
+        settings.update('NICE_QUESTION_BADGE_MIN_UPVOTES', 2)
+        question = self.post_question(user=self.u1)
+        models.Post.objects.filter(id=question.id).update(points=2)
+        self.post_question(user=self.u2)
+
+        out = StringIO()
+        management.call_command('askbot_award_badges', dry_run=True, stdout=out)
+        self.assertIn('nice-question: 1 new awards', out.getvalue())
+        self.assertEqual(models.Award.objects.count(), 0)
+
+        management.call_command('askbot_award_badges', stdout=StringIO())
+        award = models.Award.objects.get(badge__slug='nice-question')
+        self.assertEqual(award.user, self.u1)
+        self.assertEqual(award.content_object, question)
+        self.assertEqual(models.BadgeData.objects.get(slug='nice-question').awarded_count, 1)
+        # student badge is awarded for the same question
+        self.assertEqual(self.u1.badges.filter(slug='student').count(), 1)
+        user = models.User.objects.get(id=self.u1.id)
+        self.assertEqual(user.bronze, 2)
+
+        # nothing is awarded twice
+        management.call_command('askbot_award_badges', stdout=StringIO())
+        self.assertEqual(models.Award.objects.filter(user=self.u1).count(), 2)
+        self.assertEqual(models.Award.objects.filter(user=self.u2).count(), 0)
+
+
+    @with_settings(BADGES_MODE='public')
+    def test_award_badges_command_records_activity(self):
+        settings.update('NICE_QUESTION_BADGE_MIN_UPVOTES', 2)
+        question = self.post_question(user=self.u1)
+        models.Post.objects.filter(id=question.id).update(points=2)
+        self.u1.get_and_delete_messages()
+
+        management.call_command('askbot_award_badges', badge_keys=['nice-question'],
+                                stdout=StringIO())
+        award = models.Award.objects.get(badge__slug='nice-question')
+        activity = models.Activity.objects.get(activity_type=const.TYPE_ACTIVITY_PRIZE)
+        self.assertEqual(activity.content_object, award)
+        self.assertEqual(activity.user, self.u1)
+        self.assertEqual(list(activity.recipients.all()), [self.u1])
+        messages = self.u1.get_and_delete_messages()
+        self.assertEqual(len(messages), 1)
+        self.assertIn(self.u1.get_profile_url(), messages[0])
+
+    def test_award_badges_command_unknown_badge(self):
+        with self.assertRaises(management.CommandError) as error:
+            management.call_command('askbot_award_badges', badge_keys=['no-such-badge'],
+                                    stdout=StringIO())
+        self.assertIn('nice-question', str(error.exception))
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+class BadgeEventQueueTransactionTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = create_user(username='user1')
+        badges.badge_event_queue.reset()
+
+    def send_event(self, event='update_user_profile'):
+        badges.award_badges_signal.send(None, event=event, actor=self.user,
+                                        context_object=self.user)
+
+    @patch('askbot.tasks.award_badges_celery_task.apply_async')
+    def test_events_are_sent_at_once_in_autocommit_mode(self, apply_async):
+        self.send_event()
+        self.send_event()
+        self.assertEqual(apply_async.call_count, 2)
+        events = apply_async.call_args[1]['kwargs']['events']
+        self.assertEqual([event[0] for event in events], ['update_user_profile'])
+
+    @patch('askbot.tasks.award_badges_celery_task.apply_async')
+    def test_events_after_rolled_back_savepoint_are_sent(self, apply_async):
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    self.send_event()
+                    raise ValueError
+            except ValueError:
+                pass
+            self.send_event(event='view_question')
+            self.assertEqual(apply_async.call_count, 0)
+
+        self.assertEqual(apply_async.call_count, 1)
+        events = apply_async.call_args[1]['kwargs']['events']
+        self.assertIn('view_question', [event[0] for event in events])
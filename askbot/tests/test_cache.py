@@ -1,7 +1,13 @@
+import time
+from unittest.mock import patch
+from django.core.cache import cache
 from django.db import connection
+from django.test import TestCase
+from django.test.utils import override_settings
 from django.urls import reverse
 from django.conf import settings
 from askbot.tests.utils import AskbotTestCase
+from askbot.utils import cache as cache_utils
 
 
 class CacheTests(AskbotTestCase):
@@ -27,3 +33,282 @@ class CacheTests(AskbotTestCase):
         self.assertTrue(before_count > after_count,
                 ('Expected fewer queries after calling visit_question. ' +
                  'Before visit: %d. After visit: %d.') % (before_count, after_count))
+
+
+class GetOrSetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value=0):
+        self.calls += 1
+        return value
+
+    def test_falsy_values_are_cached(self):
+        for _ in range(3):
+            self.assertEqual(cache_utils.get_or_set('key', self.compute), 0)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_is_served_while_locked(self):
+        cache_utils.get_or_set('key', lambda: self.compute(1), timeout=10)
+        with patch('askbot.utils.cache.time.time', return_value=time.time() + 20):
+            # another process is recalculating the value
+            cache.add('key:lock', 1)
+            value = cache_utils.get_or_set('key', lambda: self.compute(2), timeout=10)
+            self.assertEqual(value, 1)
+            cache.delete('key:lock')
+            value = cache_utils.get_or_set('key', lambda: self.compute(2), timeout=10)
+            self.assertEqual(value, 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_default_timeout_none_never_expires(self):
+        with patch.object(cache, 'default_timeout', None):
+            self.assertIsNone(cache_utils.get_timeout(None))
+            cache_utils.get_or_set('key', lambda: self.compute(1))
+            with patch('askbot.utils.cache.time.time', return_value=time.time() + 10 ** 9):
+                value = cache_utils.get_or_set('key', lambda: self.compute(2))
+        self.assertEqual(value, 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_namespace_invalidation(self):
+        cache_utils.get_or_set('a', lambda: self.compute(1), namespace='ns')
+        cache_utils.get_or_set('b', lambda: self.compute(1), namespace='ns')
+        cache_utils.invalidate_namespace('ns')
+        self.assertEqual(cache_utils.get_or_set('a', lambda: self.compute(2), namespace='ns'), 2)
+        self.assertEqual(cache_utils.get_or_set('b', lambda: self.compute(2), namespace='ns'), 2)
+        self.assertEqual(self.calls, 4)
+
+    def test_memoize(self):
+        @cache_utils.memoize
+        def get_list(value):
+            self.calls += 1
+            return [] if value else None
+
+        self.assertEqual(get_list(1), [])
+        self.assertEqual(get_list(1), [])
+        self.assertIsNone(get_list(0))
+        self.assertEqual(self.calls, 2)
+        cache_utils.delete_memoized(get_list, 1)
+        get_list(1)
+        self.assertEqual(self.calls, 3)
+
+
+@override_settings(ASKBOT_LOCAL_CACHE_FAMILIES={'test': 60})
+class LocalCacheFamilyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.family = cache_utils.LocalCacheFamily('test')
+        self.addCleanup(cache_utils.LocalCacheFamily.families.remove, self.family)
+
+    def test_values_are_read_locally(self):
+        self.family.set('key', ['value'])
+        self.family.get('key')
+        with patch.object(cache, 'get') as cache_get:
+            value = self.family.get('key')
+            self.assertEqual(value, ['value'])
+            value.append('changed')
+            self.assertEqual(self.family.get('key'), ['value'])
+            self.assertEqual(cache_get.call_count, 0)
+
+    def test_write_by_other_process_is_seen_on_next_request(self):
+        self.family.set('key', 'old')
+        self.family.set('other-key', 'other')
+        self.assertEqual(self.family.get('key'), 'old')
+        # another process writes the value
+        other_process = cache_utils.LocalCacheFamily('test')
+        self.addCleanup(cache_utils.LocalCacheFamily.families.remove, other_process)
+        other_process.set('key', 'new')
+        self.assertEqual(self.family.get('key'), 'old')
+        cache_utils.expire_local_caches() # called on request_started
+        self.assertEqual(self.family.get('key'), 'new')
+        self.assertEqual(self.family.get('other-key'), 'other')
+
+        # entries of the other keys stay in the local cache
+        other_process.set('key', 'newer')
+        cache_utils.expire_local_caches()
+        with patch.object(cache, 'get_many', wraps=cache.get_many) as cache_get_many, \
+                patch.object(cache, 'get', wraps=cache.get) as cache_get:
+            self.assertEqual(self.family.get('other-key'), 'other')
+            self.assertEqual(cache_get_many.call_count, 1)
+            read_keys = [call.args[0] for call in cache_get.call_args_list]
+            self.assertNotIn('other-key', read_keys)
+        self.assertEqual(self.family.get('key'), 'newer')
+
+    def test_unknown_changes_drop_local_entries(self):
+        self.family.set('key', 'old')
+        self.assertEqual(self.family.get('key'), 'old')
+        cache.set('key', 'new')
+        cache.delete(self.family.get_generation_key())
+        cache_utils.expire_local_caches()
+        self.assertEqual(self.family.get('key'), 'new')
+
+    @override_settings(ASKBOT_LOCAL_CACHE_FAMILIES={})
+    def test_disabled_family_uses_django_cache(self):
+        self.family.set('key', 'old')
+        cache.set('key', 'new')
+        self.assertEqual(self.family.get('key'), 'new')
+
+
+INSTRUMENTED_CACHES = dict(settings.CACHES, stats={
+    'BACKEND': 'askbot.utils.cache_stats.InstrumentedCache',
+    'LOCATION': 'askbot-cache-stats-tests',
+    'OPTIONS': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+})
+
+
+@override_settings(CACHES=INSTRUMENTED_CACHES, ASKBOT_CACHE_STATS_FLUSH_INTERVAL=3600)
+class CacheStatsTests(AskbotTestCase):
+
+    def setUp(self):
+        from django.core.cache import caches
+        from askbot.utils.cache_stats import stats
+        self.cache = caches['stats']
+        self.cache.clear()
+        self.stats = stats
+        self.stats.reset()
+
+    def test_classify_key(self):
+        from askbot.utils.cache_stats import classify_key
+        self.assertEqual(classify_key('thread-question-summary-1-en'), 'thread-summary')
+        self.assertEqual(classify_key('thread-5:abc:thread-data-5-latest'), 'thread-data')
+        self.assertEqual(classify_key('askbot-settings-en'), 'settings')
+        self.assertEqual(classify_key('localized-askbot-profile-3-en'), 'profiles')
+        self.assertEqual(classify_key('views.decorators.cache.cache_page.x'), 'page')
+        self.assertEqual(classify_key('something-else'), 'other')
+        with override_settings(ASKBOT_CACHE_KEY_FAMILIES=[('custom', r'something-')]):
+            self.assertEqual(classify_key('something-else'), 'custom')
+
+    def test_totals(self):
+        self.cache.set('askbot-profile-1', 'x' * 100)
+        self.cache.get('askbot-profile-1')
+        self.cache.get('askbot-profile-2')
+        self.cache.get_many(['askbot-settings-en', 'askbot-profile-1'])
+        self.cache.delete('askbot-profile-1')
+
+        totals = self.stats.get_totals()
+        profiles = totals['profiles']
+        self.assertEqual(profiles['hits'], 2)
+        self.assertEqual(profiles['misses'], 1)
+        self.assertEqual(profiles['hit_rate'], 0.667)
+        self.assertEqual(profiles['sets'], 1)
+        self.assertEqual(profiles['deletes'], 1)
+        self.assertTrue(profiles['avg_set_bytes'] > 100)
+        self.assertEqual(totals['settings']['misses'], 1)
+
+        #the totals are accumulated in the cache
+        self.cache.get('askbot-settings-en')
+        self.assertEqual(self.stats.get_totals()['settings']['misses'], 2)
+
+        self.stats.reset()
+        self.assertEqual(self.stats.get_totals(), {})
+
+    def test_request_summary(self):
+        self.stats.start_request()
+        self.cache.get('askbot-settings-en')
+        summary = self.stats.end_request()
+        self.assertEqual(list(summary.keys()), ['settings'])
+        self.assertEqual(summary['settings']['misses'], 1)
+
+    def test_command(self):
+        from io import StringIO
+        import json
+        from django.core import management
+        self.cache.get('askbot-settings-en')
+        out = StringIO()
+        management.call_command('askbot_cache_stats', json=True, stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['settings']['misses'], 1)
+
+    def test_view_is_admin_only(self):
+        url = reverse('cache_stats')
+        admin = self.create_user('admin', status='d')
+        self.client.force_login(self.create_user('user'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(admin)
+        self.cache.get('askbot-settings-en')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['families']['settings']['misses'], 1)
+
+
+@override_settings(CACHE_MIDDLEWARE_SECONDS=60, CACHE_MIDDLEWARE_STALE_SECONDS=60,
+                   CACHE_MIDDLEWARE_KEY_PREFIX='page-cache-tests')
+class PageCacheMiddlewareTests(TestCase):
+
+    def setUp(self):
+        from django.test import RequestFactory
+        from askbot.middleware.cache import CacheMiddleware
+        cache.clear()
+        self.renders = 0
+
+        def view(request):
+            from django.http import HttpResponse
+            self.renders += 1
+            response = HttpResponse('page %d' % self.renders)
+            return cache_utils.add_surrogate_tags(response, ['thread-1', 'tag-python'])
+
+        self.middleware = CacheMiddleware(view)
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        return self.middleware(self.factory.get('/questions/', **headers))
+
+    def test_cached_page_and_conditional_get(self):
+        response = self.get()
+        self.assertEqual(response.content, b'page 1')
+        self.assertEqual(response['Surrogate-Key'], 'tag-python thread-1')
+        etag = response['ETag']
+
+        self.assertEqual(self.get().content, b'page 1')
+        self.assertEqual(self.renders, 1)
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.renders, 1)
+
+    def test_purged_tag_drops_page(self):
+        self.get()
+        cache_utils.purge_surrogate_tags(['tag-other'])
+        self.assertEqual(self.get().content, b'page 1')
+        cache_utils.purge_surrogate_tags(['thread-1'])
+        self.assertEqual(self.get().content, b'page 2')
+
+    def test_stale_page_is_rendered_by_one_request(self):
+        self.get()
+        with patch('askbot.middleware.cache.time.time', return_value=time.time() + 90):
+            #another worker holds the lock - the stale page is served
+            with patch.object(cache, 'add', return_value=False):
+                self.assertEqual(self.get().content, b'page 1')
+            self.assertEqual(self.get().content, b'page 2')
+        self.assertEqual(self.get().content, b'page 2')
+
+
+class ThreadSurrogateTagTests(AskbotTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user()
+        self.question = self.post_question(user=self.user)
+        self.thread = self.question.thread
+
+    def get_versions(self):
+        tags = [self.thread.get_cache_namespace(), cache_utils.QUESTIONS_SURROGATE_TAG]
+        return cache_utils.get_surrogate_tag_versions(tags, create=True)
+
+    def test_vote_keeps_question_lists(self):
+        versions = self.get_versions()
+        self.create_user('voter', reputation=10000).upvote(self.question)
+        new_versions = self.get_versions()
+        self.assertNotEqual(new_versions[self.thread.get_cache_namespace()],
+                            versions[self.thread.get_cache_namespace()])
+        self.assertEqual(new_versions[cache_utils.QUESTIONS_SURROGATE_TAG],
+                         versions[cache_utils.QUESTIONS_SURROGATE_TAG])
+
+    def test_edit_purges_question_lists(self):
+        versions = self.get_versions()
+        self.edit_question(user=self.user, question=self.question, title='edited title')
+        new_versions = self.get_versions()
+        self.assertNotEqual(new_versions[cache_utils.QUESTIONS_SURROGATE_TAG],
+                            versions[cache_utils.QUESTIONS_SURROGATE_TAG])
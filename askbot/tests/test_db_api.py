@@ -5,6 +5,7 @@ e.g. ``some_user.do_something(...)``
 """
 from bs4 import BeautifulSoup
 from django.core import exceptions
+from django.core.cache import cache
 from django.urls import reverse
 from django.test.client import Client
 from django.conf import settings
@@ -423,6 +424,58 @@ class CommentTests(AskbotTestCase):
         comment = models.Post.objects.get_comments().get(id = self.comment.id)
         self.assertEqual(comment.points, 0)
 
+class VoteCounterTests(AskbotTestCase):
+
+    def setUp(self):
+        # daily upvote reputation counters live in the cache
+        cache.clear()
+        self.create_user()
+        self.question = self.post_question()
+        self.voters = [self.create_user('voter%d' % idx, reputation=1000) for idx in range(3)]
+
+    def test_votes_on_stale_post_instances_are_not_lost(self):
+        stale_copies = [models.Post.objects.get(id=self.question.id) for _ in self.voters]
+        for voter, post in zip(self.voters, stale_copies):
+            voter.upvote(post)
+        self.voters[0].upvote(stale_copies[0], cancel=True)
+        question = models.Post.objects.get(id=self.question.id)
+        self.assertEqual(question.vote_up_count, 2)
+        self.assertEqual(question.points, 2)
+        self.assertEqual(question.thread.points, 2)
+
+    @with_settings(REP_GAIN_FOR_RECEIVING_UPVOTE=10, MAX_REP_GAIN_PER_USER_PER_DAY=20)
+    def test_daily_upvote_reputation_limit(self):
+        start_rep = self.user.reputation
+        for voter in self.voters:
+            voter.upvote(self.question)
+        user = models.User.objects.get(id=self.user.id)
+        self.assertEqual(user.reputation, start_rep + 20)
+        self.assertEqual(models.Repute.objects.get_reputation_by_upvoted_today(user), 20)
+        # canceled upvote brings the daily gain back under the limit
+        self.voters[0].upvote(self.question, cancel=True)
+        self.create_user('voter3', reputation=1000).upvote(self.question)
+        self.assertEqual(models.Repute.objects.get_reputation_by_upvoted_today(user), 20)
+
+    @with_settings(REP_GAIN_FOR_RECEIVING_UPVOTE=10, MAX_REP_GAIN_PER_USER_PER_DAY=10)
+    def test_canceled_upvote_over_daily_limit(self):
+        start_rep = self.user.reputation
+        for voter in self.voters:
+            voter.upvote(self.question)
+        # the second upvote was over the limit, its cancel takes nothing back
+        self.voters[1].upvote(self.question, cancel=True)
+        user = models.User.objects.get(id=self.user.id)
+        self.assertEqual(user.reputation, start_rep + 10)
+        self.assertEqual(models.Repute.objects.get_reputation_by_upvoted_today(user), 10)
+        # and does not open room under the limit
+        self.voters[1].upvote(self.question)
+        user = models.User.objects.get(id=self.user.id)
+        self.assertEqual(user.reputation, start_rep + 10)
+        # the awarded upvote is taken back
+        self.voters[0].upvote(self.question, cancel=True)
+        user = models.User.objects.get(id=self.user.id)
+        self.assertEqual(user.reputation, start_rep)
+
+
 class GroupTests(AskbotTestCase):
     def setUp(self):
         self.u1 = self.create_user('u1')
@@ -0,0 +1,71 @@
+import datetime
+import json
+from io import StringIO
+from unittest.mock import patch
+from django.core import mail, management
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from askbot.mail import send_mail
+from askbot.models import QueuedEmail
+
+
+@override_settings(ASKBOT_EMAIL_OUTBOX_ENABLED=True)
+class EmailOutboxTests(TestCase):
+
+    def queue_message(self, subject='hello'):
+        send_mail(subject_line=subject,
+                  body_text='<p>some text</p>',
+                  from_email='admin@example.com',
+                  recipient_list=['user@example.com'])
+
+    def test_send_mail_queues_message(self):
+        self.queue_message()
+        self.assertEqual(len(mail.outbox), 0)
+        message = QueuedEmail.objects.get()
+        self.assertEqual(message.status, QueuedEmail.STATUS_PENDING)
+        self.assertEqual(message.recipient_list, ['user@example.com'])
+
+    def test_drain_sends_messages(self):
+        self.queue_message('one')
+        self.queue_message('two')
+        management.call_command('drain_email_outbox', rate=0)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(set(msg.subject for msg in mail.outbox), {'one', 'two'})
+        self.assertEqual(QueuedEmail.objects.pending().count(), 0)
+        self.assertEqual(
+            QueuedEmail.objects.filter(status=QueuedEmail.STATUS_SENT).count(), 2
+        )
+
+    @override_settings(ASKBOT_EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+                       ASKBOT_EMAIL_OUTBOX_RETRY_DELAY_SECONDS=60)
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.queue_message()
+        with patch('django.core.mail.EmailMessage.send', side_effect=IOError('down')):
+            management.call_command('drain_email_outbox', rate=0)
+
+        message = QueuedEmail.objects.get()
+        self.assertEqual(message.status, QueuedEmail.STATUS_PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.last_error, 'down')
+        self.assertTrue(message.next_attempt_at > timezone.now() + datetime.timedelta(seconds=50))
+
+        # not due yet - nothing is sent
+        management.call_command('drain_email_outbox', rate=0)
+        self.assertEqual(len(mail.outbox), 0)
+
+        QueuedEmail.objects.update(next_attempt_at=timezone.now())
+        with patch('django.core.mail.EmailMessage.send', side_effect=IOError('down')):
+            management.call_command('drain_email_outbox', rate=0)
+        message = QueuedEmail.objects.get()
+        self.assertEqual(message.status, QueuedEmail.STATUS_FAILED)
+        self.assertEqual(message.attempts, 2)
+
+    def test_stats(self):
+        self.queue_message()
+        out = StringIO()
+        management.call_command('drain_email_outbox', stats=True, stdout=out)
+        stats = json.loads(out.getvalue())
+        self.assertEqual(stats['pending'], 1)
+        self.assertEqual(stats['due'], 1)
+        self.assertEqual(stats['failed'], 0)
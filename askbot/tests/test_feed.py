@@ -0,0 +1,108 @@
+"""Tests for the cached, conditional rss feeds."""
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from askbot.feed import RssLastestQuestionsFeed
+from askbot.tests.utils import AskbotTestCase, with_settings
+
+
+class FeedTests(AskbotTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user()
+        self.question = self.post_question(user=self.user, title='first feed question',
+                                           tags='one two')
+
+    def test_latest_questions_feed_is_cached(self):
+        url = reverse('latest_questions_feed')
+        render_feed = RssLastestQuestionsFeed.render_feed
+        with patch.object(RssLastestQuestionsFeed, 'render_feed', autospec=True,
+                          side_effect=render_feed) as render:
+            response = self.client.get(url, {'tags': ['one', 'two']})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('first feed question', response.content.decode('utf-8'))
+            # same normalized query
+            self.client.get(url, {'tags': ['two', 'one', 'two']})
+            self.assertEqual(render.call_count, 1)
+
+            self.client.get(url, {'tags': ['one']})
+            self.assertEqual(render.call_count, 2)
+
+            self.post_question(user=self.user, title='second feed question', tags='one two')
+            response = self.client.get(url, {'tags': ['one', 'two']})
+            self.assertEqual(render.call_count, 3)
+        self.assertIn('second feed question', response.content.decode('utf-8'))
+
+    def test_latest_questions_feed_not_modified(self):
+        url = reverse('latest_questions_feed')
+        response = self.client.get(url)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.post_question(user=self.user, title='second feed question')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_question_feed_is_invalidated_by_answer(self):
+        url = reverse('individual_question_feed', kwargs={'pk': self.question.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.post_answer(user=self.create_user('answerer'), question=self.question,
+                         body_text='answer in the feed')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('answer in the feed', response.content.decode('utf-8'))
+
+    def test_question_feed_missing_question(self):
+        url = reverse('individual_question_feed', kwargs={'pk': self.question.id + 100})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(ASKBOT_FEED_CACHE_TIMEOUT=0)
+    def test_question_feed_queries_do_not_depend_on_answers(self):
+        url = reverse('individual_question_feed', kwargs={'pk': self.question.id})
+        answer = self.post_answer(user=self.create_user('answerer1'), question=self.question)
+        self.post_comment(user=self.user, parent_post=answer)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        num_queries = len(queries)
+
+        for number in range(2, 5):
+            answer = self.post_answer(user=self.create_user(f'answerer{number}'),
+                                      question=self.question)
+            self.post_comment(user=self.user, parent_post=answer)
+        self.post_comment(user=self.user, parent_post=self.question)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.content.decode('utf-8').count('<item>'), 10)
+        self.assertEqual(len(queries), num_queries)
+
+    @with_settings(GROUPS_ENABLED=True)
+    def test_question_feed_skips_private_answers(self):
+        answerer = self.create_user('answerer')
+        group = self.create_group(group_name='private')
+        group.can_post_answers = True
+        group.save()
+        answerer.join_group(group)
+        other = self.create_user('other')
+        other.join_group(group)
+        self.post_answer(user=answerer, question=self.question,
+                         body_text='private answer text', is_private=True)
+        self.post_answer(user=other, question=self.question, body_text='public answer text')
+
+        url = reverse('individual_question_feed', kwargs={'pk': self.question.id})
+        content = self.client.get(url).content.decode('utf-8')
+        self.assertIn('public answer text', content)
+        self.assertNotIn('private answer text', content)
@@ -389,4 +389,16 @@ class ManagementCommandTests(AskbotTestCase):
         self.assertEqual(AuthGroup.objects.filter(name='Org1').count(), 1)
         self.assertEqual(AuthGroup.objects.filter(name='Org2').count(), 1)
 
-
+    def test_askbot_export_content(self):
+        user = self.create_user('user')
+        question = self.post_question(user=user)
+        out = io.StringIO()
+        management.call_command('askbot_export_content', types='posts', stdout=out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([record['type'] for record in records], ['post', 'watermark'])
+        self.assertEqual(records[0]['id'], question.id)
+
+        out = io.StringIO()
+        management.call_command('askbot_export_content', types='posts', stdout=out,
+                                updated_since=records[-1]['updated_since'])
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from django.core import management
+from django.test import TestCase, override_settings
+from askbot.spam_checker import naive_bayes_spam_checker
+from askbot.spam_checker.naive_bayes_spam_checker import NaiveBayesModel, get_features
+
+SPAM = [
+    'buy cheap pills online, best price pharmacy',
+    'cheap replica watches, buy now with discount',
+    'best casino bonus, win money online now',
+    'discount pharmacy pills without prescription, buy cheap',
+]
+HAM = [
+    'how do I configure the database connection in django settings',
+    'the migration fails with an integrity error on the user table',
+    'you can override the template in the skins directory',
+    'which python version is required to run the tests',
+]
+
+
+class NaiveBayesModelTests(TestCase):
+
+    def get_model(self):
+        model = NaiveBayesModel(buckets=2 ** 16)
+        model.train(SPAM, 'spam')
+        model.train(HAM, 'ham')
+        return model
+
+    def test_features_include_bigrams(self):
+        #cheap, pills, cheap pills, pills cheap
+        self.assertEqual(len(get_features('Cheap pills, cheap pills', 2, 2 ** 16)), 4)
+
+    def test_classification(self):
+        model = self.get_model()
+        self.assertGreater(model.get_spam_probability('buy cheap pills now'), 0.9)
+        self.assertLess(model.get_spam_probability('django database migration error'), 0.1)
+
+    def test_untrained_model_is_undecided(self):
+        self.assertEqual(NaiveBayesModel().get_spam_probability('cheap pills'), 0.5)
+
+    def test_serialization(self):
+        model = self.get_model()
+        copy = NaiveBayesModel.from_dict(json.loads(json.dumps(model.to_dict())))
+        text = 'cheap django pills'
+        self.assertEqual(copy.get_spam_probability(text), model.get_spam_probability(text))
+
+
+class TrainSpamClassifierTests(TestCase):
+
+    def setUp(self):
+        self.dir_name = tempfile.mkdtemp()
+        self.training_set = os.path.join(self.dir_name, 'spam-ham.json')
+        self.model_file = os.path.join(self.dir_name, 'spam-model.json')
+        with open(self.training_set, 'w', encoding='utf-8') as training_file:
+            json.dump({'spam': SPAM, 'ham': HAM}, training_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_name)
+
+    def test_trained_model_is_used_by_is_spam(self):
+        with override_settings(ASKBOT_SPAM_CLASSIFIER_MODEL_FILE=self.model_file):
+            management.call_command('askbot_train_spam_classifier', self.training_set,
+                                    test_fraction=0.25, stdout=StringIO())
+            self.assertTrue(naive_bayes_spam_checker.is_spam('cheap pills online'))
+            self.assertFalse(naive_bayes_spam_checker.is_spam('the django settings file'))
+
+    def test_evaluation_uses_threshold(self):
+        with override_settings(ASKBOT_SPAM_CLASSIFIER_MODEL_FILE=self.model_file,
+                               ASKBOT_SPAM_CLASSIFIER_THRESHOLD=1.0):
+            out = StringIO()
+            management.call_command('askbot_train_spam_classifier', self.training_set,
+                                    test_fraction=0.25, stdout=out)
+            self.assertIn('at threshold 1.0: 0 of 1 spam detected', out.getvalue())
+            out = StringIO()
+            management.call_command('askbot_train_spam_classifier', self.training_set,
+                                    test_fraction=0.25, threshold=0.0, stdout=out)
+            self.assertIn('1 of 1 ham misclassified', out.getvalue())
+
+    @override_settings(ASKBOT_SPAM_CLASSIFIER_MODEL_FILE='/nonexistent/spam-model.json')
+    def test_missing_model_is_not_spam(self):
+        with self.assertLogs(level='CRITICAL'):
+            self.assertFalse(naive_bayes_spam_checker.is_spam('cheap pills online'))
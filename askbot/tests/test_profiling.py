@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core import management
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+from askbot.middleware.profiling import ProfilingMiddleware
+from askbot.utils.profiling import get_fingerprint
+
+
+class FingerprintTests(TestCase):
+
+    def test_literals_are_replaced(self):
+        self.assertEqual(
+            get_fingerprint("SELECT * FROM t WHERE id = 15 AND name = 'it''s'"),
+            'SELECT * FROM t WHERE id = ? AND name = ?'
+        )
+
+    def test_in_lists_are_collapsed(self):
+        self.assertEqual(get_fingerprint('SELECT a FROM t WHERE id IN (%s, %s, %s)'),
+                         get_fingerprint('SELECT a FROM t WHERE id IN (%s)'))
+
+
+@override_settings(ASKBOT_PROFILING_SAMPLE_RATE=1.0,
+                   ASKBOT_PROFILING_SLOW_REQUEST_MS=10000,
+                   ASKBOT_PROFILING_MAX_QUERIES=100,
+                   ASKBOT_PROFILING_MAX_DUPLICATE_QUERIES=3)
+class ProfilingMiddlewareTests(TestCase):
+
+    def get_response(self, num_queries):
+        def view(request):
+            for user_id in range(num_queries):
+                User.objects.filter(id=user_id).exists()
+            return HttpResponse('ok')
+        return ProfilingMiddleware(view)(RequestFactory().get('/questions/'))
+
+    def test_repeated_queries_are_logged(self):
+        with self.assertLogs('askbot.profiling', level='WARNING') as logs:
+            self.get_response(4)
+        summary = json.loads(logs.records[0].getMessage())
+        self.assertEqual(summary['path'], '/questions/')
+        self.assertEqual(summary['queries'], 4)
+        self.assertEqual(summary['duplicate_queries'][0]['count'], 4)
+        self.assertTrue('template_ms' in summary)
+        self.assertTrue('cache_calls' in summary)
+
+    def test_fast_request_is_not_logged(self):
+        with self.assertNoLogs('askbot.profiling', level='WARNING'):
+            self.get_response(1)
+
+
+class ProfilingReportTests(TestCase):
+
+    def test_report(self):
+        entries = [
+            {'view': 'questions', 'duration_ms': 1500, 'queries': 10, 'sql_ms': 100,
+             'duplicate_queries': [], 'template_ms': 200, 'cache_calls': 5},
+            {'view': 'question', 'duration_ms': 900, 'queries': 250, 'sql_ms': 600,
+             'duplicate_queries': [{'fingerprint': 'SELECT ?', 'count': 200}],
+             'template_ms': 100, 'cache_calls': 5},
+            {'view': 'question', 'duration_ms': 1100, 'queries': 150, 'sql_ms': 400,
+             'duplicate_queries': [], 'template_ms': 100, 'cache_calls': 5},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.log', delete=False) as log_file:
+            log_file.write('not json\n')
+            for entry in entries:
+                log_file.write('WARNING askbot.profiling ' + json.dumps(entry) + '\n')
+        try:
+            out = StringIO()
+            management.call_command('askbot_profiling_report', log_file.name,
+                                    json=True, sort='avg_queries', stdout=out)
+        finally:
+            os.unlink(log_file.name)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual([item['view'] for item in report], ['question', 'questions'])
+        self.assertEqual(report[0]['requests'], 2)
+        self.assertEqual(report[0]['avg_queries'], 200)
+        self.assertEqual(report[0]['top_duplicate_queries'][0]['count'], 200)
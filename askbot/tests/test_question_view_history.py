@@ -0,0 +1,108 @@
+"""Tests for the question view de-duplication in record_question_visit."""
+import datetime
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from askbot.models import get_question_views_cache_key, record_question_visit
+from askbot.tests.utils import AskbotTestCase, with_settings
+
+
+@patch('askbot.models.defer_celery_task')
+@patch('askbot.models.functions.not_a_robot_request', return_value=True)
+class QuestionViewHistoryTests(AskbotTestCase):
+    """record_question_visit keeps the view times in the cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = self.create_user('author')
+        self.visitor = self.create_user('visitor')
+        self.question = self.post_question(user=self.author)
+        self.factory = RequestFactory()
+
+    def _make_request(self, user=None):
+        request = self.factory.get(self.question.get_absolute_url(),
+                                   HTTP_USER_AGENT='Mozilla Gecko',
+                                   REMOTE_ADDR='10.0.0.1')
+        request.user = user or self.visitor
+        request.session = SessionStore()
+        return request
+
+    def _visit(self, mock_defer, request=None, timestamp=None):
+        mock_defer.reset_mock()
+        record_question_visit(request or self._make_request(),
+                              self.question, timestamp or timezone.now())
+        return mock_defer.call_args[1]['kwargs']['update_view_count']
+
+    def test_session_is_not_modified(self, mock_robot, mock_defer):
+        request = self._make_request()
+        self._visit(mock_defer, request)
+        self.assertFalse(request.session.modified)
+        self.assertIsNone(request.session.session_key)
+
+    def test_repeated_view_is_not_counted(self, mock_robot, mock_defer):
+        self.assertTrue(self._visit(mock_defer))
+        self.assertFalse(self._visit(mock_defer))
+
+    def test_view_after_activity_is_counted(self, mock_robot, mock_defer):
+        past = timezone.now() - datetime.timedelta(hours=1)
+        self.assertTrue(self._visit(mock_defer, timestamp=past))
+        self.assertTrue(self._visit(mock_defer))
+
+    def test_anonymous_visitors_are_told_apart(self, mock_robot, mock_defer):
+        request = self._make_request(user=AnonymousUser())
+        self.assertTrue(self._visit(mock_defer, request))
+        request = self._make_request(user=AnonymousUser())
+        self.assertFalse(self._visit(mock_defer, request))
+        request = self._make_request(user=AnonymousUser())
+        request.META['REMOTE_ADDR'] = '10.0.0.2'
+        self.assertTrue(self._visit(mock_defer, request))
+
+    @override_settings(RATELIMIT_IP_META_KEY='HTTP_X_FORWARDED_FOR')
+    def test_anonymous_visitors_behind_proxy(self, mock_robot, mock_defer):
+        request = self._make_request(user=AnonymousUser())
+        request.META['HTTP_X_FORWARDED_FOR'] = '192.0.2.1, 10.0.0.1'
+        self.assertTrue(self._visit(mock_defer, request))
+        request = self._make_request(user=AnonymousUser())
+        request.META['HTTP_X_FORWARDED_FOR'] = '192.0.2.2, 10.0.0.1'
+        self.assertTrue(self._visit(mock_defer, request))
+
+    @override_settings(ASKBOT_QUESTION_VIEW_HISTORY_SIZE=2)
+    def test_history_is_bounded(self, mock_robot, mock_defer):
+        request = self._make_request()
+        self._visit(mock_defer, request)
+        for _ in range(2):
+            question = self.post_question(user=self.author)
+            record_question_visit(request, question, timezone.now())
+        view_times = cache.get(get_question_views_cache_key(request))
+        self.assertEqual(len(view_times), 2)
+        self.assertNotIn(self.question.id, dict(view_times))
+
+
+class QuestionPageSessionTests(AskbotTestCase):
+    """the question page does not create sessions for the anonymous visitors"""
+
+    def setUp(self):
+        self.question = self.post_question(user=self.create_user('author'))
+
+    @with_settings(ENABLE_GREETING_FOR_ANON_USER=False)
+    def test_question_page_does_not_start_session(self):
+        response = self.client.get(self.question.get_absolute_url(),
+                                   HTTP_USER_AGENT='Mozilla Gecko')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_anonymous_answer_starts_session(self):
+        from django.urls import reverse
+        from askbot.models import AnonymousAnswer
+        response = self.client.post(reverse('answer', kwargs={'id': self.question.id}),
+                                    {'text': 'an anonymous answer to the question'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('sessionid', response.cookies)
+        answer = AnonymousAnswer.objects.get()
+        self.assertEqual(answer.session_key, self.client.session.session_key)
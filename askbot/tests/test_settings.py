@@ -1,8 +1,11 @@
+from unittest.mock import patch
 from django.conf import settings as django_settings
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils import translation
 from askbot.tests.utils import AskbotTestCase
 from askbot.conf import settings as askbot_settings
+from askbot.conf import settings_wrapper
 import askbot
 
 class SettingsTests(AskbotTestCase):
@@ -60,3 +63,38 @@ class SettingsTests(AskbotTestCase):
         self.assertEqual(response.headers['Location'], '/settings/MIN_REP/')
         response = self.client.get(reverse('satchmo_site_settings') + 'MIN_REP/')
         self.assertEqual(response.status_code, 200)
+
+
+class SettingsSnapshotTests(AskbotTestCase):
+
+    def test_values_are_read_from_snapshot(self):
+        askbot_settings.MIN_REP_TO_VOTE_UP # load the snapshot
+        with patch.object(settings_wrapper.cache, 'get') as cache_get:
+            for _ in range(10):
+                askbot_settings.MIN_REP_TO_VOTE_UP
+            self.assertEqual(cache_get.call_count, 0)
+
+            # new request checks the version once
+            settings_wrapper.snapshot.expire() # called on request_started
+            cache_get.return_value = settings_wrapper.snapshot.version
+            askbot_settings.MIN_REP_TO_VOTE_UP
+            askbot_settings.MIN_REP_TO_VOTE_DOWN
+            self.assertEqual(cache_get.call_count, 1)
+
+    def test_snapshot_is_reloaded_when_version_changes(self):
+        backup = askbot_settings.MIN_REP_TO_VOTE_UP
+        askbot_settings.update('MIN_REP_TO_VOTE_UP', backup + 1)
+        self.assertEqual(askbot_settings.MIN_REP_TO_VOTE_UP, backup + 1)
+
+        # simulate the change made by another process
+        cache_key = settings_wrapper.get_bulk_cache_key()
+        values = cache.get(cache_key)
+        values['MIN_REP_TO_VOTE_UP'] = backup + 2
+        cache.set(cache_key, values)
+        self.assertEqual(askbot_settings.MIN_REP_TO_VOTE_UP, backup + 1)
+
+        cache.set(settings_wrapper.SETTINGS_VERSION_CACHE_KEY, 'changed', timeout=None)
+        settings_wrapper.snapshot.expire()
+        self.assertEqual(askbot_settings.MIN_REP_TO_VOTE_UP, backup + 2)
+
+        askbot_settings.update('MIN_REP_TO_VOTE_UP', backup)
@@ -0,0 +1,68 @@
+"""Tests for the sitemap index and the question sitemaps by id range."""
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from askbot import sitemap
+from askbot.tests.utils import AskbotTestCase
+
+
+@override_settings(ASKBOT_SITEMAP_SHARD_SIZE=2)
+class SitemapTests(AskbotTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user()
+        self.questions = [self.post_question(user=self.user, title=f'question {number}')
+                          for number in range(3)]
+
+    def get_shard(self, question):
+        return question.id // 2
+
+    def test_index_lists_shards(self):
+        response = self.client.get(reverse('sitemap'))
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode('utf-8')
+        shards = sorted(set(self.get_shard(question) for question in self.questions))
+        self.assertEqual(content.count('<sitemap>'), len(shards))
+        for shard in shards:
+            url = reverse('sitemap_questions', kwargs={'shard': shard})
+            self.assertIn(f'{url}</loc>', content)
+
+    def test_shard_lists_questions(self):
+        question = self.questions[0]
+        shard = self.get_shard(question)
+        response = self.client.get(reverse('sitemap_questions', kwargs={'shard': shard}))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        content = response.content.decode('utf-8')
+        for other in self.questions:
+            url = other.get_absolute_url() + '</loc>'
+            self.assertEqual(url in content, self.get_shard(other) == shard)
+
+    def test_empty_shard_not_found(self):
+        shard = self.get_shard(self.questions[-1]) + 1
+        response = self.client.get(reverse('sitemap_questions', kwargs={'shard': shard}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_deleted_question_is_not_listed(self):
+        question = self.questions[0]
+        self.user.delete_question(question)
+        shard = self.get_shard(question)
+        response = self.client.get(reverse('sitemap_questions', kwargs={'shard': shard}))
+        content = response.content.decode('utf-8')
+        self.assertNotIn(question.get_absolute_url(), content)
+
+    def test_shard_is_rendered_again_only_after_changes(self):
+        question = self.questions[0]
+        url = reverse('sitemap_questions', kwargs={'shard': self.get_shard(question)})
+        with patch('askbot.sitemap.render_shard', wraps=sitemap.render_shard) as render:
+            self.client.get(url)
+            self.client.get(url)
+            self.assertEqual(render.call_count, 1)
+            self.edit_question(user=self.user, question=question, title='edited question title')
+            response = self.client.get(url)
+            self.assertEqual(render.call_count, 2)
+        self.assertIn('edited-question-title', response.content.decode('utf-8'))
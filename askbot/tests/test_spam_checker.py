@@ -0,0 +1,153 @@
+from io import StringIO
+from unittest import mock
+from django.core import management
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from askbot import const, models, spam_checker
+from askbot.spam_checker import askbot_spam_checker
+from askbot.tasks import check_post_revision_for_spam_celery_task
+from askbot.tests.utils import AskbotTestCase, with_settings
+
+
+@override_settings(ASKBOT_SPAM_VERDICT_CACHE_TIMEOUT=60)
+class SpamVerdictCacheTests(AskbotTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_verdict_is_cached_per_user(self):
+        with mock.patch('askbot.spam_checker.check_spam', return_value=True) as check:
+            self.assertTrue(spam_checker.is_spam('buy pills', username='bob'))
+            self.assertTrue(spam_checker.is_spam('buy pills', username='bob'))
+            self.assertEqual(check.call_count, 1)
+            spam_checker.is_spam('buy pills', username='alice')
+            spam_checker.is_spam('buy pills', ip_addr='1.2.3.4')
+            self.assertEqual(check.call_count, 3)
+
+        stats = spam_checker.get_stats()
+        self.assertEqual(stats['checks'], 3)
+        self.assertEqual(stats['cache_hits'], 1)
+        self.assertEqual(stats['spam'], 3)
+
+    @override_settings(ASKBOT_SPAM_VERDICT_CACHE_TIMEOUT=0)
+    def test_verdict_cache_can_be_disabled(self):
+        with mock.patch('askbot.spam_checker.check_spam', return_value=False) as check:
+            spam_checker.is_spam('hello', username='bob')
+            spam_checker.is_spam('hello', username='bob')
+        self.assertEqual(check.call_count, 2)
+
+    @override_settings(ASKBOT_SPAM_CHECKER_SLOW_MS=0)
+    def test_slow_checks_are_logged(self):
+        with mock.patch('askbot.spam_checker.check_spam', return_value=False):
+            with self.assertLogs('askbot.spam_checker', level='WARNING'):
+                spam_checker.is_spam('hello', username='bob')
+        out = StringIO()
+        management.call_command('askbot_spam_checker_stats', stdout=out)
+        self.assertIn('slow         1', out.getvalue())
+
+    def test_remote_checker_session_is_reused(self):
+        self.assertIs(askbot_spam_checker.get_session(), askbot_spam_checker.get_session())
+
+
+@override_settings(ASKBOT_SPAM_CHECK_MODE='async', ASKBOT_SPAM_VERDICT_CACHE_TIMEOUT=0)
+class AsyncSpamCheckTests(AskbotTestCase):
+
+    def setUp(self):
+        self.moderator = self.create_user('moderator', status='d')
+        self.user = self.create_user('user')
+
+    def get_queue_items(self):
+        return models.Activity.objects.filter(
+            activity_type__in=(const.TYPE_ACTIVITY_MODERATED_NEW_POST,
+                               const.TYPE_ACTIVITY_MODERATED_POST_EDIT)
+        )
+
+    @with_settings(SPAM_FILTER_ENABLED=True)
+    def test_spam_question_is_moved_to_moderation_queue(self):
+        self.client.login(user_id=self.user.id, method='force')
+        with mock.patch('askbot.spam_checker.check_spam', return_value=True) as check:
+            response = self.client.post(reverse('ask'), data={
+                'title': 'cheap pills for sale', 'text': 'buy cheap pills now'
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(check.call_count, 1)
+        question = models.Post.objects.get_questions().get()
+        self.assertFalse(question.approved)
+        self.assertFalse(question.thread.approved)
+        self.assertEqual(question.revisions.get().revision, 0)
+        self.assertEqual(self.get_queue_items().count(), 1)
+
+        self.moderator.approve_post_revision(question.revisions.get())
+        question = self.reload_object(question)
+        self.assertTrue(question.approved)
+
+    @with_settings(SPAM_FILTER_ENABLED=True)
+    def test_ham_question_stays_published(self):
+        self.client.login(user_id=self.user.id, method='force')
+        with mock.patch('askbot.spam_checker.check_spam', return_value=False):
+            self.client.post(reverse('ask'), data={
+                'title': 'how to configure django', 'text': 'where are the settings'
+            })
+        question = models.Post.objects.get_questions().get()
+        self.assertTrue(question.approved)
+        self.assertEqual(self.get_queue_items().count(), 0)
+
+    @with_settings(SPAM_FILTER_ENABLED=True)
+    def test_spam_answer_edit_is_reverted(self):
+        question = self.post_question(user=self.moderator)
+        answer = self.post_answer(question=question, user=self.user, body_text='good answer')
+        thread = self.reload_object(question.thread)
+        answer_count = thread.answer_count
+        self.user.edit_answer(answer=answer, body_text='buy cheap pills now')
+        revision = answer.revisions.order_by('-id')[0]
+        with mock.patch('askbot.spam_checker.check_spam', return_value=True):
+            check_post_revision_for_spam_celery_task(revision.pk, {'username': 'user'})
+
+        answer = self.reload_object(answer)
+        self.assertEqual(answer.text, 'good answer')
+        self.assertTrue(answer.approved)
+        self.assertEqual(self.reload_object(thread).answer_count, answer_count)
+        self.assertEqual(self.reload_object(revision).revision, 0)
+        self.assertEqual(self.get_queue_items().count(), 1)
+
+    @with_settings(SPAM_FILTER_ENABLED=True)
+    def test_spam_answer_is_moved_to_moderation_queue(self):
+        question = self.post_question(user=self.moderator)
+        self.client.login(user_id=self.user.id, method='force')
+        with mock.patch('askbot.spam_checker.check_spam', return_value=True) as check:
+            response = self.client.post(reverse('answer', kwargs={'id': question.id}),
+                                        data={'text': 'buy cheap pills now'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(check.call_count, 1)
+        answer = models.Post.objects.get_answers().get()
+        self.assertFalse(answer.approved)
+        self.assertEqual(self.reload_object(question.thread).answer_count, 0)
+        self.assertEqual(self.get_queue_items().count(), 1)
+
+    @with_settings(SPAM_FILTER_ENABLED=True)
+    def test_spam_comment_is_moved_to_moderation_queue(self):
+        question = self.post_question(user=self.moderator)
+        self.client.login(user_id=self.user.id, method='force')
+        with mock.patch('askbot.spam_checker.check_spam', return_value=True) as check:
+            response = self.client.post(reverse('post_comments'), data={
+                'post_type': 'question', 'post_id': question.id,
+                'comment': 'buy cheap pills now', 'avatar_size': 48
+            }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(check.call_count, 1)
+        comment = models.Post.objects.get_comments().get()
+        self.assertFalse(comment.approved)
+        self.assertEqual(self.get_queue_items().count(), 1)
+
+    @with_settings(SPAM_FILTER_ENABLED=True)
+    def test_spam_question_title_is_reverted(self):
+        question = self.post_question(user=self.user, title='how to configure django')
+        self.user.edit_question(question=question, title='cheap pills for sale')
+        revision = question.revisions.order_by('-id')[0]
+        with mock.patch('askbot.spam_checker.check_spam', return_value=True) as check:
+            check_post_revision_for_spam_celery_task(revision.pk, {'username': 'user'})
+        self.assertIn('cheap pills for sale', check.call_args[0][0])
+        question = self.reload_object(question)
+        self.assertEqual(question.thread.title, 'how to configure django')
+        self.assertEqual(self.get_queue_items().count(), 1)
@@ -18,7 +18,9 @@ Preconditions for this test module:
    test settings are ever swapped to a dummy backend, add an explicit
    ``@override_settings`` for ``CACHES`` on this TestCase.
 """
+import ipaddress
 import json
+import random
 from unittest import mock
 
 from django.contrib.auth.models import AnonymousUser
@@ -32,6 +34,10 @@ from askbot.utils.ratelimit import (
     # Used only in JSON-branch 'message' field assertions; no longer
     # the raw response body.
     _RATELIMITED_RESPONSE_BODY,
+    _get_allowlist_networks,
+    IpNetworkMatcher,
+    LocalBucketLimiter,
+    get_internal_ip_networks,
     resolve_request_ip,
     askbot_ratelimit,
     check_askbot_ratelimit,
@@ -1411,3 +1417,186 @@ class InternalIpTests(TestCase):
         # limiter only. It must NEVER bleed into closed-forum-mode
         # bypass.
         self.assertFalse(is_internal_ip('5.5.5.5'))
+
+
+@override_settings(CACHES=_NO_CULL_CACHES)
+class LocalBucketLimiterTests(TestCase):
+    """Leased local tokens and the sliding window.
+
+    ``consume`` is driven directly with a fixed clock; two limiter
+    instances stand in for two worker processes sharing the cache.
+    """
+    WINDOW = 60
+    # 10 seconds into a window
+    NOW = 1000 * WINDOW + 10
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def tearDown(self):
+        caches['default'].clear()
+
+    def _consume(self, limiter, count, now=NOW):
+        with mock.patch('askbot.utils.ratelimit.time.time', return_value=now):
+            return [
+                limiter.consume('group', '1.2.3.0/24', 10, self.WINDOW)
+                for _ in range(count)
+            ]
+
+    @override_settings(ASKBOT_RATELIMIT_LOCAL_TOLERANCE=0.5)
+    def test_leased_tokens_save_round_trips(self):
+        limiter = LocalBucketLimiter()
+        cache = caches['default']
+        with mock.patch.object(cache, 'incr', wraps=cache.incr) as incr:
+            results = self._consume(limiter, 11)
+        self.assertEqual(results, [False] * 10 + [True])
+        # two leases and the refund of the rejected request's lease
+        # (locmem implements decr with incr) for eleven requests
+        self.assertEqual(incr.call_count, 3)
+
+    @override_settings(ASKBOT_RATELIMIT_LOCAL_TOLERANCE=0.5)
+    def test_rejected_requests_skip_cache(self):
+        limiter = LocalBucketLimiter()
+        self._consume(limiter, 11)
+        cache = caches['default']
+        with mock.patch.object(cache, 'add') as add, \
+                mock.patch.object(cache, 'incr') as incr, \
+                mock.patch.object(cache, 'get') as get:
+            self.assertEqual(self._consume(limiter, 5), [True] * 5)
+        add.assert_not_called()
+        incr.assert_not_called()
+        get.assert_not_called()
+        # the next window starts with a fresh count
+        self.assertEqual(self._consume(limiter, 1, now=self.NOW + self.WINDOW), [False])
+
+    @override_settings(ASKBOT_RATELIMIT_LOCAL_TOLERANCE=0.5)
+    def test_workers_never_admit_over_limit(self):
+        first, second = LocalBucketLimiter(), LocalBucketLimiter()
+        admitted = self._consume(first, 1).count(False)
+        admitted += self._consume(second, 20).count(False)
+        admitted += self._consume(first, 20).count(False)
+        self.assertLessEqual(admitted, 10)
+        # the error is bounded by one lease of the other worker
+        self.assertGreaterEqual(admitted, 10 - 5)
+
+    @override_settings(ASKBOT_RATELIMIT_WINDOW='sliding')
+    def test_sliding_window_prevents_boundary_burst(self):
+        end_of_window = 1000 * self.WINDOW + self.WINDOW - 1
+        self.assertEqual(
+            self._consume(LocalBucketLimiter(), 10, now=end_of_window),
+            [False] * 10,
+        )
+        # two seconds later a fixed window would admit a full burst
+        self.assertEqual(
+            self._consume(LocalBucketLimiter(), 1, now=end_of_window + 2),
+            [True],
+        )
+        # half a window later half of the previous burst has slid out,
+        # the rejected request above counts too
+        results = self._consume(
+            LocalBucketLimiter(), 10, now=end_of_window + 1 + self.WINDOW // 2,
+        )
+        self.assertEqual(results.count(False), 4)
+
+    @override_settings(ASKBOT_RATELIMIT_WINDOW='sliding')
+    def test_sliding_window_rejection_ends_within_window(self):
+        limiter = LocalBucketLimiter()
+        end_of_window = 1000 * self.WINDOW + self.WINDOW - 1
+        self._consume(limiter, 10, now=end_of_window)
+        self.assertEqual(self._consume(limiter, 1, now=end_of_window + 2), [True])
+        results = self._consume(limiter, 10, now=end_of_window + 1 + self.WINDOW // 2)
+        self.assertEqual(results.count(False), 4)
+
+    @override_settings(ASKBOT_RATELIMIT_LOCAL_TOLERANCE=0.5)
+    @with_settings(REQUEST_RATE_LIMIT_ENABLED=True,
+                   REQUEST_RATE_LIMIT_MAX_REQUESTS=4)
+    def test_policy_check_uses_local_buckets(self):
+        factory = RequestFactory()
+        with mock.patch('askbot.utils.ratelimit.is_ratelimited') as shared:
+            results = [
+                is_askbot_ratelimited(
+                    factory.get('/', REMOTE_ADDR='9.9.9.9'), policy='request',
+                )
+                for _ in range(5)
+            ]
+        shared.assert_not_called()
+        self.assertEqual(results, [False] * 4 + [True])
+
+
+def _random_network(rng):
+    version = rng.choice((4, 6))
+    bits = 32 if version == 4 else 128
+    # short prefixes are rare in real lists, keep a few of them
+    prefix_len = rng.choice((0, rng.randint(1, 8), rng.randint(8, bits), bits))
+    address = ipaddress.ip_address(rng.getrandbits(bits)) if version == 4 \
+        else ipaddress.IPv6Address(rng.getrandbits(bits))
+    return ipaddress.ip_network(f'{address}/{prefix_len}', strict=False)
+
+
+def _probe_addresses(rng, networks, count):
+    """random addresses plus the edges of the networks and their
+    neighbours, where an off-by-one in the trie would show"""
+    probes = []
+    for network in networks:
+        for edge in (network.network_address, network.broadcast_address):
+            probes.append(edge)
+            for step in (-1, 1):
+                try:
+                    probes.append(edge + step)
+                except ipaddress.AddressValueError:
+                    pass
+    for _ in range(count):
+        probes.append(ipaddress.IPv4Address(rng.getrandbits(32)))
+        probes.append(ipaddress.IPv6Address(rng.getrandbits(128)))
+    return probes
+
+
+class IpNetworkMatcherTests(TestCase):
+    """Property tests: the trie agrees with the linear scan over
+    ``ipaddress`` networks it replaces, for random network lists."""
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(20260101)
+        for _ in range(200):
+            networks = [_random_network(rng) for _ in range(rng.randint(0, 12))]
+            matcher = IpNetworkMatcher(networks)
+            for addr in _probe_addresses(rng, networks, 20):
+                self.assertEqual(
+                    addr in matcher,
+                    any(addr in network for network in networks),
+                    f'{addr} in {networks}',
+                )
+
+    def test_order_of_nested_networks_does_not_matter(self):
+        networks = [ipaddress.ip_network(net) for net in
+                    ('10.1.2.0/24', '10.0.0.0/8', '10.1.2.3/32')]
+        for ordered in (networks, networks[::-1]):
+            matcher = IpNetworkMatcher(ordered)
+            self.assertIn(ipaddress.ip_address('10.200.0.1'), matcher)
+            self.assertNotIn(ipaddress.ip_address('11.0.0.1'), matcher)
+
+    def test_families_are_separate(self):
+        matcher = IpNetworkMatcher([ipaddress.ip_network('0.0.0.0/0')])
+        self.assertIn(ipaddress.ip_address('8.8.8.8'), matcher)
+        self.assertNotIn(ipaddress.ip_address('::8.8.8.8'), matcher)
+
+    def test_settings_agree_with_parsed_networks(self):
+        rng = random.Random(20260102)
+        factory = RequestFactory()
+        for _ in range(20):
+            internal = [str(_random_network(rng)) for _ in range(3)]
+            allowlist = [str(_random_network(rng)) for _ in range(3)]
+            with override_settings(ASKBOT_INTERNAL_IPS=internal), \
+                    livesettings_override(RATE_LIMIT_IP_ALLOWLIST=allowlist):
+                allowlist_networks = _get_allowlist_networks()
+                internal_networks = get_internal_ip_networks()
+                for addr in _probe_addresses(rng, allowlist_networks, 5):
+                    request = factory.get('/', REMOTE_ADDR=str(addr))
+                    self.assertEqual(
+                        is_allowlisted(request),
+                        any(addr in net for net in allowlist_networks),
+                    )
+                    self.assertEqual(
+                        is_internal_ip(str(addr)),
+                        any(addr in net for net in internal_networks),
+                    )
@@ -156,6 +156,8 @@ class AskbotTestCase(TestCase):
         post_migrate.disconnect(create_permissions, dispatch_uid="django.contrib.auth.management.create_permissions")
 
         super(AskbotTestCase, self)._fixture_teardown()
+        # cached ids, e.g. of the analytics sessions, refer to the rolled back rows
+        cache.clear()
 
         post_migrate.connect(create_contenttypes)
         post_migrate.connect(create_permissions, dispatch_uid="django.contrib.auth.management.create_permissions")
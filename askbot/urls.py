@@ -5,13 +5,11 @@ import os.path
 from django.conf import settings
 from django.contrib import admin
 from django.urls import re_path, include
-from django.contrib.sitemaps import views as SitemapViews
 from django.views import static as StaticViews
 from django.views import i18n as I18nViews
 
 from askbot import views
 from askbot.feed import RssLastestQuestionsFeed, RssIndividualQuestionFeed
-from askbot.sitemap import QuestionsSitemap
 from askbot.utils.ratelimit import ratelimit_exempt, ratelimit_exempt_resolver
 from askbot.utils.url_utils import service_url
 import askbot.deps.django_authopenid.urls
@@ -27,9 +25,6 @@ feeds = {
     'rss': RssLastestQuestionsFeed,
     'question': RssIndividualQuestionFeed
 }
-sitemaps = {
-    'questions': QuestionsSitemap
-}
 
 MAIN_PAGE_BASE_URL = settings.ASKBOT_MAIN_PAGE_BASE_URL
 QUESTION_PAGE_BASE_URL = settings.ASKBOT_QUESTION_PAGE_BASE_URL
@@ -162,11 +157,11 @@ urlpatterns = [
         views.meta.badge_page,
         name='badge'
     ),
+    re_path(r'^sitemap.xml$', views.meta.sitemap_index, name='sitemap'),
     re_path(
-        r'^sitemap.xml$',
-        SitemapViews.sitemap,
-        {'sitemaps': sitemaps},
-        name='sitemap'
+        r'^sitemap-questions-(?P<shard>\d+)\.xml$',
+        views.meta.sitemap_questions,
+        name='sitemap_questions'
     ),
     # feeds
     re_path(r'^feeds/rss/$', RssLastestQuestionsFeed(), name="latest_questions_feed"),
@@ -648,7 +643,9 @@ urlpatterns = [
     re_path('^api/v1/questions/$', views.api_v1.questions, name='api_v1_questions'),
     re_path('^api/v1/questions/(?P<question_id>\d+)/$', views.api_v1.question, name='api_v1_question'),
     re_path('^api/v1/answers/(?P<answer_id>\d+)/$', views.api_v1.answer, name='api_v1_answer'),
+    re_path('^api/v1/export/$', views.api_v1.export, name='api_v1_export'),
     re_path('^colors/', views.meta.colors, name='colors'),
+    re_path(r'^cache-stats/$', views.meta.cache_stats_view, name='cache_stats'),
     service_url(
         r'^verify-email-change/$',
         views.users.verify_email_change,
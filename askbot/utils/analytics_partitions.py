@@ -0,0 +1,197 @@
+"""Monthly range partitions of the analytics events table on PostgreSQL.
+
+The partitioned ``askbot_event`` table is split by the ``timestamp``
+into one partition per calendar month (UTC) named ``askbot_event_yYYYYmMM``
+and a default partition for the rows outside of the created months.
+The primary key of a partitioned table must include the partition key,
+so it becomes ``(id, timestamp)``; the ids are still unique, as they
+come from one sequence.
+
+The rows of a month without the partition, when the partitions
+were not created in time, are moved from the default partition
+to the partition of the month when it is created.
+
+The expired months are removed with ``DROP TABLE`` of the partition,
+instead of deleting the rows one by one.
+
+The table is converted and the partitions are created by the
+``askbot_partition_analytics_events`` management command, the expired
+partitions are dropped by ``askbot_compact_analytics``.
+"""
+import datetime
+import re
+from django.db import connection, transaction
+
+EVENTS_TABLE = 'askbot_event'
+DEFAULT_PARTITION = EVENTS_TABLE + '_default'
+PARTITION_NAME_RE = re.compile(r'^' + EVENTS_TABLE + r'_y(\d{4})m(\d{2})$')
+ID_SEQUENCE = EVENTS_TABLE + '_partitioned_id_seq'
+INDEXED_COLUMNS = ('session_id', 'content_type_id', 'object_id', 'timestamp')
+FOREIGN_KEYS = (
+    ('session_id', 'askbot_session'),
+    ('content_type_id', 'django_content_type'),
+)
+UTC = datetime.timezone.utc
+
+
+def is_supported():
+    """True if the database supports the partitioned events table"""
+    return connection.vendor == 'postgresql'
+
+
+def get_month_start(timestamp):
+    """returns the start of the UTC month of the timestamp"""
+    timestamp = timestamp.astimezone(UTC)
+    return datetime.datetime(timestamp.year, timestamp.month, 1, tzinfo=UTC)
+
+
+def get_next_month_start(month_start):
+    """returns the start of the month following the ``month_start``"""
+    if month_start.month == 12:
+        return month_start.replace(year=month_start.year + 1, month=1)
+    return month_start.replace(month=month_start.month + 1)
+
+
+def get_last_month_start(months_ahead):
+    """returns the start of the month ``months_ahead`` months from now"""
+    month_start = get_month_start(datetime.datetime.now(UTC))
+    for _ in range(months_ahead):
+        month_start = get_next_month_start(month_start)
+    return month_start
+
+
+def get_partition_name(month_start):
+    """returns name of the partition of the month"""
+    return f'{EVENTS_TABLE}_y{month_start.year:04d}m{month_start.month:02d}'
+
+
+def parse_partition_name(name):
+    """returns the start of the month of the partition
+    or ``None`` if the table is not a monthly partition"""
+    match = PARTITION_NAME_RE.match(name)
+    if not match:
+        return None
+    return datetime.datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=UTC)
+
+
+def is_partitioned():
+    """True if the events table is partitioned"""
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)",
+                       [EVENTS_TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def get_partitions():
+    """returns list of the (month start, partition name) of
+    the monthly partitions, sorted by the month"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT child.relname FROM pg_inherits "
+                       "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                       "WHERE pg_inherits.inhparent = to_regclass(%s)", [EVENTS_TABLE])
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = [(parse_partition_name(name), name) for name in names]
+    return sorted(partition for partition in partitions if partition[0])
+
+
+def table_exists(name):
+    """True if the table exists"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+        return cursor.fetchone()[0]
+
+
+def create_partition(month_start):
+    """creates the partition of the month, if it does not exist yet.
+
+    The rows of the month stored in the default partition,
+    when the partition was not created in time, are moved
+    to the new partition: the default partition is detached
+    for the time of the move, as PostgreSQL does not create
+    a partition for the rows present in the default one."""
+    name = get_partition_name(month_start)
+    if table_exists(name):
+        return name
+    bounds = [month_start, get_next_month_start(month_start)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        has_default = table_exists(DEFAULT_PARTITION)
+        if has_default:
+            cursor.execute(f'ALTER TABLE "{EVENTS_TABLE}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+        cursor.execute(f'CREATE TABLE "{name}" PARTITION OF "{EVENTS_TABLE}" '
+                       'FOR VALUES FROM (%s) TO (%s)', bounds)
+        if has_default:
+            condition = '"timestamp" >= %s AND "timestamp" < %s'
+            cursor.execute(f'INSERT INTO "{name}" SELECT * FROM "{DEFAULT_PARTITION}" '
+                           f'WHERE {condition}', bounds)
+            cursor.execute(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE {condition}', bounds)
+            cursor.execute(f'ALTER TABLE "{EVENTS_TABLE}" '
+                           f'ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+    return name
+
+
+def create_partitions(start, end):
+    """creates the monthly partitions for the time from ``start`` to ``end``,
+    returns names of the partitions"""
+    names = list()
+    month_start = get_month_start(start)
+    while month_start <= end:
+        names.append(create_partition(month_start))
+        month_start = get_next_month_start(month_start)
+    return names
+
+
+def get_max_event_id(table_name):
+    """returns the largest event id in the table or partition"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MAX(id) FROM "{table_name}"')
+        return cursor.fetchone()[0] or 0
+
+
+def drop_partition(name):
+    """detaches and drops the partition"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{EVENTS_TABLE}" DETACH PARTITION "{name}"')
+        cursor.execute(f'DROP TABLE "{name}"')
+
+
+@transaction.atomic
+def partition_events_table(months_ahead):
+    """Replaces the events table with a partitioned copy,
+    with the partitions from the month of the first event
+    to ``months_ahead`` months from now. The table is locked
+    for the time of the copying."""
+    old_table = EVENTS_TABLE + '_unpartitioned'
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{EVENTS_TABLE}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE "{EVENTS_TABLE}" RENAME TO "{old_table}"')
+        cursor.execute(f'CREATE TABLE "{EVENTS_TABLE}" (LIKE "{old_table}" '
+                       'INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                       'PARTITION BY RANGE ("timestamp")')
+        cursor.execute(f'ALTER TABLE "{EVENTS_TABLE}" ADD PRIMARY KEY ("id", "timestamp")')
+        for column in INDEXED_COLUMNS:
+            cursor.execute(f'CREATE INDEX "{EVENTS_TABLE}_{column}_part_idx" '
+                           f'ON "{EVENTS_TABLE}" ("{column}")')
+        for column, referenced_table in FOREIGN_KEYS:
+            cursor.execute(f'ALTER TABLE "{EVENTS_TABLE}" '
+                           f'ADD CONSTRAINT "{EVENTS_TABLE}_{column}_part_fk" '
+                           f'FOREIGN KEY ("{column}") REFERENCES "{referenced_table}" ("id") '
+                           'DEFERRABLE INITIALLY DEFERRED')
+
+        # the ids continue from the sequence owned by the new table,
+        # the old one may be an identity column, not supported by the partitioned tables
+        cursor.execute(f'CREATE SEQUENCE "{ID_SEQUENCE}" OWNED BY "{EVENTS_TABLE}"."id"')
+        cursor.execute(f'SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) FROM "{old_table}"',
+                       [ID_SEQUENCE])
+        cursor.execute(f'ALTER TABLE "{EVENTS_TABLE}" '
+                       f"ALTER COLUMN \"id\" SET DEFAULT nextval('\"{ID_SEQUENCE}\"')")
+
+        cursor.execute(f'SELECT MIN("timestamp") FROM "{old_table}"')
+        first_timestamp = cursor.fetchone()[0] or datetime.datetime.now(UTC)
+        create_partitions(first_timestamp, get_last_month_start(months_ahead))
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{EVENTS_TABLE}" DEFAULT')
+
+        cursor.execute(f'INSERT INTO "{EVENTS_TABLE}" SELECT * FROM "{old_table}"')
+        cursor.execute(f'DROP TABLE "{old_table}"')
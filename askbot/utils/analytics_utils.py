@@ -1,5 +1,10 @@
+import functools
 from django.conf import settings as django_settings
 from django.utils.translation import gettext_lazy as _
+from askbot.utils.cache import get_or_set, make_cache_key
+
+# invalidated by the askbot_compile_analytics command
+ANALYTICS_CACHE_NAMESPACE = 'analytics'
 
 ANALYTICS_DEFAULT_SEGMENT_DEFAULTS = {
     'slug': 'all',
@@ -70,4 +75,14 @@ def get_segment_name(segment_slug):
     default_segment_config = get_analytics_default_segment_config()
     if segment_slug == default_segment_config['slug']:
         return default_segment_config['name']
-    return None
\ No newline at end of file
+    return None
+
+
+def get_cached_analytics(func, *args):
+    """Returns result of ``func(*args)``, cached for ``ASKBOT_ANALYTICS_CACHE_TIMEOUT``
+    seconds or until the next run of the ``askbot_compile_analytics`` command"""
+    timeout = django_settings.ASKBOT_ANALYTICS_CACHE_TIMEOUT
+    if not timeout:
+        return func(*args)
+    return get_or_set(make_cache_key(func, *args), functools.partial(func, *args),
+                      timeout=timeout, namespace=ANALYTICS_CACHE_NAMESPACE)
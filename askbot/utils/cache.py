@@ -1,9 +1,55 @@
-"""Cache utilities"""
-from django.core.cache import cache
+"""Cache utilities
+
+Function ``get_or_set`` (and the decorator ``memoize`` built on it)
+caches results of expensive calls:
+
+* misses are detected with a sentinel, so falsy results are cached too
+* values are stored together with their "fresh until" time;
+  after that time the value is stale, one caller recalculates it
+  under a lock, while the others keep using the stale value
+  for up to ``stale_timeout`` more seconds
+* on a cold miss only one caller calculates the value, others
+  wait for it for up to ``lock_wait`` seconds
+* the timeouts are randomly spread by ``jitter`` (a fraction of
+  the timeout), so that keys cached at the same time do not
+  expire at the same time
+* keys may belong to a namespace, all keys in the namespace are
+  invalidated at once with ``invalidate_namespace``
+
+Class ``LocalCacheFamily`` keeps a group of frequently read keys
+in the process memory, in front of the django cache.
+
+Surrogate tags (``add_surrogate_tags``) mark the responses with
+the namespaces of the data they show, so that the page cache
+in ``askbot.middleware.cache`` drops only the pages showing the
+data that has changed (``purge_surrogate_tags``).
+"""
 import functools
-import inspect
+import pickle
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import OrderedDict
+from django.conf import settings as django_settings
+from django.core import cache as django_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.signals import request_started
 from django.db.models import Model
 
+#returned by the cache backend when the key is missing
+MISS = object()
+
+STALE_TIMEOUT = 60
+JITTER = 0.1
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2
+LOCK_POLL_INTERVAL = 0.05
+# keys written to a local cache family, remembered for the other processes
+LOCAL_CACHE_CHANGE_LOG_SIZE = 100
+LOCAL_CACHE_CHANGE_LOG_TIMEOUT = 60 * 60
+
 def django_repr(obj):
     """repr that reliably identifies instances django db models,
     including "deferred" objects"""
@@ -44,26 +90,381 @@ def make_cache_key(func, *args, **kwargs):
     return ':'.join(bits).replace(' ', '')
 
 
-def get_recached(key, func, *args, **kwargs):
-    """calculates result of the function, caches the result
-    and returns the same result"""
-    val = func(*args, **kwargs)
-    cache.set(key, val)
-    return val
+def get_backend():
+    """returns the default cache, looked up at call time,
+    so that it can be replaced in the test cases"""
+    return django_cache.cache
+
+
+def get_namespace_version_key(namespace):
+    """key of the cache entry storing the namespace version"""
+    return 'askbot-cache-ns:' + namespace
+
+
+def get_namespace_version(namespace):
+    """returns current version of the namespace"""
+    backend = get_backend()
+    key = get_namespace_version_key(namespace)
+    version = backend.get(key)
+    if version is None:
+        backend.add(key, uuid.uuid4().hex[:12], timeout=None)
+        version = backend.get(key)
+    return version
+
+
+def invalidate_namespace(namespace):
+    """invalidates all keys of the namespace"""
+    key = get_namespace_version_key(namespace)
+    get_backend().set(key, uuid.uuid4().hex[:12], timeout=None)
+
+
+SURROGATE_KEY_HEADER = 'Surrogate-Key'
+QUESTIONS_SURROGATE_TAG = 'questions' # any of the question lists
+
+
+def get_tag_surrogate_tag(tag_name):
+    """surrogate tag of the pages showing the askbot tag"""
+    return 'tag-' + urllib.parse.quote(tag_name)
+
+
+def add_surrogate_tags(response, tags):
+    """marks the response with the surrogate tags, which are
+    the names of the cache namespaces of the data on the page"""
+    tags = get_surrogate_tags(response) + [tag for tag in tags if tag]
+    response[SURROGATE_KEY_HEADER] = ' '.join(sorted(set(tags)))
+    return response
+
+
+def get_surrogate_tags(response):
+    """returns list of the surrogate tags of the response"""
+    return response.get(SURROGATE_KEY_HEADER, '').split()
+
+
+def get_surrogate_tag_versions(tags, create=False):
+    """returns dictionary tag -> current namespace version,
+    the missing versions are created if ``create`` is True,
+    otherwise they are ``None``"""
+    if create:
+        return dict((tag, get_namespace_version(tag)) for tag in tags)
+    keys = dict((get_namespace_version_key(tag), tag) for tag in tags)
+    versions = get_backend().get_many(list(keys))
+    return dict((tag, versions.get(key)) for key, tag in keys.items())
+
+
+def purge_surrogate_tags(tags):
+    """invalidates the cached pages marked with any of the tags"""
+    for tag in tags:
+        invalidate_namespace(tag)
+
+
+def get_versioned_key(key, namespace=None):
+    """returns key prefixed with the current namespace version"""
+    if namespace is None:
+        return key
+    return '%s:%s:%s' % (namespace, get_namespace_version(namespace), key)
+
+
+def get_timeout(timeout, jitter=JITTER):
+    """returns timeout in seconds, randomly spread by the ``jitter``,
+    or None if the values must not expire"""
+    if timeout is None:
+        timeout = get_backend().default_timeout
+    if timeout is None:
+        return None
+    if jitter:
+        timeout *= 1 + random.uniform(-jitter, jitter)
+    return timeout
+
+
+def set_cached(key, value, timeout=None, stale_timeout=STALE_TIMEOUT, # pylint: disable=too-many-arguments
+               namespace=None, jitter=JITTER, backend=None):
+    """stores value for ``get_or_set`` and ``get_cached``"""
+    key = get_versioned_key(key, namespace)
+    _set_entry(key, value, timeout, stale_timeout, jitter, backend)
+
+
+def _set_entry(key, value, timeout, stale_timeout, jitter, backend=None): # pylint: disable=too-many-arguments
+    timeout = get_timeout(timeout, jitter)
+    if timeout is None:
+        # the value never expires
+        (backend or get_backend()).set(key, (value, float('inf')), None)
+        return
+    entry = (value, time.time() + timeout)
+    (backend or get_backend()).set(key, entry, timeout + stale_timeout)
+
+
+def get_cached(key, default=None, namespace=None, backend=None):
+    """returns value stored with ``set_cached`` or ``get_or_set``,
+    including the stale value, or the ``default``"""
+    key = get_versioned_key(key, namespace)
+    entry = (backend or get_backend()).get(key, MISS)
+    if entry is MISS:
+        return default
+    return entry[0]
+
+
+def delete_cached(key, namespace=None, backend=None):
+    """deletes the cached value"""
+    (backend or get_backend()).delete(get_versioned_key(key, namespace))
+
+
+def _recalculate(key, func, timeout, stale_timeout, jitter, backend): # pylint: disable=too-many-arguments
+    value = func()
+    _set_entry(key, value, timeout, stale_timeout, jitter, backend)
+    return value
+
 
+def get_or_set(key, func, timeout=None, stale_timeout=STALE_TIMEOUT, # pylint: disable=too-many-arguments
+               namespace=None, jitter=JITTER, lock_wait=LOCK_WAIT, backend=None):
+    """returns cached result of ``func()``,
+    see the module docstring for the details.
+    ``backend`` may be a ``LocalCacheFamily``"""
+    backend = backend or get_backend()
+    key = get_versioned_key(key, namespace)
+    lock_key = key + ':lock'
 
-def memoize(func):
+    entry = backend.get(key, MISS)
+    if entry is not MISS:
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            return value
+        if not backend.add(lock_key, 1, LOCK_TIMEOUT):
+            # somebody else is recalculating the value
+            return value
+        try:
+            return _recalculate(key, func, timeout, stale_timeout, jitter, backend)
+        finally:
+            backend.delete(lock_key)
+
+    if not backend.add(lock_key, 1, LOCK_TIMEOUT):
+        wait_until = time.time() + lock_wait
+        while time.time() < wait_until:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = backend.get(key, MISS)
+            if entry is not MISS:
+                return entry[0]
+        # the lock holder is too slow or has died
+        return _recalculate(key, func, timeout, stale_timeout, jitter, backend)
+
+    try:
+        return _recalculate(key, func, timeout, stale_timeout, jitter, backend)
+    finally:
+        backend.delete(lock_key)
+
+
+class LocalCacheFamily(object):
+    """A family of keys read through a process-local LRU cache
+    placed in front of the django cache.
+
+    The family is enabled when its name is a key of the
+    ``ASKBOT_LOCAL_CACHE_FAMILIES`` setting, the value being the
+    timeout of the local entries in seconds. When disabled,
+    all calls go directly to the django cache.
+
+    Writes go to both caches, increment the family generation
+    stored in the django cache and log the written key under
+    the new generation number. Each process checks the generation
+    at most once per request (and at least once per the local
+    timeout outside of requests) and drops the local entries of
+    the keys written since its last check. All local entries of
+    the family are dropped when the log is incomplete.
+    The local values are stored pickled, so that the callers
+    can't modify them.
+
+    The interface mimics that of the django cache backend,
+    so that the family can be passed as ``backend`` to ``get_or_set``.
+    """
+    families = list()
+
+    def __init__(self, name):
+        self.name = name
+        self.entries = OrderedDict() # key -> (pickled value, expiration time)
+        self.generation = None
+        self.lock = threading.Lock()
+        self.state = threading.local()
+        self.families.append(self)
+
+    @property
+    def timeout(self):
+        """timeout of the local entries in seconds or None"""
+        return django_settings.ASKBOT_LOCAL_CACHE_FAMILIES.get(self.name)
+
+    @property
+    def enabled(self):
+        """True if the local cache is used for the family"""
+        return bool(self.timeout)
+
+    @property
+    def default_timeout(self):
+        """default timeout of the django cache"""
+        return get_backend().default_timeout
+
+    def get_generation_key(self):
+        """django cache key of the family generation"""
+        return 'askbot-local-cache-generation:' + self.name
+
+    def get_change_key(self, generation):
+        """django cache key of the key written in the generation"""
+        return '%s:%d' % (self.get_generation_key(), generation)
+
+    def expire(self):
+        """makes the next read check the generation"""
+        self.state.checked_at = None
+
+    def clear(self):
+        """drops the local entries"""
+        with self.lock:
+            self.entries.clear()
+
+    def forget(self, keys):
+        """drops the local entries of the keys"""
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def check_generation(self):
+        """drops the local entries of the keys
+        changed by the other processes"""
+        checked_at = getattr(self.state, 'checked_at', None)
+        now = time.monotonic()
+        if checked_at is not None and now - checked_at < self.timeout:
+            return
+        self.state.checked_at = now
+
+        backend = get_backend()
+        generation = backend.get(self.get_generation_key())
+        if generation is None:
+            backend.add(self.get_generation_key(), 0, timeout=None)
+            generation = backend.get(self.get_generation_key())
+        if generation == self.generation:
+            return
+
+        changed_keys = self.get_changed_keys(generation)
+        if changed_keys is None:
+            self.clear()
+        else:
+            self.forget(changed_keys)
+        self.generation = generation
+
+    def get_changed_keys(self, generation):
+        """returns keys written after the last check up to
+        the generation or None if they are not known"""
+        if not isinstance(generation, int) or self.generation is None:
+            return None
+        count = generation - self.generation
+        if count <= 0 or count > LOCAL_CACHE_CHANGE_LOG_SIZE:
+            return None
+        change_keys = [self.get_change_key(self.generation + number)
+                       for number in range(1, count + 1)]
+        changes = get_backend().get_many(change_keys)
+        if len(changes) < count:
+            return None
+        return list(changes.values())
+
+    def log_changes(self, keys):
+        """increments the generation for each key
+        and logs the key under the new generation"""
+        backend = get_backend()
+        generation_key = self.get_generation_key()
+        for key in keys:
+            try:
+                generation = backend.incr(generation_key)
+            except ValueError:
+                # the generation was evicted, all processes drop their entries
+                backend.add(generation_key, 0, timeout=None)
+                generation = backend.incr(generation_key)
+            backend.set(self.get_change_key(generation), key,
+                        timeout=LOCAL_CACHE_CHANGE_LOG_TIMEOUT)
+            if self.generation is not None and generation == self.generation + 1:
+                # no writes by the other processes in between
+                self.generation = generation
+
+    def store(self, key, value):
+        """saves value in the local cache"""
+        expires_at = time.monotonic() + self.timeout
+        entry = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > django_settings.ASKBOT_LOCAL_CACHE_MAX_ENTRIES:
+                self.entries.popitem(last=False)
+
+    def get(self, key, default=None):
+        """returns value from the local or the django cache"""
+        if not self.enabled:
+            return get_backend().get(key, default)
+
+        self.check_generation()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                self.entries.move_to_end(key)
+                return pickle.loads(entry[0])
+
+        value = get_backend().get(key, MISS)
+        if value is MISS:
+            return default
+        self.store(key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        """saves value in both caches"""
+        get_backend().set(key, value, timeout)
+        if self.enabled:
+            self.log_changes([key])
+            self.store(key, value)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        """same as ``add`` of the django cache, used for the locks"""
+        return get_backend().add(key, value, timeout)
+
+    def delete(self, key):
+        """deletes value from both caches"""
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        """deletes values from both caches"""
+        get_backend().delete_many(keys)
+        if self.enabled:
+            self.log_changes(keys)
+            self.forget(keys)
+
+
+def expire_local_caches(**kwargs): # pylint: disable=unused-argument
+    """makes the local cache families check their generations"""
+    for family in LocalCacheFamily.families:
+        family.expire()
+
+request_started.connect(expire_local_caches, dispatch_uid='expire_askbot_local_caches')
+
+
+def memoize(func=None, timeout=None, stale_timeout=STALE_TIMEOUT, namespace=None):
     """decorator that will automatically cache
-    results of the function call
+    results of the function call with ``get_or_set``
+
+    ``namespace`` may be a string or a function
+    taking the same arguments as the decorated function
     """
-    @functools.wraps(func)
-    def decorated(*args, **kwargs):
-        key = make_cache_key(func, *args, **kwargs)
-        return cache.get(key) or get_recached(key, func, *args, **kwargs)
-    return decorated
+    def decorator(func):
+        @functools.wraps(func)
+        def decorated(*args, **kwargs):
+            key = make_cache_key(func, *args, **kwargs)
+            if callable(namespace):
+                key_namespace = namespace(*args, **kwargs)
+            else:
+                key_namespace = namespace
+            return get_or_set(key, functools.partial(func, *args, **kwargs),
+                              timeout=timeout, stale_timeout=stale_timeout,
+                              namespace=key_namespace)
+        return decorated
+
+    if func is None:
+        return decorator
+    return decorator(func)
 
 
 def delete_memoized(func, *args, **kwargs):
-    """deletes cached result of the function"""
+    """deletes cached result of the function,
+    not namespaced with ``memoize(namespace=...)``"""
     key = make_cache_key(func, *args, **kwargs)
-    cache.delete(key)
+    delete_cached(key)
@@ -0,0 +1,358 @@
+"""Cache instrumentation
+
+``InstrumentedCache`` is a django cache backend wrapping another
+backend. It classifies the keys by family (the page cache, the thread
+summaries, the settings, the profiles, etc.) and records per family:
+
+* numbers of hits and misses of the reads
+* number of writes and the total size of the written values
+* time spent in the wrapped backend
+
+To enable, set the ``BACKEND`` of the cache to
+``askbot.utils.cache_stats.InstrumentedCache`` and move the original
+backend to the ``OPTIONS``::
+
+    CACHES['default'] = {
+        'BACKEND': 'askbot.utils.cache_stats.InstrumentedCache',
+        'LOCATION': '127.0.0.1:11211',
+        'OPTIONS': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        }
+    }
+
+The counters are collected in the process memory and added to the
+totals stored in the cache itself at most once per
+``ASKBOT_CACHE_STATS_FLUSH_INTERVAL`` seconds, so that the totals
+include all processes. The totals are shown by the
+``askbot_cache_stats`` management command and the admin-only
+``cache_stats`` JSON view. ``askbot.middleware.cache_stats.CacheStatsMiddleware``
+logs a per-request summary.
+"""
+import pickle
+import re
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings as django_settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.utils.module_loading import import_string
+from askbot.utils.cache import MISS
+
+STATS_KEY_PREFIX = 'askbot-cache-stats:'
+FAMILIES_KEY = 'askbot-cache-stats-families'
+
+#counters stored per family, times are in microseconds
+METRICS = ('hits', 'misses', 'sets', 'set_bytes', 'deletes', 'get_us', 'set_us')
+
+#(family, regex matched at the start of the key), first match wins
+KEY_FAMILIES = (
+    ('page', r'views\.decorators\.cache\.'),
+    ('thread-summary', r'thread-question-summary-'),
+    ('thread-data', r'thread-\d+:[^:]+:thread-data-'),
+    ('similar-threads', r'similar-threads-'),
+    ('namespace-version', r'askbot-cache-ns:'),
+    ('settings', r'askbot-settings'),
+    ('profiles', r'(localized-)?askbot-profile-'),
+    ('global-group', r'askbot-global-group'),
+    ('avatars', r'askbot-avatar-block-data'),
+    ('local-cache-generation', r'askbot-local-cache-generation:'),
+    ('ratelimit', r'rl:'), # django-ratelimit buckets
+    ('analytics-sessions', r'askbot-analytics-session:'),
+    ('locks', r'.*:lock$'),
+)
+
+
+def get_key_families():
+    """returns list of (family, compiled regex), the families from
+    the ``ASKBOT_CACHE_KEY_FAMILIES`` setting take precedence"""
+    families = list(django_settings.ASKBOT_CACHE_KEY_FAMILIES) + list(KEY_FAMILIES)
+    return [(name, re.compile(pattern)) for name, pattern in families]
+
+
+def classify_key(key, families=None):
+    """returns name of the family of the cache key"""
+    for name, regex in families or get_key_families():
+        if regex.match(key):
+            return name
+    return 'other'
+
+
+def get_value_size(value):
+    """returns size of the pickled value in bytes,
+    approximately what is sent to the cache server"""
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return 0
+
+
+def get_stats_storage():
+    """returns the wrapped backend of the first instrumented cache,
+    where the totals are stored, or ``None``"""
+    for alias, params in django_settings.CACHES.items():
+        if params.get('BACKEND') == 'askbot.utils.cache_stats.InstrumentedCache':
+            return caches[alias].backend
+    return None
+
+
+def increment(backend, key, delta):
+    """adds ``delta`` to the counter stored in the cache"""
+    try:
+        backend.incr(key, delta)
+    except ValueError:
+        if not backend.add(key, delta, timeout=None):
+            backend.incr(key, delta)
+
+
+class CacheStats(object):
+    """Counters of the cache calls by key family.
+
+    The process totals are kept until flushed to the cache,
+    the per-request counters are collected between
+    ``start_request`` and ``end_request`` in the current thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = self.get_empty_counters()
+        self.flushed_at = time.monotonic()
+        self.request = threading.local()
+
+    @classmethod
+    def get_empty_counters(cls):
+        """returns family -> metric -> int mapping"""
+        return defaultdict(lambda: defaultdict(int))
+
+    def record(self, family, **metrics):
+        """adds the metrics to the counters of the family"""
+        with self.lock:
+            counters = self.counters[family]
+            for name, value in metrics.items():
+                counters[name] += value
+
+        request_counters = getattr(self.request, 'counters', None)
+        if request_counters is not None:
+            counters = request_counters[family]
+            for name, value in metrics.items():
+                counters[name] += value
+
+    def start_request(self):
+        """starts collecting the per-request counters"""
+        self.request.counters = self.get_empty_counters()
+
+    def end_request(self):
+        """stops collecting the per-request counters and returns them"""
+        counters = getattr(self.request, 'counters', None)
+        self.request.counters = None
+        return format_stats(counters or {})
+
+    def peek_request(self):
+        """returns the per-request counters collected so far"""
+        return format_stats(getattr(self.request, 'counters', None) or {})
+
+    def is_flush_due(self):
+        """True if the counters were not flushed for a while"""
+        interval = django_settings.ASKBOT_CACHE_STATS_FLUSH_INTERVAL
+        return time.monotonic() - self.flushed_at >= interval
+
+    def flush(self, storage=None):
+        """adds the process counters to the totals stored in the cache"""
+        storage = storage or get_stats_storage()
+        with self.lock:
+            counters = self.counters
+            self.counters = self.get_empty_counters()
+            self.flushed_at = time.monotonic()
+
+        if storage is None or not counters:
+            return
+
+        known_families = set(storage.get(FAMILIES_KEY) or ())
+        if not set(counters) <= known_families:
+            storage.set(FAMILIES_KEY, sorted(known_families | set(counters)), timeout=None)
+
+        for family, metrics in counters.items():
+            for name, value in metrics.items():
+                if value:
+                    increment(storage, STATS_KEY_PREFIX + family + ':' + name, int(value))
+
+    def get_totals(self, storage=None):
+        """returns totals of all processes, including the unflushed
+        counters of the current process"""
+        storage = storage or get_stats_storage()
+        if storage is None:
+            return {}
+        self.flush(storage)
+        families = storage.get(FAMILIES_KEY) or ()
+        keys = [STATS_KEY_PREFIX + family + ':' + name
+                for family in families for name in METRICS]
+        values = storage.get_many(keys)
+        counters = self.get_empty_counters()
+        for family in families:
+            for name in METRICS:
+                counters[family][name] = values.get(STATS_KEY_PREFIX + family + ':' + name, 0)
+        return format_stats(counters)
+
+    def reset(self, storage=None):
+        """deletes the stored totals and the process counters"""
+        storage = storage or get_stats_storage()
+        with self.lock:
+            self.counters = self.get_empty_counters()
+        if storage is None:
+            return
+        families = storage.get(FAMILIES_KEY) or ()
+        keys = [STATS_KEY_PREFIX + family + ':' + name
+                for family in families for name in METRICS]
+        storage.delete_many(keys + [FAMILIES_KEY])
+
+
+def format_stats(counters):
+    """returns dictionary family -> stats,
+    with the hit rate and the average sizes and latencies"""
+    result = dict()
+    for family, metrics in sorted(counters.items()):
+        reads = metrics['hits'] + metrics['misses']
+        sets = metrics['sets']
+        result[family] = {
+            'hits': metrics['hits'],
+            'misses': metrics['misses'],
+            'hit_rate': round(float(metrics['hits']) / reads, 3) if reads else None,
+            'sets': sets,
+            'set_bytes': metrics['set_bytes'],
+            'avg_set_bytes': metrics['set_bytes'] // sets if sets else None,
+            'deletes': metrics['deletes'],
+            'get_ms': round(metrics['get_us'] / 1000.0, 3),
+            'avg_get_ms': round(metrics['get_us'] / 1000.0 / reads, 3) if reads else None,
+            'set_ms': round(metrics['set_us'] / 1000.0, 3),
+        }
+    return result
+
+
+stats = CacheStats() # pylint: disable=invalid-name
+
+
+class InstrumentedCache(BaseCache):
+    """Cache backend recording the calls to the wrapped backend,
+    see the module docstring"""
+
+    def __init__(self, location, params):
+        params = dict(params)
+        options = dict(params.get('OPTIONS', {}))
+        backend_class = import_string(options.pop('BACKEND'))
+        params['OPTIONS'] = options
+        self.backend = backend_class(location, params)
+        super().__init__(params)
+        self.default_timeout = self.backend.default_timeout
+
+    def record_reads(self, keys, found, duration):
+        """records hits and misses of the read keys"""
+        families = get_key_families()
+        duration_us = duration * 1000000 / max(len(keys), 1)
+        for key in keys:
+            family = classify_key(key, families)
+            if key in found:
+                stats.record(family, hits=1, get_us=duration_us)
+            else:
+                stats.record(family, misses=1, get_us=duration_us)
+        self.flush_if_due()
+
+    def record_writes(self, data, duration):
+        """records the written values, ``data`` is a dictionary"""
+        families = get_key_families()
+        duration_us = duration * 1000000 / max(len(data), 1)
+        for key, value in data.items():
+            stats.record(classify_key(key, families), sets=1,
+                         set_bytes=get_value_size(value), set_us=duration_us)
+        self.flush_if_due()
+
+    def record_deletes(self, keys, duration):
+        """records the deleted keys"""
+        families = get_key_families()
+        duration_us = duration * 1000000 / max(len(keys), 1)
+        for key in keys:
+            stats.record(classify_key(key, families), deletes=1, set_us=duration_us)
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        """periodically adds the process counters to the stored totals"""
+        if stats.is_flush_due():
+            stats.flush()
+
+    def get(self, key, default=None, version=None):
+        start = time.perf_counter()
+        value = self.backend.get(key, MISS, version=version)
+        found = () if value is MISS else (key,)
+        self.record_reads((key,), found, time.perf_counter() - start)
+        return default if value is MISS else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        start = time.perf_counter()
+        values = self.backend.get_many(keys, version=version)
+        self.record_reads(keys, values, time.perf_counter() - start)
+        return values
+
+    def has_key(self, key, version=None):
+        start = time.perf_counter()
+        result = self.backend.has_key(key, version=version)
+        self.record_reads((key,), (key,) if result else (), time.perf_counter() - start)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        start = time.perf_counter()
+        result = self.backend.set(key, value, timeout=timeout, version=version)
+        self.record_writes({key: value}, time.perf_counter() - start)
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        start = time.perf_counter()
+        result = self.backend.add(key, value, timeout=timeout, version=version)
+        self.record_writes({key: value}, time.perf_counter() - start)
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        start = time.perf_counter()
+        result = self.backend.set_many(data, timeout=timeout, version=version)
+        self.record_writes(data, time.perf_counter() - start)
+        return result
+
+    def delete(self, key, version=None):
+        start = time.perf_counter()
+        result = self.backend.delete(key, version=version)
+        self.record_deletes((key,), time.perf_counter() - start)
+        return result
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        start = time.perf_counter()
+        result = self.backend.delete_many(keys, version=version)
+        self.record_deletes(keys, time.perf_counter() - start)
+        return result
+
+    def incr(self, key, delta=1, version=None):
+        start = time.perf_counter()
+        result = self.backend.incr(key, delta, version=version)
+        self.record_writes({key: result}, time.perf_counter() - start)
+        return result
+
+    def decr(self, key, delta=1, version=None):
+        start = time.perf_counter()
+        result = self.backend.decr(key, delta, version=version)
+        self.record_writes({key: result}, time.perf_counter() - start)
+        return result
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.backend.touch(key, timeout=timeout, version=version)
+
+    def make_key(self, key, version=None):
+        return self.backend.make_key(key, version=version)
+
+    def validate_key(self, key):
+        return self.backend.validate_key(key)
+
+    def clear(self):
+        return self.backend.clear()
+
+    def close(self, **kwargs):
+        return self.backend.close(**kwargs)
+
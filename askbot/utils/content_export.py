@@ -0,0 +1,184 @@
+"""Export of the public forum content as newline-delimited JSON.
+
+Each line is a JSON object with the ``type`` of the record:
+``thread``, ``post`` (questions, answers and comments), ``revision``
+and ``tag``. Deleted threads and posts are exported as
+``{"type": "thread", "id": ..., "deleted": true}`` (or ``"post"``).
+The posts of the deleted, unapproved and private threads and the
+comments of the deleted posts are not exported. The last line has type
+``watermark``, its ``updated_since`` value is passed to the next export
+to get only the content added or changed after the start of this one.
+
+The rows are read with ``iterator(chunk_size=...)`` (server-side
+cursors on PostgreSQL) as dictionaries, so the memory use does not
+depend on the size of the forum. Used by the ``/api/v1/export/``
+endpoint and the ``askbot_export_content`` management command.
+"""
+import datetime
+import json
+from django.contrib.auth.models import AnonymousUser
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from askbot.conf import settings as askbot_settings
+from askbot.models import Post, PostRevision, Tag, Thread
+
+EXPORT_TYPES = ('threads', 'posts', 'revisions', 'tags')
+EXPORTED_POST_TYPES = ('question', 'answer', 'comment')
+DEFAULT_CHUNK_SIZE = 1000
+
+THREAD_FIELDS = ('id', 'title', 'tagnames', 'language_code', 'added_at',
+                 'last_activity_at', 'last_activity_by_id', 'answer_count',
+                 'view_count', 'points', 'closed', 'closed_at',
+                 'accepted_answer_id')
+POST_FIELDS = ('id', 'post_type', 'thread_id', 'parent_id', 'author_id',
+               'added_at', 'last_edited_at', 'points', 'text', 'html',
+               'language_code')
+REVISION_FIELDS = ('id', 'post_id', 'revision', 'author_id', 'revised_at',
+                   'summary', 'title', 'tagnames', 'text')
+TAG_FIELDS = ('id', 'name', 'language_code', 'used_count')
+RENAMED_FIELDS = {'points': 'score', 'tagnames': 'tags'}
+
+
+def parse_updated_since(value):
+    """Returns aware datetime from ISO 8601 string or
+    the number of seconds since the epoch, ``None`` for empty value.
+    Raises ``ValueError`` if the value cannot be parsed."""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromtimestamp(float(value), tz=datetime.timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        pass # not a number
+    updated_since = parse_datetime(value)
+    if updated_since is None:
+        raise ValueError(f'Invalid date and time: {value}')
+    if timezone.is_naive(updated_since):
+        updated_since = timezone.make_aware(updated_since, datetime.timezone.utc)
+    return updated_since
+
+
+def get_record(record_type, row):
+    """returns the exported record from the ``values()`` row"""
+    record = {'type': record_type}
+    for field, value in row.items():
+        if field == 'tagnames':
+            value = value.strip().split()
+        record[RENAMED_FIELDS.get(field, field)] = value
+    return record
+
+
+def get_visible_threads():
+    """returns query set of the threads visible to the anonymous users"""
+    threads = Thread.objects.filter(deleted=False)
+    if askbot_settings.CONTENT_MODERATION_MODE == 'premoderation':
+        threads = threads.filter(approved=True)
+    if askbot_settings.GROUPS_ENABLED:
+        threads = threads.get_visible(AnonymousUser())
+    return threads
+
+
+def get_public_posts():
+    """returns query set of the posts visible to the anonymous users
+    by their own flags and groups, regardless of their threads"""
+    posts = Post.objects.filter(post_type__in=EXPORTED_POST_TYPES)
+    if askbot_settings.CONTENT_MODERATION_MODE == 'premoderation':
+        posts = posts.filter(approved=True)
+    return posts.get_for_user(None)
+
+
+def get_visible_posts():
+    """returns query set of the posts visible to the anonymous users,
+    in the visible threads, without the comments of the deleted posts"""
+    posts = get_public_posts()
+    if askbot_settings.GROUPS_ENABLED:
+        posts = posts.filter(thread__in=get_visible_threads().values('id'))
+    else:
+        posts = posts.filter(thread__deleted=False)
+        if askbot_settings.CONTENT_MODERATION_MODE == 'premoderation':
+            posts = posts.filter(thread__approved=True)
+    return posts.exclude(post_type='comment', parent__deleted=True)
+
+
+def get_threads(updated_since):
+    """returns query set of the visible threads, active since the time"""
+    threads = get_visible_threads()
+    if updated_since:
+        threads = threads.filter(last_activity_at__gte=updated_since)
+    return threads.values(*THREAD_FIELDS)
+
+
+def get_deleted_threads(updated_since):
+    """returns query set of ids of the threads
+    whose questions were deleted since the time"""
+    threads = Thread.objects.filter(deleted=True, posts__post_type='question',
+                                    posts__deleted_at__gte=updated_since)
+    return threads.values('id').distinct()
+
+
+def get_posts(updated_since):
+    """returns query set of the visible posts, added or edited since the time"""
+    posts = get_visible_posts().filter(deleted=False)
+    if updated_since:
+        posts = posts.filter(Q(added_at__gte=updated_since) |
+                             Q(last_edited_at__gte=updated_since))
+    return posts.values(*POST_FIELDS)
+
+
+def get_deleted_posts(updated_since):
+    """returns query set of ids of the posts deleted since the time"""
+    posts = get_public_posts().filter(deleted=True, deleted_at__gte=updated_since)
+    return posts.values('id')
+
+
+def get_revisions(updated_since):
+    """returns query set of the revisions of the visible posts, made since the time"""
+    revisions = PostRevision.objects.filter(
+        post__in=get_visible_posts().filter(deleted=False).values('id')
+    )
+    if askbot_settings.CONTENT_MODERATION_MODE == 'premoderation':
+        revisions = revisions.filter(approved=True)
+    if updated_since:
+        revisions = revisions.filter(revised_at__gte=updated_since)
+    return revisions.values(*REVISION_FIELDS)
+
+
+def get_tags():
+    """returns query set of the used tags, the tags
+    have no timestamps and are exported in full"""
+    tags = Tag.objects.filter(deleted=False, status=Tag.STATUS_ACCEPTED, used_count__gt=0)
+    return tags.values(*TAG_FIELDS)
+
+
+def iter_records(updated_since=None, types=EXPORT_TYPES, chunk_size=DEFAULT_CHUNK_SIZE):
+    """yields the exported records as dictionaries,
+    the last one is the watermark for the next export"""
+    started_at = timezone.now()
+    if 'threads' in types:
+        for row in get_threads(updated_since).order_by('id').iterator(chunk_size=chunk_size):
+            yield get_record('thread', row)
+        if updated_since:
+            deleted_threads = get_deleted_threads(updated_since).order_by('id')
+            for row in deleted_threads.iterator(chunk_size=chunk_size):
+                yield {'type': 'thread', 'id': row['id'], 'deleted': True}
+    if 'posts' in types:
+        for row in get_posts(updated_since).order_by('id').iterator(chunk_size=chunk_size):
+            yield get_record('post', row)
+        if updated_since:
+            deleted_posts = get_deleted_posts(updated_since).order_by('id')
+            for row in deleted_posts.iterator(chunk_size=chunk_size):
+                yield {'type': 'post', 'id': row['id'], 'deleted': True}
+    if 'revisions' in types:
+        for row in get_revisions(updated_since).order_by('id').iterator(chunk_size=chunk_size):
+            yield get_record('revision', row)
+    if 'tags' in types:
+        for row in get_tags().order_by('id').iterator(chunk_size=chunk_size):
+            yield get_record('tag', row)
+    yield {'type': 'watermark', 'updated_since': started_at}
+
+
+def iter_lines(updated_since=None, types=EXPORT_TYPES, chunk_size=DEFAULT_CHUNK_SIZE):
+    """yields the exported records as lines of JSON"""
+    for record in iter_records(updated_since, types, chunk_size):
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
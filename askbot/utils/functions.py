@@ -261,9 +261,12 @@ def setup_paginator(context):
                 "pages_outside_trailing_range": pages_outside_trailing_range}
 
 
-def get_paginated_list(request, objects, page_size, search_params=None):
-    """Returns paginated objects and the paginator context"""
+def get_paginated_list(request, objects, page_size, search_params=None, count=None):
+    """Returns paginated objects and the paginator context,
+    ``count`` - the number of the objects, if known"""
     paginator = Paginator(objects, page_size)
+    if count is not None:
+        paginator.count = count # replaces the cached property, skips the count query
     from askbot.forms import PageField
     page_no = PageField().clean(request.GET.get('page'))
 
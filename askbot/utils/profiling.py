@@ -0,0 +1,102 @@
+"""Per-request profiling
+
+``RequestProfile`` collects the SQL queries (with their normalized
+"fingerprints", to spot the repeated queries of the N+1 problems),
+the time spent in the database and in the template rendering.
+Profiles are started by ``askbot.middleware.profiling.ProfilingMiddleware``,
+the requests over the thresholds are logged as JSON objects by the
+``askbot.profiling`` logger and the log is summarized by the
+``askbot_profiling_report`` management command.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.db import connections
+
+#the profile of the request being processed in the current thread
+current = threading.local() # pylint: disable=invalid-name
+
+QUOTED_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+
+def get_fingerprint(sql):
+    """returns the query with the literals and the variable
+    length ``IN`` lists replaced by placeholders"""
+    sql = QUOTED_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def get_current_profile():
+    """returns the profile active in the current thread or ``None``"""
+    return getattr(current, 'profile', None)
+
+
+def record_template_render(duration):
+    """adds the render time to the active profile, if any"""
+    profile = get_current_profile()
+    if profile is not None:
+        profile.template_time += duration
+
+
+class RequestProfile(object):
+    """Collects the database queries and the template render time
+    while used as a context manager"""
+
+    def __init__(self):
+        self.queries = list() # (fingerprint, duration)
+        self.template_time = 0
+        self.started_at = None
+        self.duration = None
+        self.exit_stack = None
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        self.exit_stack = ExitStack()
+        for connection in connections.all():
+            self.exit_stack.enter_context(connection.execute_wrapper(self.record_query))
+        current.profile = self
+        return self
+
+    def __exit__(self, *args):
+        current.profile = None
+        self.exit_stack.close()
+        self.duration = time.perf_counter() - self.started_at
+
+    def record_query(self, execute, sql, params, many, context): # pylint: disable=too-many-arguments
+        """``execute_wrapper`` of the database connections"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((get_fingerprint(sql), time.perf_counter() - start))
+
+    @property
+    def sql_time(self):
+        """total time of the queries in seconds"""
+        return sum(duration for _, duration in self.queries)
+
+    def get_duplicates(self, min_count=2):
+        """returns list of (fingerprint, count) of the queries
+        repeated at least ``min_count`` times, most repeated first"""
+        counts = Counter(fingerprint for fingerprint, _ in self.queries)
+        return [(fingerprint, count) for fingerprint, count in counts.most_common()
+                if count >= min_count]
+
+    def get_summary(self):
+        """returns dictionary with the collected numbers,
+        times are in milliseconds"""
+        return {
+            'duration_ms': round(self.duration * 1000, 1),
+            'queries': len(self.queries),
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'duplicate_queries': [{'fingerprint': fingerprint, 'count': count}
+                                  for fingerprint, count in self.get_duplicates()],
+            'template_ms': round(self.template_time * 1000, 1),
+        }
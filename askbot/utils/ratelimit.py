@@ -22,10 +22,16 @@ limited surface = adding one entry to ``_POLICIES`` + a matching pair
 of settings.
 """
 import functools
+import hashlib
 import ipaddress
 import logging
+import math
+import threading
+import time
+from collections import OrderedDict
 
 from django.conf import settings
+from django.core.cache import caches
 from django.http import HttpResponse, JsonResponse
 from django.template.loader import render_to_string
 from django.urls import URLPattern, URLResolver
@@ -183,36 +189,95 @@ def subnet_ip_key(group, request):
     return str(ipaddress.ip_network(f'{addr}/{prefix}', strict=False))
 
 
-def _get_allowlist_networks():
-    """Return the union of parsed allowlist networks.
-
-    Sources: the ``ASKBOT_INTERNAL_IPS`` django setting (deploy-time)
-    and the ``RATE_LIMIT_IP_ALLOWLIST`` livesetting (runtime). Plain
-    IPs are auto-promoted to /32 or /128 by ``ip_network`` natively,
-    so existing ``ASKBOT_INTERNAL_IPS=['10.0.0.1']`` deployments
-    continue to work. Invalid entries log at WARNING and are skipped
-    — a typo in admin config never raises.
+class IpNetworkMatcher:
+    """Compiled prefix trie answering "is the address in any of
+    these networks?" for IPv4 and IPv6 at once.
 
-    No ``request`` parameter and no per-request cache: parsing two
-    short lists per request is cheaper than the bookkeeping a cache
-    would require.
+    One trie per address family, eight bits per level: a lookup is at
+    most 4 (IPv4) or 16 (IPv6) dict reads however long the network
+    list is. A prefix not on a byte boundary is expanded into the
+    byte values it covers on its last level (``/22`` → four entries),
+    ``True`` marks a covered subtree. Build once per change of the
+    network list, see ``_get_compiled_matcher``.
     """
-    networks = []
-    raw_entries = []
+    _BITS = {4: 32, 6: 128}
+
+    def __init__(self, networks=()):
+        self.roots = {4: {}, 6: {}}
+        self.match_all = {4: False, 6: False}
+        for network in networks:
+            self.add(network)
+
+    def add(self, network):
+        """Add an ``ipaddress.ip_network`` to the trie."""
+        version = network.version
+        prefix_len = network.prefixlen
+        if prefix_len == 0:
+            self.match_all[version] = True
+            return
+        bits = self._BITS[version]
+        value = int(network.network_address)
+        levels = -(-prefix_len // 8)
+        node = self.roots[version]
+        for level in range(1, levels):
+            byte = (value >> (bits - 8 * level)) & 0xff
+            child = node.get(byte)
+            if child is True:
+                # a shorter prefix covers this network already
+                return
+            if child is None:
+                child = node[byte] = {}
+            node = child
+        byte = (value >> (bits - 8 * levels)) & 0xff
+        for covered in range(byte, byte + (1 << (8 * levels - prefix_len))):
+            node[covered] = True
+
+    def __contains__(self, addr):
+        """True iff the ``ipaddress.ip_address`` is in any network."""
+        version = addr.version
+        if self.match_all[version]:
+            return True
+        value = int(addr)
+        node = self.roots[version]
+        for shift in range(self._BITS[version] - 8, -8, -8):
+            node = node.get((value >> shift) & 0xff)
+            if node is None:
+                return False
+            if node is True:
+                return True
+        return False
 
-    internal_ips = getattr(settings, 'ASKBOT_INTERNAL_IPS', None) or []
-    raw_entries.extend(internal_ips)
 
-    livesetting_entries = getattr(
-        askbot_settings, 'RATE_LIMIT_IP_ALLOWLIST', None
-    ) or []
-    raw_entries.extend(livesetting_entries)
+# name -> (entries, IpNetworkMatcher) of the last compiled network list
+_compiled_matchers = {}
+
+
+def _get_compiled_matcher(name, entries, description):
+    """Return the ``IpNetworkMatcher`` of the raw ``entries``,
+    compiled again only when the entries change. Invalid entries
+    are therefore logged once per change, not once per request."""
+    key = tuple(entry if isinstance(entry, str) else repr(entry) for entry in entries)
+    compiled = _compiled_matchers.get(name)
+    if compiled is None or compiled[0] != key:
+        compiled = (key, IpNetworkMatcher(_parse_networks(entries, description)))
+        _compiled_matchers[name] = compiled
+    return compiled[1]
+
 
-    for entry in raw_entries:
+def _parse_networks(entries, description):
+    """Parse the allowlist-style ``entries`` into networks.
+
+    Plain IPs are auto-promoted to /32 or /128 by ``ip_network``
+    natively, host bits are masked (``strict=False``). Invalid entries
+    log at WARNING and are skipped — a typo in admin config never
+    raises.
+    """
+    networks = []
+    for entry in entries:
         if not isinstance(entry, str):
             logger.warning(
-                'Invalid rate-limit allowlist entry %r (not a string), skipping.',
-                entry,
+                'Invalid %s entry %r (not a string), skipping.',
+                description, entry,
             )
             continue
         cleaned = entry.strip()
@@ -222,12 +287,45 @@ def _get_allowlist_networks():
             networks.append(ipaddress.ip_network(cleaned, strict=False))
         except ValueError:
             logger.warning(
-                'Invalid rate-limit allowlist entry %r, skipping.',
-                cleaned,
+                'Invalid %s entry %r, skipping.',
+                description, cleaned,
             )
     return networks
 
 
+def _get_allowlist_entries():
+    """Raw allowlist entries: the ``ASKBOT_INTERNAL_IPS`` django
+    setting (deploy-time) and the ``RATE_LIMIT_IP_ALLOWLIST``
+    livesetting (runtime)."""
+    raw_entries = list(getattr(settings, 'ASKBOT_INTERNAL_IPS', None) or [])
+    raw_entries.extend(
+        getattr(askbot_settings, 'RATE_LIMIT_IP_ALLOWLIST', None) or []
+    )
+    return raw_entries
+
+
+def _get_allowlist_networks():
+    """Return the union of parsed allowlist networks.
+
+    Sources: see ``_get_allowlist_entries``. So existing
+    ``ASKBOT_INTERNAL_IPS=['10.0.0.1']`` deployments continue to work.
+    ``is_allowlisted`` uses the compiled form of the same list.
+    """
+    return _parse_networks(_get_allowlist_entries(), 'rate-limit allowlist')
+
+
+def _normalize_ip(raw):
+    """Parse the IP string, IPv4-mapped IPv6 addresses become IPv4.
+    Returns ``None`` on unparseable input."""
+    try:
+        addr = ipaddress.ip_address(raw)
+    except ValueError:
+        return None
+    if isinstance(addr, ipaddress.IPv6Address) and addr.ipv4_mapped:
+        addr = addr.ipv4_mapped
+    return addr
+
+
 def is_allowlisted(request):
     """True iff the request's client IP matches any allowlist entry.
 
@@ -243,19 +341,13 @@ def is_allowlisted(request):
     raw = resolve_request_ip(request)
     if not raw:
         return False
-
-    try:
-        addr = ipaddress.ip_address(raw)
-    except ValueError:
+    addr = _normalize_ip(raw)
+    if addr is None:
         return False
-
-    if isinstance(addr, ipaddress.IPv6Address) and addr.ipv4_mapped:
-        addr = addr.ipv4_mapped
-
-    for network in _get_allowlist_networks():
-        if addr in network:
-            return True
-    return False
+    matcher = _get_compiled_matcher(
+        'allowlist', _get_allowlist_entries(), 'rate-limit allowlist',
+    )
+    return addr in matcher
 
 
 def is_high_rep_exempt(request):
@@ -284,35 +376,15 @@ def is_high_rep_exempt(request):
 def get_internal_ip_networks():
     """Parsed networks from the ASKBOT_INTERNAL_IPS django setting only.
 
-    Mirrors _get_allowlist_networks's parsing (plain IPs auto-promoted
+    Same parsing as _get_allowlist_networks (plain IPs auto-promoted
     to /32 or /128, invalid entries logged at WARNING and skipped) but
     excludes the RATE_LIMIT_IP_ALLOWLIST livesetting — closed-forum-mode
     bypass is a deploy-time-only concern. The setting may be a list or
     tuple of strings (intranet-setup.rst documents it as a tuple);
     iteration handles both.
     """
-    networks = []
     internal_ips = getattr(settings, 'ASKBOT_INTERNAL_IPS', None) or []
-    for entry in internal_ips:
-        if not isinstance(entry, str):
-            logger.warning(
-                'Invalid ASKBOT_INTERNAL_IPS entry %r (not a string), skipping.',
-                entry,
-            )
-            continue
-        cleaned = entry.strip()
-        if not cleaned:
-            continue
-        try:
-            # strict=False masks host bits so the IP buckets to its containing
-            # network (1.2.3.4/24 -> 1.2.3.0/24) instead of raising.
-            networks.append(ipaddress.ip_network(cleaned, strict=False))
-        except ValueError:
-            logger.warning(
-                'Invalid ASKBOT_INTERNAL_IPS entry %r, skipping.',
-                cleaned,
-            )
-    return networks
+    return _parse_networks(internal_ips, 'ASKBOT_INTERNAL_IPS')
 
 
 def is_internal_ip(raw_ip):
@@ -332,16 +404,14 @@ def is_internal_ip(raw_ip):
     """
     if not raw_ip:
         return False
-    try:
-        addr = ipaddress.ip_address(raw_ip)
-    except ValueError:
+    addr = _normalize_ip(raw_ip)
+    if addr is None:
         return False
-    if isinstance(addr, ipaddress.IPv6Address) and addr.ipv4_mapped:
-        addr = addr.ipv4_mapped
-    for network in get_internal_ip_networks():
-        if addr in network:
-            return True
-    return False
+    internal_ips = getattr(settings, 'ASKBOT_INTERNAL_IPS', None) or []
+    matcher = _get_compiled_matcher(
+        'internal', internal_ips, 'ASKBOT_INTERNAL_IPS',
+    )
+    return addr in matcher
 
 
 # Policy table: policy name -> (enabled_setting, rate_setting, window_seconds).
@@ -385,6 +455,162 @@ _POLICIES = {
 }
 
 
+# Upper bound on the number of (group, key) buckets one process keeps
+# in memory for the local-bucket mode. Least recently used buckets are
+# dropped first; a dropped bucket only costs one extra cache round trip.
+_LOCAL_BUCKETS_MAX = 10000
+
+
+class _LocalBucket:
+    """Tokens leased from the shared counter for one window of one key."""
+    __slots__ = ('window_index', 'tokens', 'previous_count', 'limited_until')
+
+    def __init__(self, window_index):
+        self.window_index = window_index
+        self.tokens = 0
+        self.previous_count = None
+        self.limited_until = None
+
+
+class LocalBucketLimiter:
+    """Counts requests in per-process token buckets leased from the
+    shared rate-limit cache.
+
+    Enabled by either of two django settings (both off by default, in
+    which case ``_is_over_limit`` keeps calling ``is_ratelimited``):
+
+    * ``ASKBOT_RATELIMIT_LOCAL_TOLERANCE`` — fraction of the max count
+      a process leases from the shared counter in one ``incr`` call.
+      The leased tokens are then spent locally with no cache round
+      trip, so a client far below its limit costs one round trip per
+      ``ceil(max_count * tolerance)`` requests instead of one per
+      request. Leased-but-unspent tokens count as used, so the error
+      is one-sided: a client may be limited early by at most
+      ``(workers - 1) * lease`` requests, never admitted over the
+      limit. ``0`` leases one token at a time (exact counting).
+      A rejected client is remembered locally until it may pass again,
+      so its further requests are rejected with no round trip and are
+      not counted.
+    * ``ASKBOT_RATELIMIT_WINDOW`` — ``'fixed'`` (the django-ratelimit
+      semantics) or ``'sliding'``: the count of the previous window is
+      weighted by the part of it still inside the sliding window, so
+      a client cannot fit two full bursts around a window boundary.
+
+    Counters live in the ``RATELIMIT_USE_CACHE`` cache under the
+    ``RATELIMIT_CACHE_PREFIX`` prefix, ``RATELIMIT_ENABLE`` and
+    ``RATELIMIT_FAIL_OPEN`` are honored like in django-ratelimit.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    @staticmethod
+    def is_enabled():
+        """True iff either local-bucket setting is not at its default."""
+        return bool(getattr(settings, 'ASKBOT_RATELIMIT_LOCAL_TOLERANCE', 0)) \
+            or getattr(settings, 'ASKBOT_RATELIMIT_WINDOW', 'fixed') == 'sliding'
+
+    @staticmethod
+    def get_cache_key(group, value, window_index):
+        """Shared counter key; the key value is hashed because subnet
+        strings contain characters memcached rejects."""
+        prefix = getattr(settings, 'RATELIMIT_CACHE_PREFIX', 'rl:')
+        digest = hashlib.md5(value.encode('utf-8')).hexdigest()
+        return f'{prefix}askbot:{group}:{digest}:{window_index}'
+
+    def get_bucket(self, bucket_key, window_index):
+        """Return the bucket for the current window, must hold the lock."""
+        bucket = self.buckets.get(bucket_key)
+        if bucket is None or bucket.window_index != window_index:
+            bucket = _LocalBucket(window_index)
+            self.buckets[bucket_key] = bucket
+        self.buckets.move_to_end(bucket_key)
+        while len(self.buckets) > _LOCAL_BUCKETS_MAX:
+            self.buckets.popitem(last=False)
+        return bucket
+
+    def consume(self, group, value, max_count, window_seconds):
+        """Spend one token, True iff the request is over the limit."""
+        now = time.time()
+        window_index = int(now // window_seconds)
+        bucket_key = (group, value)
+        with self.lock:
+            bucket = self.get_bucket(bucket_key, window_index)
+            if bucket.tokens > 0:
+                bucket.tokens -= 1
+                return False
+            if bucket.limited_until is not None and now < bucket.limited_until:
+                # rejected without a cache round trip
+                return True
+
+        tolerance = getattr(settings, 'ASKBOT_RATELIMIT_LOCAL_TOLERANCE', 0)
+        lease = max(1, int(math.ceil(max_count * tolerance)))
+        cache = caches[getattr(settings, 'RATELIMIT_USE_CACHE', 'default')]
+        key = self.get_cache_key(group, value, window_index)
+        try:
+            # counters outlive their window by one more window,
+            # the sliding mode reads the previous one
+            if cache.add(key, lease, 2 * window_seconds):
+                count = lease
+            else:
+                count = cache.incr(key, lease)
+        except ValueError:
+            count = None
+        if count is None:
+            # same fail-closed default as django-ratelimit
+            return not getattr(settings, 'RATELIMIT_FAIL_OPEN', False)
+
+        used = count - lease
+        sliding = getattr(settings, 'ASKBOT_RATELIMIT_WINDOW', 'fixed') == 'sliding'
+        if sliding:
+            if bucket.previous_count is None:
+                previous_key = self.get_cache_key(group, value, window_index - 1)
+                bucket.previous_count = cache.get(previous_key, 0)
+            elapsed = now / window_seconds - window_index
+            used += bucket.previous_count * (1 - elapsed)
+
+        available = int(max_count - used)
+        if available <= 0:
+            # count the rejected request once, not the whole lease
+            if lease > 1:
+                try:
+                    cache.decr(key, lease - 1)
+                except ValueError:
+                    pass
+            # the count only grows until the end of the window,
+            # in the sliding mode the previous window weighs less with time
+            limited_until = (window_index + 1) * window_seconds
+            if sliding and bucket.previous_count:
+                weight = (max_count - 1 - (count - lease)) / bucket.previous_count
+                if weight > 0:
+                    limited_until = min(limited_until,
+                                        (window_index + 1 - weight) * window_seconds)
+            with self.lock:
+                bucket.limited_until = limited_until
+            return True
+        with self.lock:
+            # this request spends one of the leased tokens
+            bucket.tokens += min(lease, available) - 1
+        return False
+
+
+_local_bucket_limiter = LocalBucketLimiter()
+
+
+def _is_over_local_limit(request, *, policy_spec, max_count):
+    """Local-bucket counterpart of the ``is_ratelimited`` call."""
+    if not getattr(settings, 'RATELIMIT_ENABLE', True):
+        return False
+    methods = policy_spec['methods']
+    if methods != _ALL_METHODS and request.method not in methods:
+        return False
+    value = policy_spec['key'](policy_spec['group'], request)
+    return _local_bucket_limiter.consume(
+        policy_spec['group'], value, max_count, policy_spec['window_seconds'],
+    )
+
+
 def _resolve_policy(policy):
     try:
         return _POLICIES[policy]
@@ -421,14 +647,19 @@ def _is_over_limit(request, *, policy, policy_spec):
     max_count = getattr(askbot_settings, policy_spec['rate_setting'])
     rate = f"{max_count}/{policy_spec['window_seconds']}s"
 
-    limited = is_ratelimited(
-        request,
-        group=policy_spec['group'],
-        key=policy_spec['key'],
-        rate=rate,
-        method=policy_spec['methods'],
-        increment=True,
-    )
+    if LocalBucketLimiter.is_enabled():
+        limited = _is_over_local_limit(
+            request, policy_spec=policy_spec, max_count=max_count,
+        )
+    else:
+        limited = is_ratelimited(
+            request,
+            group=policy_spec['group'],
+            key=policy_spec['key'],
+            rate=rate,
+            method=policy_spec['methods'],
+            increment=True,
+        )
     if limited:
         logger.warning(
             'askbot.ratelimit hit policy=%s ip=%s group=%s',
@@ -1,3 +1,4 @@
+import datetime
 from django.conf import settings as django_settings
 from django.shortcuts import render
 from django.http import HttpResponseRedirect, HttpResponseForbidden
@@ -20,6 +21,7 @@ from askbot.utils.analytics_utils import (
 )
 from askbot.views.analytics.utils import (
     get_date_selector_url_func,
+    get_events_count,
     filter_events_by_users_segment,
     filter_events_by_content_segment
 )
@@ -261,15 +263,19 @@ def analytics_activity(request, activity_segment=None, content_segment=None, use
     users_url_segment = form.cleaned_data['users_segment']
     start_date, end_date = form.cleaned_data['dates']
 
-    if end_date == timezone.now().date():
-        end_date = timezone.now()
-
-    events = Event.objects.filter(timestamp__gte=start_date, timestamp__lte=end_date)
-    events = events.order_by('-timestamp')
+    # both dates are included, the days start in the current time zone
+    start_time = timezone.make_aware(datetime.datetime.combine(start_date, datetime.time.min))
+    end_time = timezone.make_aware(datetime.datetime.combine(end_date + datetime.timedelta(days=1),
+                                                             datetime.time.min))
+    events = Event.objects.filter(timestamp__gte=start_time, timestamp__lt=end_time)
     events = filter_events_by_content_segment(events, content_segment)
     events = filter_events_by_users_segment(events, users_segment)
     events = events.filter(event_type__in=event_types)
-    events, paginator_context = get_paginated_list(request, events, 20)
+    events_count = get_events_count(events, start_date, end_date, event_types,
+                                    users_segment, content_segment)
+    events = events.select_related('session__user', 'content_type')
+    events = events.prefetch_related('content_object').order_by('-timestamp')
+    events, paginator_context = get_paginated_list(request, events, 20, count=events_count)
 
     data = {
         'Event': Event,
@@ -19,85 +19,95 @@ from askbot.models.analytics import (get_organizations_count,
                                      DailyUserSummary,
                                      Event)
 
-def get_aggregated_group_data(summaries):
-    if summaries.count() == 0:
-        return {
-            'num_users': 0,
-            'num_users_added': 0,
-            'num_questions': 0,
-            'num_answers': 0,
-            'num_upvotes': 0,
-            'num_downvotes': 0,
-            'question_views': 0,
-            'time_on_site': timedelta(seconds=0),
-        }
-
-    data = summaries.aggregate(
-        num_questions=models.Sum('num_questions'),
-        num_answers=models.Sum('num_answers'),
-        num_upvotes=models.Sum('num_upvotes'),
-        num_downvotes=models.Sum('num_downvotes'),
-        question_views=models.Sum('question_views'),
-        time_on_site=models.Sum('time_on_site'),
-        num_users_added=models.Sum('num_users_added')
-    )
+SUMMARY_SUMS = {
+    'num_users_added': models.Sum('num_users_added'),
+    'num_questions': models.Sum('num_questions'),
+    'num_answers': models.Sum('num_answers'),
+    'num_upvotes': models.Sum('num_upvotes'),
+    'num_downvotes': models.Sum('num_downvotes'),
+    'question_views': models.Sum('question_views'),
+    'time_on_site': models.Sum('time_on_site'),
+}
+
+
+def get_empty_group_data():
+    """Returns the summary fields of a group without summaries"""
+    return {
+        'num_users': 0,
+        'num_users_added': 0,
+        'num_questions': 0,
+        'num_answers': 0,
+        'num_upvotes': 0,
+        'num_downvotes': 0,
+        'question_views': 0,
+        'time_on_site': timedelta(seconds=0),
+    }
+
+
+def get_aggregated_group_data(group_data_items):
+    """Returns the sums of the summary fields of the groups"""
+    data = get_empty_group_data()
+    for group_data in group_data_items:
+        for field in SUMMARY_SUMS:
+            data[field] += group_data[field]
     return data
 
 
+def get_group_summary_sums(start_date, end_date):
+    """Returns dictionary group id -> sums of the daily group summaries
+    in the date range, the start date is excluded"""
+    summaries = DailyGroupSummary.objects.filter(date__gt=start_date, date__lte=end_date) # pylint: disable=no-member
+    summaries = summaries.values('group_id').annotate(**SUMMARY_SUMS).order_by()
+    return {summary.pop('group_id'): summary for summary in summaries}
+
+
+def get_num_users_in_groups_by_date(group_ids, date):
+    """Returns dictionary group id -> number of users in the group at a given date"""
+    latest_summaries = DailyGroupSummary.objects.filter(group_id=models.OuterRef('pk'), # pylint: disable=no-member
+                                                        date__lte=date).order_by('-date')
+    groups = Group.objects.filter(id__in=group_ids)
+    groups = groups.annotate(num_users=models.Subquery(latest_summaries.values('num_users')[:1]))
+    return {group_id: num_users or 0 for group_id, num_users in groups.values_list('id', 'num_users')}
+
+
 def get_total_users_in_groups_by_date(group_ids, date):
     """Returns total number of users in groups, specified by ids at a given date"""
-    total_users = 0
-    for group_id in group_ids:
-        named_segment_summaries = DailyGroupSummary.objects.filter(group__id=group_id) # pylint: disable=no-member
-        named_segment_summaries = named_segment_summaries.filter(date__lte=date)
-        latest_segment = named_segment_summaries.order_by('-date').first()
-        total_users += latest_segment.num_users if latest_segment else 0
-    return total_users
+    return sum(get_num_users_in_groups_by_date(group_ids, date).values())
 
 
-def non_routed_per_segment_stats(request, data):
-    """Renders the all users page"""
+def get_per_segment_stats(start_date, end_date):
+    """Returns the stats of all users, of the named segments and of the default segment"""
     default_segment_config = get_analytics_default_segment_config()
-    data.update({
-        'all_users_count': User.objects.exclude(askbot_profile__status='b').count(),
-        'default_segment_name': default_segment_config['name'],
-        'default_segment_description': default_segment_config['description'],
-    })
+    all_users_count = User.objects.exclude(askbot_profile__status='b').count()
 
     #1) get data for all users
     all_data = {
-        'num_users': data['all_users_count'],
-        'num_users_added': User.objects.filter(date_joined__gt=data['start_date'],
-                                               date_joined__lte=data['end_date']).count(),
+        'num_users': all_users_count,
+        'num_users_added': User.objects.filter(date_joined__gt=start_date,
+                                               date_joined__lte=end_date).count(),
         # remaining fields will be added as sum of all segments
         # symmetrically - for the default segment
         # we will obtain the above numbers by subtraction
     }
 
-    #2) get data for all named segments
-    named_segment_configs = django_settings.ASKBOT_ANALYTICS_NAMED_SEGMENTS
+    #2) get data for all named segments, from the sums per group
+    group_sums = get_group_summary_sums(start_date, end_date)
+    named_segment_group_ids = analytics_utils.get_all_named_segment_group_ids()
+    num_users_by_group = get_num_users_in_groups_by_date(named_segment_group_ids, end_date)
     named_segments_data = []
-    for segment_config in named_segment_configs:
+    for segment_config in django_settings.ASKBOT_ANALYTICS_NAMED_SEGMENTS:
         group_ids = segment_config['group_ids']
-        named_segment_summaries = DailyGroupSummary.objects.filter(group__id__in=group_ids) # pylint: disable=no-member
-        named_segment_summaries = named_segment_summaries.filter(date__lte=data['end_date'])
-        named_segment_summaries = named_segment_summaries.filter(date__gt=data['start_date'])
-
-        datum = get_aggregated_group_data(named_segment_summaries)
-        datum['num_users'] = get_total_users_in_groups_by_date(group_ids, data['end_date'])
+        datum = get_aggregated_group_data(group_sums[group_id] for group_id in group_ids
+                                          if group_id in group_sums)
+        datum['num_users'] = sum(num_users_by_group.get(group_id, 0) for group_id in group_ids)
         datum['slug'] = segment_config['slug']
         datum['name'] = segment_config['name']
         named_segments_data.append(datum)
 
-
-    #2) for the default segment, subtract the numbers for 2) from 1)
-    named_segment_group_ids = analytics_utils.get_all_named_segment_group_ids()
-    default_segment_summaries = DailyGroupSummary.objects.exclude( # pylint: disable=no-member
-                                    group__id__in=named_segment_group_ids)
-    default_segment_summaries = default_segment_summaries.filter(date__gt=data['start_date'],
-                                                                 date__lte=data['end_date'])
-
-    default_segment_data = get_aggregated_group_data(default_segment_summaries)
+    #3) for the default segment, subtract the numbers for 2) from 1)
+    default_segment_data = get_aggregated_group_data(
+        sums for group_id, sums in group_sums.items() if group_id not in named_segment_group_ids
+    )
     default_segment_data['slug'] = default_segment_config['slug']
     default_segment_data['name'] = default_segment_config['name']
     # here goes the symmetrical calculation of the missing fields - see step 1)
@@ -108,31 +118,31 @@ def non_routed_per_segment_stats(request, data):
     default_segment_data['num_users'] = all_data['num_users'] - named_segments_num_users
 
     # finally calculate the remaining fields for the all_data
-    all_data['num_questions'] = default_segment_data['num_questions'] + \
-                                sum(datum['num_questions'] for datum in named_segments_data)
-
-    all_data['num_answers'] = default_segment_data['num_answers'] + \
-                              sum(datum['num_answers'] for datum in named_segments_data)
-
-    all_data['num_upvotes'] = default_segment_data['num_upvotes'] + \
-                              sum(datum['num_upvotes'] for datum in named_segments_data)
-
-    all_data['num_downvotes'] = default_segment_data['num_downvotes'] + \
-                                sum(datum['num_downvotes'] for datum in named_segments_data)
-
-    all_data['question_views'] = default_segment_data['question_views'] + \
-                                 sum(datum['question_views'] for datum in named_segments_data)
+    for field in ('num_questions', 'num_answers', 'num_upvotes', 'num_downvotes',
+                  'question_views', 'time_on_site'):
+        all_data[field] = sum((datum[field] for datum in named_segments_data),
+                              start=default_segment_data[field])
+
+    return {
+        'all_users_count': all_users_count,
+        'all_data': all_data,
+        'named_segments_data': named_segments_data,
+        'default_segment_data': default_segment_data,
+    }
 
-    all_data['time_on_site'] = default_segment_data['time_on_site'] + \
-                               sum((datum['time_on_site'] for datum in named_segments_data),
-                                   start=timedelta(seconds=0))
 
-    data['all_data'] = all_data
-    data['named_segments_data'] = named_segments_data
-    data['default_segment_data'] = default_segment_data
+def non_routed_per_segment_stats(request, data):
+    """Renders the all users page"""
+    default_segment_config = get_analytics_default_segment_config()
+    data.update({
+        'default_segment_name': default_segment_config['name'],
+        'default_segment_description': default_segment_config['description'],
+    })
+    data.update(analytics_utils.get_cached_analytics(get_per_segment_stats,
+                                                     data['start_date'], data['end_date']))
 
     if django_settings.ASKBOT_ANALYTICS_EMAIL_DOMAIN_ORGANIZATIONS_ENABLED:
-        data['orgs_count'] = get_organizations_count()
+        data['orgs_count'] = analytics_utils.get_cached_analytics(get_organizations_count)
         data['orgs_enabled'] = True
     data['date_selector_url_func'] = get_date_selector_url_func('analytics_users',
                                                                 users_segment=data['users_segment'])
@@ -158,16 +168,8 @@ def non_routed_per_group_in_segment_stats(request, data):
     data['has_named_segments'] = bool(django_settings.ASKBOT_ANALYTICS_NAMED_SEGMENTS)
 
     customer_summaries = customer_summaries.values('group_id')
-    customer_summaries = customer_summaries.annotate(
-        num_users_added=models.Sum('num_users_added'),
-        num_questions=models.Sum('num_questions'),
-        num_answers=models.Sum('num_answers'),
-        num_upvotes=models.Sum('num_upvotes'),
-        num_downvotes=models.Sum('num_downvotes'),
-        question_views=models.Sum('question_views'),
-        time_on_site=models.Sum('time_on_site'),
-        orgname=models.F('group__name')
-    )
+    customer_summaries = customer_summaries.annotate(orgname=models.F('group__name'),
+                                                     **SUMMARY_SUMS)
 
     customer_summaries = customer_summaries.order_by(data['order_by'])
 
@@ -183,14 +185,12 @@ def non_routed_per_group_in_segment_stats(request, data):
                                                                query_params or None)
     data['paginator_context'] = paginator_context
 
+    group_ids = [summary['group_id'] for summary in customer_summaries]
+    groups = Group.objects.in_bulk(group_ids)
+    num_users_by_group = get_num_users_in_groups_by_date(group_ids, end_date)
     for summary in customer_summaries:
-        group = Group.objects.get(id=summary['group_id'])
-        summary['group'] = group
-        summary['num_users'] = all_customer_summaries.filter(group_id=group.id,
-                                                             date__lte=end_date) \
-                                                            .order_by('date') \
-                                                            .last() \
-                                                            .num_users
+        summary['group'] = groups[summary['group_id']]
+        summary['num_users'] = num_users_by_group[summary['group_id']]
         data['groups'].append(summary)
 
     data['date_selector_url_func'] = get_date_selector_url_func('analytics_users',
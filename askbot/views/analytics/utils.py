@@ -6,7 +6,9 @@ from django.conf import settings as django_settings
 from django.contrib.contenttypes.models import ContentType
 from askbot.models import Post
 from askbot.models.user import Group as AskbotGroup
-from askbot.utils.analytics_utils import get_analytics_default_segment_config
+from askbot.models.analytics import DailyActivityRollup, SummaryWatermark
+from askbot.utils.analytics_utils import (get_analytics_default_segment_config,
+                                          get_cached_analytics)
 
 def get_named_segment_group_ids():
     """Returns the list of group ids for named segments"""
@@ -45,6 +47,54 @@ def filter_events_by_users_segment(events, users_segment):
     return events
 
 
+def get_users_segment_group_ids(users_segment):
+    """Returns the list of group ids of the users segment,
+    ``None`` - for all users"""
+    if users_segment.startswith('group:'):
+        return [int(users_segment.split(':')[1])]
+
+    default_segment_slug = get_analytics_default_segment_config()['slug']
+    if users_segment == default_segment_slug:
+        groups = AskbotGroup.objects.filter(used_for_analytics=True)
+        groups = groups.exclude(id__in=get_named_segment_group_ids())
+        return list(groups.values_list('id', flat=True))
+
+    for named_segment_config in django_settings.ASKBOT_ANALYTICS_NAMED_SEGMENTS:
+        if named_segment_config['slug'] == users_segment:
+            return named_segment_config['group_ids']
+    return None
+
+
+def get_compiled_events_count(last_event_id, start_date, end_date, # pylint: disable=too-many-arguments, unused-argument
+                              event_types, users_segment, content_segment):
+    """Returns the number of the events counted in the daily activity rollups,
+    ``last_event_id`` - the last compiled event, is a part of the cache key"""
+    thread_id = None
+    if content_segment.startswith('thread:'):
+        thread_id = int(content_segment.split(':')[1])
+    group_ids = None
+    if users_segment != 'all-users':
+        group_ids = get_users_segment_group_ids(users_segment)
+    return DailyActivityRollup.objects.get_events_count(start_date, end_date, event_types, # pylint: disable=no-member
+                                                        group_ids=group_ids, thread_id=thread_id)
+
+
+def get_events_count(events, start_date, end_date, event_types, users_segment, content_segment): # pylint: disable=too-many-arguments
+    """Returns the number of the ``events``, filtered by the same arguments.
+    The compiled events are counted in the daily activity rollups,
+    the newer ones - in the events table"""
+    if users_segment.startswith('user:') or content_segment.startswith('post:'):
+        # the rollups are not broken down by user and post
+        return events.count()
+
+    watermark = SummaryWatermark.objects.filter(name='activity-rollups') # pylint: disable=no-member
+    last_event_id = watermark.values_list('last_id', flat=True).first() or 0
+    compiled_count = get_cached_analytics(get_compiled_events_count, last_event_id,
+                                          start_date, end_date, tuple(event_types),
+                                          users_segment, content_segment)
+    return compiled_count + events.filter(id__gt=last_event_id).count()
+
+
 def filter_events_by_content_segment(events, content_segment):
     """Filters events by content segment"""
     if content_segment.startswith('thread:'):
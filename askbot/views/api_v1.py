@@ -1,13 +1,21 @@
 """/api/v1 views"""
 import functools
+import hashlib
 import json
+from collections import defaultdict
 from django.core.paginator import Paginator, EmptyPage, InvalidPage
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse, Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse
 from askbot import models
 from askbot.models import User, UserProfile
+from askbot.models.user_profile import get_profile
 from askbot.conf import settings as askbot_settings
 from askbot.search.state_manager import SearchState
+from askbot.utils import content_export
 from askbot.utils.html import site_url
 from askbot.utils.functions import get_epoch_str
 
@@ -55,6 +63,42 @@ def _check_api_access(is_list_endpoint=False):
         return wrapper
     return decorator
 
+def get_etag(request, last_modified, version):
+    """Returns ETag of the response to the request, depends on the url,
+    the user, the language and the version of the data"""
+    user_id = request.user.id if request.user.is_authenticated else None
+    key = f'{request.get_full_path()}:{user_id}:{get_language()}:{last_modified.isoformat()}:{version}'
+    return quote_etag(hashlib.md5(key.encode('utf-8')).hexdigest())
+
+def _conditional(get_validators):
+    """Decorator answering the conditional GET requests with "304 Not Modified"
+    before the response is computed.
+
+    ``get_validators(request, *args, **kwargs)`` returns the time of the last
+    change of the data and a string identifying its version (e.g. the number
+    of items), or ``(None, None)`` if the response must always be computed.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            last_modified, version = get_validators(request, *args, **kwargs)
+            if last_modified is None:
+                return view_func(request, *args, **kwargs)
+
+            etag = get_etag(request, last_modified, version)
+            last_modified = int(last_modified.timestamp())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
+
 def get_posts_filter(posts_filter=None):
     """Returns filter for the posts.
     `posts_filter` can be preset, remaining default values
@@ -66,13 +110,52 @@ def get_posts_filter(posts_filter=None):
         posts_filter.setdefault('approved', True)
     return posts_filter
 
+QUESTION_FIELDS = (
+    'id', 'added_at', 'answer_count', 'answer_ids', 'accepted_answer_id',
+    'view_count', 'score', 'last_activity_at', 'title', 'summary', 'tags',
+    'url', 'last_edited_at', 'last_edited_by', 'closed', 'closed_by',
+    'closed_at', 'closed_reason', 'author', 'last_activity_by',
+)
+USER_FIELDS = (
+    'id', 'avatar', 'username', 'joined_at', 'last_seen_at',
+    'reputation', 'gold', 'silver', 'bronze',
+)
+USER_POST_COUNT_FIELDS = ('answers', 'questions', 'comments')
+
+
+def get_requested_fields(request, available_fields):
+    """Returns set of the field names listed in the comma-separated
+    ``fields`` parameter, ``None`` if all fields are requested.
+    The ``id`` is always included.
+    Raises ``ValueError`` if some of the names are unknown."""
+    value = request.GET.get('fields', '')
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    if not fields:
+        return None
+    unknown_fields = fields - set(available_fields)
+    if unknown_fields:
+        raise ValueError('Unknown fields: ' + ', '.join(sorted(unknown_fields)))
+    return fields | {'id'}
+
+def get_fields_error_response(error):
+    """Returns response to the request with invalid ``fields`` parameter"""
+    return JsonResponse({'error': str(error)}, status=400)
+
+def select_fields(datum, fields):
+    """Returns datum with only the requested fields"""
+    if fields is None:
+        return datum
+    return {key: value for key, value in datum.items() if key in fields}
+
 def get_user_id_info(user_obj):
     """Returns dict with 'id' and 'username' keys and values"""
     return {'id': user_obj.id, 'username': user_obj.username}
 
-def get_user_data(user_obj):
-    """get common data about the user"""
-    avatar_url = user_obj.get_avatar_url()
+def get_user_data(user_obj, profile=None):
+    """get common data about the user,
+    ``profile`` - preloaded ``UserProfile`` of the user"""
+    profile = profile or get_profile(user_obj)
+    avatar_url = profile.avatar_urls.get('48') or user_obj.get_avatar_url()
     if 'gravatar.com' not in avatar_url:
         avatar_url = site_url(avatar_url)
 
@@ -81,45 +164,103 @@ def get_user_data(user_obj):
         'avatar': avatar_url,
         'username': user_obj.username,
         'joined_at': get_epoch_str(user_obj.date_joined),
-        'last_seen_at': get_epoch_str(user_obj.last_seen),
-        'reputation': user_obj.reputation,
-        'gold': user_obj.gold,
-        'silver': user_obj.silver,
-        'bronze': user_obj.bronze,
+        'last_seen_at': get_epoch_str(profile.last_seen),
+        'reputation': profile.reputation,
+        'gold': profile.gold,
+        'silver': profile.silver,
+        'bronze': profile.bronze,
     }
 
-def get_question_data(thread):
+def get_users_data(user_objects, fields=None):
+    """returns list of data dictionaries of the users,
+    the profiles of all the users are loaded with one query"""
+    user_objects = list(user_objects)
+    profiles = UserProfile.objects.in_bulk([user_obj.id for user_obj in user_objects]) # pylint: disable=no-member
+    return [select_fields(get_user_data(user_obj, profiles.get(user_obj.id)), fields)
+            for user_obj in user_objects]
+
+def get_questions_data(threads, fields=None):
+    """Returns list of data dictionaries of the threads.
+    The question posts, the answer ids and the referenced users
+    of all the threads are loaded with one query each,
+    the data not in the ``fields`` is not loaded."""
+    def is_requested(*names):
+        return fields is None or not fields.isdisjoint(names)
+
+    threads = list(threads)
+    thread_ids = [thread.id for thread in threads]
+    if any(thread.get_deferred_fields() for thread in threads):
+        # the search loads only the fields used by the question list
+        threads_by_id = models.Thread.objects.in_bulk(thread_ids)
+        threads = [threads_by_id[thread_id] for thread_id in thread_ids
+                   if thread_id in threads_by_id]
+    question_posts = models.Post.objects.filter(post_type='question', thread_id__in=thread_ids)
+    question_posts = {post.thread_id: post for post in question_posts}
+
+    answer_ids = defaultdict(list)
+    if is_requested('answer_ids'):
+        answers = models.Post.objects.get_answers().filter(thread_id__in=thread_ids, deleted=False)
+        for thread_id, answer_id in answers.values_list('thread_id', 'id'):
+            answer_ids[thread_id].append(answer_id)
+
+    user_ids = set()
+    for thread in threads:
+        question_post = question_posts.get(thread.id)
+        if is_requested('author') and question_post:
+            user_ids.add(question_post.author_id)
+        if is_requested('last_edited_by') and question_post:
+            user_ids.add(question_post.last_edited_by_id)
+        if is_requested('closed_by') and thread.closed:
+            user_ids.add(thread.closed_by_id)
+        if is_requested('last_activity_by'):
+            user_ids.add(thread.last_activity_by_id)
+    user_ids.discard(None)
+    users_by_id = User.objects.only('id', 'username').in_bulk(user_ids) if user_ids else {}
+
+    def get_user_info(user_id):
+        user_obj = users_by_id.get(user_id)
+        return get_user_id_info(user_obj) if user_obj else None
+
+    data = []
+    for thread in threads:
+        question_post = question_posts.get(thread.id)
+        if question_post is None:
+            continue
+        thread._question_cache = question_post #pylint: disable=protected-access
+        datum = {
+            'added_at': get_epoch_str(thread.added_at),
+            'id': question_post.id,
+            'answer_count': thread.answer_count,
+            'answer_ids': answer_ids[thread.id],
+            'accepted_answer_id': thread.accepted_answer_id,
+            'view_count': thread.view_count,
+            'score': thread.score,
+            'last_activity_at': get_epoch_str(thread.last_activity_at),
+            'title': thread.title,
+            'summary': question_post.summary,
+            'tags': thread.tagnames.strip().split(),
+            'url': site_url(thread.get_absolute_url()) if is_requested('url') else None,
+        }
+        if question_post.last_edited_at:
+            datum['last_edited_at'] = get_epoch_str(question_post.last_edited_at)
+
+        if question_post.last_edited_by_id:
+            datum['last_edited_by'] = get_user_info(question_post.last_edited_by_id)
+
+        if thread.closed:
+            datum['closed'] = True
+            datum['closed_by'] = get_user_info(thread.closed_by_id)
+            datum['closed_at'] = get_epoch_str(thread.closed_at)
+            datum['closed_reason'] = thread.get_close_reason_display()
+
+        datum['author'] = get_user_info(question_post.author_id)
+        datum['last_activity_by'] = get_user_info(thread.last_activity_by_id)
+        data.append(select_fields(datum, fields))
+    return data
+
+def get_question_data(thread, fields=None):
     """returns data dictionary for a given thread"""
-    question_post = thread._question_post() #pylint: disable=protected-access
-    datum = {
-        'added_at': get_epoch_str(thread.added_at),
-        'id': question_post.id,
-        'answer_count': thread.answer_count,
-        'answer_ids': thread.get_answer_ids(),
-        'accepted_answer_id': thread.accepted_answer_id,
-        'view_count': thread.view_count,
-        'score': thread.score,
-        'last_activity_at': get_epoch_str(thread.last_activity_at),
-        'title': thread.title,
-        'summary': question_post.summary,
-        'tags': thread.tagnames.strip().split(),
-        'url': site_url(thread.get_absolute_url()),
-    }
-    if question_post.last_edited_at:
-        datum['last_edited_at'] = get_epoch_str(question_post.last_edited_at)
-
-    if question_post.last_edited_by:
-        datum['last_edited_by'] = get_user_id_info(question_post.last_edited_by)
-
-    if thread.closed:
-        datum['closed'] = True
-        datum['closed_by'] = get_user_id_info(thread.closed_by)
-        datum['closed_at'] = get_epoch_str(thread.closed_at)
-        datum['closed_reason'] = thread.get_close_reason_display()
-
-    datum['author'] = get_user_id_info(question_post.author)
-    datum['last_activity_by'] = get_user_id_info(thread.last_activity_by)
-    return datum
+    return get_questions_data([thread], fields)[0]
 
 def get_answer_data(post):
     """returns data dictionary for a given answer post"""
@@ -140,6 +281,62 @@ def get_answer_data(post):
 
     return datum
 
+def get_post_validators(request, post_type, post_id): #pylint: disable=unused-argument
+    """Returns the last activity time of the thread of the post"""
+    post_filter = get_posts_filter({'id': post_id, 'post_type': post_type})
+    posts = models.Post.objects.filter(**post_filter)
+    return posts.values_list('thread__last_activity_at', flat=True).first(), ''
+
+def get_question_validators(request, question_id):
+    """Returns the last activity time of the question thread"""
+    return get_post_validators(request, 'question', question_id)
+
+def get_answer_validators(request, answer_id):
+    """Returns the last activity time of the answer thread"""
+    return get_post_validators(request, 'answer', answer_id)
+
+def get_questions_search(request):
+    """Returns the search state and the query set of the threads
+    matching the request parameters, computed once per request"""
+    if hasattr(request, '_api_v1_questions_search'):
+        return request._api_v1_questions_search #pylint: disable=protected-access
+
+    try:
+        author_id = int(request.GET.get("author"))
+    except (ValueError, TypeError):
+        author_id = None
+
+    try:
+        page = int(request.GET.get("page"))
+    except (ValueError, TypeError):
+        page = None
+
+    search_state = SearchState(scope=request.GET.get('scope', 'all'),
+                               sort=request.GET.get('sort', 'activity-desc'),
+                               query=request.GET.get('query', None),
+                               tags=request.GET.get('tags', None),
+                               author=author_id,
+                               page=page,
+                               user_logged_in=request.user.is_authenticated)
+
+    qset, meta_data = models.Thread.objects.run_advanced_search(
+        request_user=request.user, search_state=search_state
+    )
+    if meta_data['non_existing_tags']:
+        search_state = search_state.remove_tags(meta_data['non_existing_tags'])
+
+    request._api_v1_questions_search = search_state, qset #pylint: disable=protected-access
+    return search_state, qset
+
+def get_questions_validators(request):
+    """Returns the latest activity time and the number of
+    the threads matching the request parameters"""
+    _, qset = get_questions_search(request)
+    totals = qset.order_by().aggregate(last_activity_at=Max('last_activity_at'),
+                                       count=Count('id', distinct=True))
+    request._api_v1_questions_count = totals['count'] #pylint: disable=protected-access
+    return totals['last_activity_at'], str(totals['count'])
+
 @_check_api_access(is_list_endpoint=True)
 def info(request): #pylint: disable=unused-argument
     """Returns general data about the forum"""
@@ -161,24 +358,36 @@ def info(request): #pylint: disable=unused-argument
     return HttpResponse(json_string, content_type='application/json')
 
 @_check_api_access(is_list_endpoint=False)
-def user(request, user_id): #pylint: disable=unused-argument
+def user(request, user_id):
     '''
        Returns data about one user
     '''
+    try:
+        fields = get_requested_fields(request, USER_FIELDS + USER_POST_COUNT_FIELDS)
+    except ValueError as error:
+        return get_fields_error_response(error)
+
     user_obj = get_object_or_404(User, pk=user_id)
     data = get_user_data(user_obj)
-    posts_filter = get_posts_filter({'author': user_obj})
-    posts = models.Post.objects.filter(**posts_filter)
-    data['answers'] = posts.filter(post_type='answer').count()
-    data['questions'] = posts.filter(post_type='question').count()
-    data['comments'] = posts.filter(post_type='comment').count()
-    json_string = json.dumps(data)
+    if fields is None or not fields.isdisjoint(USER_POST_COUNT_FIELDS):
+        posts_filter = get_posts_filter({'author': user_obj})
+        posts = models.Post.objects.filter(**posts_filter)
+        counts = dict(posts.values_list('post_type').annotate(count=Count('id')).order_by())
+        data['answers'] = counts.get('answer', 0)
+        data['questions'] = counts.get('question', 0)
+        data['comments'] = counts.get('comment', 0)
+    json_string = json.dumps(select_fields(data, fields))
     return HttpResponse(json_string, content_type='application/json')
 
 
 @_check_api_access(is_list_endpoint=True)
 def users(request):
     """Returns data of the most active or latest users."""
+    try:
+        fields = get_requested_fields(request, USER_FIELDS)
+    except ValueError as error:
+        return get_fields_error_response(error)
+
     page = request.GET.get("page", '1')
 
     try:
@@ -198,11 +407,7 @@ def users(request):
     except (EmptyPage, InvalidPage):
         user_objects = paginator.page(paginator.num_pages)
 
-    user_list = []
-    #serializing to json
-    for user_object in user_objects:
-        user_dict = get_user_data(user_object)
-        user_list.append(dict.copy(user_dict))
+    user_list = get_users_data(user_objects, fields)
 
     response_dict = {
                 'pages': paginator.num_pages,
@@ -215,17 +420,24 @@ def users(request):
 
 
 @_check_api_access(is_list_endpoint=False)
-def question(request, question_id): #pylint: disable=unused-argument
+@_conditional(get_question_validators)
+def question(request, question_id):
     """Returns info about a question by id"""
+    try:
+        fields = get_requested_fields(request, QUESTION_FIELDS)
+    except ValueError as error:
+        return get_fields_error_response(error)
+
     #we retrieve question by post id, b/c that's what is in the url,
     #not thread id (currently)
     post_filter = get_posts_filter({'id': question_id, 'post_type': 'question'})
     post = get_object_or_404(models.Post, **post_filter)
-    datum = get_question_data(post.thread)
+    datum = get_question_data(post.thread, fields)
     json_string = json.dumps(datum)
     return HttpResponse(json_string, content_type='application/json')
 
 @_check_api_access(is_list_endpoint=False)
+@_conditional(get_answer_validators)
 def answer(request, answer_id): #pylint: disable=unused-argument
     """Returns info about an answer by id"""
     post_filter = get_posts_filter({'id': answer_id, 'post_type': 'answer'})
@@ -235,49 +447,28 @@ def answer(request, answer_id): #pylint: disable=unused-argument
     return HttpResponse(json_string, content_type='application/json')
 
 @_check_api_access(is_list_endpoint=True)
+@_conditional(get_questions_validators)
 def questions(request):
     """
     List of Questions, Tagged questions, and Unanswered questions.
     matching search query or user selection
     """
     try:
-        author_id = int(request.GET.get("author"))
-    except (ValueError, TypeError):
-        author_id = None
-
-    try:
-        page = int(request.GET.get("page"))
-    except (ValueError, TypeError):
-        page = None
+        fields = get_requested_fields(request, QUESTION_FIELDS)
+    except ValueError as error:
+        return get_fields_error_response(error)
 
-    search_state = SearchState(scope=request.GET.get('scope', 'all'),
-                               sort=request.GET.get('sort', 'activity-desc'),
-                               query=request.GET.get('query', None),
-                               tags=request.GET.get('tags', None),
-                               author=author_id,
-                               page=page,
-                               user_logged_in=request.user.is_authenticated)
-
-    qset, meta_data = models.Thread.objects.run_advanced_search(
-        request_user=request.user, search_state=search_state
-    )
-    if meta_data['non_existing_tags']:
-        search_state = search_state.remove_tags(meta_data['non_existing_tags'])
-
-    #exludes the question from groups
-    #global_group = models.Group.objects.get_global_group()
-    #qs = qs.exclude(~Q(groups__id=global_group.id))
+    search_state, qset = get_questions_search(request)
 
     page_size = askbot_settings.DEFAULT_QUESTIONS_PAGE_SIZE
     paginator = Paginator(qset, page_size)
+    if hasattr(request, '_api_v1_questions_count'):
+        paginator.count = request._api_v1_questions_count #pylint: disable=protected-access
     if paginator.num_pages < search_state.page:
         search_state.page = 1
     page = paginator.page(search_state.page)
 
-    question_list = []
-    for thread in page.object_list:
-        datum = get_question_data(thread)
-        question_list.append(datum)
+    question_list = get_questions_data(page.object_list, fields)
 
     ajax_data = {
         'count': paginator.count,
@@ -286,3 +477,22 @@ def questions(request):
     }
     response_data = json.dumps(ajax_data)
     return HttpResponse(response_data, content_type='application/json')
+
+@_check_api_access(is_list_endpoint=True)
+def export(request):
+    """Streams the public content as newline-delimited JSON,
+    see ``askbot.utils.content_export``"""
+    try:
+        updated_since = content_export.parse_updated_since(request.GET.get('updated_since'))
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    types = request.GET.get('types')
+    types = types.split(',') if types else content_export.EXPORT_TYPES
+    unknown_types = set(types) - set(content_export.EXPORT_TYPES)
+    if unknown_types:
+        return JsonResponse({'error': 'Unknown types: ' + ', '.join(sorted(unknown_types))},
+                            status=400)
+
+    lines = content_export.iter_lines(updated_since, types)
+    return StreamingHttpResponse(lines, content_type='application/x-ndjson')
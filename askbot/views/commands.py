@@ -95,7 +95,7 @@ def process_vote(user = None, vote_direction = None, post = None):
         #less items and maybe recalculate certain data
         #depending on whether the vote is on question
         #or other posts
-        post.thread.clear_cached_data()
+        post.thread.clear_cached_data(lists=False)
 
     response_data['success'] = 1
 
@@ -698,12 +698,16 @@ def set_question_title(request):
 
     spam_checker_params = spam_checker.get_params_from_request(request)
     enabled = askbot_settings.SPAM_FILTER_ENABLED
-    if enabled and spam_checker.is_spam(question.get_text_content(title=title), **spam_checker_params):
+    check_later = spam_checker.is_async_mode()
+    if enabled and not check_later \
+        and spam_checker.is_spam(question.get_text_content(title=title), **spam_checker_params):
         message = _('Spam was detected in the post')
         raise exceptions.PermissionDenied(message)
 
     user = request.user
     user.edit_question(question, title=title)
+    if enabled and check_later:
+        spam_checker.check_post_later(question, request)
     return {'title': question.thread.get_title()}
 
 
@@ -745,7 +749,9 @@ def set_post_body(request):
     text = post.get_text_content(body_text=body_text)
     spam_checker_params = spam_checker.get_params_from_request(request)
     enabled = askbot_settings.SPAM_FILTER_ENABLED
-    if enabled and spam_checker.is_spam(text, **spam_checker_params):
+    check_later = spam_checker.is_async_mode()
+    if enabled and not check_later \
+        and spam_checker.is_spam(text, **spam_checker_params):
         message = _('Spam was detected in the post')
         raise exceptions.PermissionDenied(message)
 
@@ -753,6 +759,8 @@ def set_post_body(request):
                            body_text=body_text,
                            suppress_email=suppress_email,
                            is_private=post.is_private()) # maintain privacy
+    if enabled and check_later:
+        spam_checker.check_post_later(post, request)
     return {'body_html': post.html}
 
 
@@ -4,6 +4,7 @@
 This module contains a collection of views displaying
 secondary and mostly static content.
 """
+from django.contrib.sites.shortcuts import get_current_site
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.core.paginator import Paginator, EmptyPage, InvalidPage
@@ -13,11 +14,14 @@ from django.http import Http404
 from django.http import HttpResponse
 from django.http import HttpResponseForbidden
 from django.http import HttpResponseRedirect
+from django.http import JsonResponse
 from django.utils import translation
+from django.utils.http import http_date
 from django.utils.translation import gettext as _
 from django.utils.translation import gettext_lazy
 from django.views.decorators import csrf
 from django.db.models import Max, Count
+from askbot import sitemap
 from askbot.conf import settings as askbot_settings
 from askbot.forms import FeedbackForm
 from askbot.forms import PageField
@@ -27,8 +31,9 @@ from askbot.utils.functions import encode_jwt
 from askbot.mail.messages import FeedbackEmail
 from askbot.models import get_users_by_role, BadgeData, Award, User, Tag
 from askbot.models import badges as badge_data
-from askbot.utils.decorators import moderators_only
+from askbot.utils.decorators import admins_only, moderators_only
 from askbot.utils import functions
+from askbot.utils.cache_stats import stats as cache_stats
 from askbot.utils.markup import markdown_input_converter
 
 def generic_view(request, template=None, context=None):
@@ -256,3 +261,30 @@ def list_suggested_tags(request):
 
 def colors(request):
     return render(request, 'colors.html')
+
+@admins_only
+def cache_stats_view(request): # pylint: disable=unused-argument
+    """returns the cache hits, misses, sizes and latencies
+    by key family as json, see ``askbot.utils.cache_stats``"""
+    return JsonResponse({'families': cache_stats.get_totals()})
+
+def get_site_url(request):
+    """returns protocol and domain of the sitemap links"""
+    return request.scheme + '://' + get_current_site(request).domain
+
+def sitemap_index(request):
+    """sitemap index listing the question sitemaps by id range"""
+    content = sitemap.render_index(get_site_url(request))
+    return HttpResponse(content, content_type='application/xml')
+
+def sitemap_questions(request, shard=None):
+    """sitemap of the questions in the range of ids,
+    cached until the questions in the range change"""
+    shard = int(shard)
+    shard_info = sitemap.get_shard_info(shard)
+    if not shard_info['count']:
+        raise Http404
+    content = sitemap.get_cached_shard(shard, get_site_url(request), shard_info)
+    response = HttpResponse(content, content_type='application/xml')
+    response['Last-Modified'] = http_date(shard_info['lastmod'].timestamp())
+    return response
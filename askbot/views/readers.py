@@ -49,6 +49,7 @@ from askbot.models.recent_contributors import AvatarsBlockData
 from askbot.search.state_manager import SearchState, DummySearchState
 from askbot.startup_procedures import domain_is_bad
 from askbot.templatetags import extra_tags
+from askbot.utils import cache as cache_utils
 from askbot.utils import functions
 from askbot.utils.decorators import anonymous_forbidden, ajax_only, get_only
 from askbot.utils.diff import textDiff as htmldiff
@@ -159,6 +160,10 @@ def questions(request, **kwargs):
 
     reset_method_count = len([_f for _f in [search_state.query, search_state.tags, meta_data.get('author_name', None)] if _f])
 
+    # the cached list is dropped when any thread or the searched tags change
+    surrogate_tags = [cache_utils.QUESTIONS_SURROGATE_TAG]
+    surrogate_tags.extend([cache_utils.get_tag_surrogate_tag(name) for name in search_state.tags])
+
     if is_ajax(request):
         q_count = paginator.count
 
@@ -232,7 +237,8 @@ def questions(request, **kwargs):
 
         ajax_data.update(extra_context)
 
-        return HttpResponse(json.dumps(ajax_data), content_type='application/json')
+        response = HttpResponse(json.dumps(ajax_data), content_type='application/json')
+        return cache_utils.add_surrogate_tags(response, surrogate_tags)
 
     else: # non-AJAX branch
 
@@ -293,7 +299,7 @@ def questions(request, **kwargs):
         #before = timezone.now()
         result = render(request, 'questions/index.html', template_data)
         #print('pure render time %s' % (timezone.now() - before))
-        return result
+        return cache_utils.add_surrogate_tags(result, surrogate_tags)
 
 
 def get_top_answers(request):
@@ -691,11 +697,6 @@ def question(request, id):#refactor - long subroutine. display question body, an
     else:
         group_read_only = False
 
-    #session variable added so that the session is
-    #not empty and is not autodeleted, otherwise anonymous
-    #answer posting is impossible
-    request.session['askbot_write_intent'] = True
-
     user_is_mod = request.user.is_authenticated and request.user.is_admin_or_mod()
     data = {
         'active_tab': 'questions',
@@ -735,19 +736,18 @@ def question(request, id):#refactor - long subroutine. display question body, an
     # users that have access to analytics will see number of views per major analytics segment
     # in the sidebar of the question, if the organizations for analytics are enabled
     if user_is_mod and django_settings.ASKBOT_ANALYTICS_EMAIL_DOMAIN_ORGANIZATIONS_ENABLED:
-        # for each named segment, get views of this question [{"segment_name": <string>, views_count": <num>},]
-        from askbot.models.analytics import Event
+        # for each segment, get views of this question [{"segment_name": <string>, views_count": <num>},]
+        # the counts are compiled by the askbot_compile_analytics command
+        from askbot.models.analytics import QuestionViewCount
+        views_by_segment = QuestionViewCount.objects.get_counts_by_segment(question_post)
+        segments = list(django_settings.ASKBOT_ANALYTICS_NAMED_SEGMENTS)
+        segments.append(get_analytics_default_segment_config())
         views_per_segment_name = []
-        for named_segment in django_settings.ASKBOT_ANALYTICS_NAMED_SEGMENTS:
+        for segment in segments:
             views_per_segment_name.append({
-                'segment_name': named_segment['name'],
-                'views_count': Event.objects.get_question_visits_count_by_group_ids(question_post, named_segment['group_ids'])
+                'segment_name': segment['name'],
+                'views_count': views_by_segment.get(segment['slug'], 0)
             })
-            
-        views_per_segment_name.append({
-            'segment_name': get_analytics_default_segment_config()['name'],
-            'views_count': Event.objects.get_question_visits_count_by_default_segment(question_post)
-        })
         data['views_per_segment_name'] = views_per_segment_name
 
     #shared with ...
@@ -759,8 +759,8 @@ def question(request, id):#refactor - long subroutine. display question body, an
     extra = context.get_extra('ASKBOT_QUESTION_PAGE_EXTRA_CONTEXT', request, data)
     data.update(extra)
 
-    return render(request, 'question/index.html', data)
-    #print 'generated in ', timezone.now() - before
+    response = render(request, 'question/index.html', data)
+    return cache_utils.add_surrogate_tags(response, thread.get_surrogate_tags())
     #return res
 
 def revisions(request, id, post_type = None):
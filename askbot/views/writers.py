@@ -270,7 +270,10 @@ def ask(request):#view used to ask a new question
             content = '{}\n\n{}\n\n{}'.format(title, tagnames, text)
             spam_checker_params = spam_checker.get_params_from_request(request)
             enabled = askbot_settings.SPAM_FILTER_ENABLED
-            if enabled and spam_checker.is_spam(content, **spam_checker_params):
+            #anonymous questions are stored until login, so they are checked now
+            check_later = spam_checker.is_async_mode() and request.user.is_authenticated
+            if enabled and not check_later \
+                and spam_checker.is_spam(content, **spam_checker_params):
                 message = _('Spam was detected in the post')
                 raise exceptions.PermissionDenied(message)
 
@@ -304,6 +307,8 @@ def ask(request):#view used to ask a new question
                         user=user,
                         form_data=form.cleaned_data
                     )
+                    if enabled and check_later:
+                        spam_checker.check_post_later(question, request)
                     return HttpResponseRedirect(question.get_absolute_url())
                 except exceptions.PermissionDenied as e:
                     request.user.message_set.create(message = str(e))
@@ -400,11 +405,15 @@ def retag_question(request, id):
             text = question.get_text_content(tags=form.cleaned_data['tags'])
             spam_checker_params = spam_checker.get_params_from_request(request)
             enabled = askbot_settings.SPAM_FILTER_ENABLED
-            if enabled and spam_checker.is_spam(text, **spam_checker_params):
+            check_later = spam_checker.is_async_mode()
+            if enabled and not check_later \
+                and spam_checker.is_spam(text, **spam_checker_params):
                 message = _('Spam was detected in the post')
                 raise exceptions.PermissionDenied(message)
 
             request.user.retag_question(question=question, tags=form.cleaned_data['tags'])
+            if enabled and check_later:
+                spam_checker.check_post_later(question, request)
 
         response_data = {
             'success': True,
@@ -481,7 +490,9 @@ def edit_answer(request, id):
                         text = form.cleaned_data['text']
                         spam_checker_params = spam_checker.get_params_from_request(request)
                         enabled = askbot_settings.SPAM_FILTER_ENABLED
-                        if enabled and spam_checker.is_spam(text, **spam_checker_params):
+                        check_later = spam_checker.is_async_mode()
+                        if enabled and not check_later \
+                            and spam_checker.is_spam(text, **spam_checker_params):
                             message = _('Spam was detected in the post')
                             raise exceptions.PermissionDenied(message)
 
@@ -500,6 +511,8 @@ def edit_answer(request, id):
                             user=user,
                             form_data=form.cleaned_data
                         )
+                        if enabled and check_later:
+                            spam_checker.check_post_later(answer, request)
 
                     return HttpResponseRedirect(answer.get_absolute_url())
         else:
@@ -572,7 +585,9 @@ def answer(request, id, form_class=forms.AnswerForm):#process a new answer
                     check_watched_user_post_rate_limit(user, request)
                     spam_checker_params = spam_checker.get_params_from_request(request)
                     enabled = askbot_settings.SPAM_FILTER_ENABLED
-                    if enabled and spam_checker.is_spam(text, **spam_checker_params):
+                    check_later = spam_checker.is_async_mode()
+                    if enabled and not check_later \
+                        and spam_checker.is_spam(text, **spam_checker_params):
                         message = _('Spam was detected in the post')
                         raise exceptions.PermissionDenied(message)
 
@@ -587,6 +602,8 @@ def answer(request, id, form_class=forms.AnswerForm):#process a new answer
                         user=user,
                         form_data=form.cleaned_data
                     )
+                    if enabled and check_later:
+                        spam_checker.check_post_later(answer, request)
 
                     return HttpResponseRedirect(answer.get_absolute_url())
                 except askbot_exceptions.AnswerAlreadyGiven as e:
@@ -597,7 +614,10 @@ def answer(request, id, form_class=forms.AnswerForm):#process a new answer
                     request.user.message_set.create(message = str(e))
             else:
                 if request.session.session_key is None:
-                    return HttpResponseForbidden()
+                    #the question page does not create sessions,
+                    #so the session is started by the first post
+                    request.session['askbot_write_intent'] = True
+                    request.session.save()
 
                 models.AnonymousAnswer.objects.create(
                     question=question,
@@ -722,7 +742,9 @@ def post_comments(request):#generic ajax handler to load comments to an object
             check_watched_user_post_rate_limit(user, request)
             spam_checker_params = spam_checker.get_params_from_request(request)
             enabled = askbot_settings.SPAM_FILTER_ENABLED
-            if enabled and spam_checker.is_spam(text, **spam_checker_params):
+            check_later = spam_checker.is_async_mode()
+            if enabled and not check_later \
+                and spam_checker.is_spam(text, **spam_checker_params):
                 message = _('Spam was detected in the post')
                 raise exceptions.PermissionDenied(message)
 
@@ -736,6 +758,8 @@ def post_comments(request):#generic ajax handler to load comments to an object
                 user=user,
                 form_data=form.cleaned_data
             )
+            if enabled and check_later:
+                spam_checker.check_post_later(comment, request)
             response = __generate_comments_json(post, user, avatar_size)
         except exceptions.PermissionDenied as e:
             response = HttpResponseForbidden(str(e), content_type="application/json")
@@ -757,7 +781,9 @@ def edit_comment(request):
 
     spam_checker_params = spam_checker.get_params_from_request(request)
     enabled = askbot_settings.SPAM_FILTER_ENABLED
-    if enabled and spam_checker.is_spam(form.cleaned_data['comment'], **spam_checker_params):
+    check_later = spam_checker.is_async_mode()
+    if enabled and not check_later \
+        and spam_checker.is_spam(form.cleaned_data['comment'], **spam_checker_params):
         message = _('Spam was detected in the post')
         raise exceptions.PermissionDenied(message)
 
@@ -772,6 +798,8 @@ def edit_comment(request):
         suppress_email=form.cleaned_data['suppress_email'],
         ip_addr=request.META.get('REMOTE_ADDR'),
     )
+    if enabled and check_later:
+        spam_checker.check_post_later(comment_post, request)
 
     is_deletable = template_filters.can_delete_comment(
                             comment_post.author, comment_post)